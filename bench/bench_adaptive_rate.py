@@ -0,0 +1,93 @@
+"""!
+@file bench_adaptive_rate.py
+This file compares running the control step every task period against running it
+through AdaptiveRate on the host simulator.  The motor steps to 180 degrees and then
+back to 90 degrees halfway through, and for both modes the script prints how many
+control steps ran and the overshoot, settling time and steady state error of each
+move, with the adaptive settling time next to the fixed rate one.  Run it from the
+repository root with python bench/bench_adaptive_rate.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import sim_host
+from step_metrics import step_metrics
+
+## task period in ms
+PERIOD = 5
+
+## setpoints of the two moves in degrees
+MOVES = (180, 90)
+
+## virtual time given to each move in ms
+MOVE_MS = 1500
+
+## (kp, ki, kd) gains.  The integral term is needed to push through the motor
+## deadband, without it the fixed rate run never settles inside the 2% band
+GAINS = (1.63, 0.005, 0.3)
+
+## (band_in, band_out, rate_limit) of the AdaptiveRate in degrees.  band_in is under
+## the 2% settling band of both moves, so the rate only drops once the move has settled
+BANDS = (1.0, 2.0, 0.5)
+
+
+def run(adaptive):
+    """!
+    This function runs both moves with or without the adaptive rate
+    @param adaptive - use AdaptiveRate to skip control steps once settled
+    @returns the number of control steps run and the step metrics of each move
+    """
+    sim_host.reset()
+    import utime
+    from controller import CLController
+    from adaptive_rate import AdaptiveRate
+    axis = sim_host.SimAxis(0)
+    con = CLController(*GAINS, MOVES[0])
+    rate = AdaptiveRate(*BANDS, max_divider=8)
+    steps = 0
+    results = []
+    start_pos = 0.0
+    for setpoint in MOVES:
+        con.set_setpoint(setpoint)
+        rate.wake()
+        times = []
+        positions = []
+        for tick in range(MOVE_MS // PERIOD):
+            if not adaptive or rate.should_run():
+                encoder_angle = axis.encoder.read()/16/256/4*360
+                axis.motor.set_duty_cycle(con.run(encoder_angle))
+                rate.update(con.get_err())
+                steps += 1
+            times.append(tick * PERIOD)
+            positions.append(axis.plant.angle())
+            utime.sleep_ms(PERIOD)
+        results.append(step_metrics(times, positions, setpoint, initial=start_pos))
+        start_pos = positions[-1]
+    return steps, results
+
+
+def fmt(value, spec="{:.0f}"):
+    """!
+    This function formats a metric that may be missing
+    @param value - the value or None
+    @param spec - the format string for the value
+    @returns the formatted string, or "-" for None
+    """
+    return "-" if value is None else spec.format(value)
+
+
+if __name__ == "__main__":
+    rows = [(name,) + run(name == "adaptive") for name in ("fixed", "adaptive")]
+    baseline = [metrics["settling_time"] for metrics in rows[0][2]]
+    print("\n{:>9} {:>6} | {:>6} {:>9} {:>9} {:>9} {:>7}".format(
+        "mode", "steps", "move", "overshoot", "settle ms", "vs fixed", "ss err"))
+    for name, steps, results in rows:
+        for setpoint, metrics, fixed in zip(MOVES, results, baseline):
+            settle = metrics["settling_time"]
+            change = None if settle is None or fixed is None else settle - fixed
+            print("{:>9} {:>6} | {:>6} {:>8.1f}% {:>9} {:>9} {:>7.2f}".format(
+                name, steps, setpoint, metrics["overshoot"], fmt(settle),
+                fmt(change, "{:+.0f}"), metrics["ss_error"]))
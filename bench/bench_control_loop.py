@@ -0,0 +1,26 @@
+"""!
+@file bench_control_loop.py
+This file times the encoder read, controller and motor driver loop from main.py on the
+host simulator and prints the closed loop response so it can be compared with the plots
+in the README.  Run it from the repository root with python bench/bench_control_loop.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+if __name__ == "__main__":
+    period_ms = 20
+    duration_ms = 1500
+    result = sim_host.run_step_response(1.5, 0, 0, 180, period_ms=period_ms,
+                                        duration_ms=duration_ms)
+    costs = sorted(result["cost"])
+    n = len(costs)
+    print("\nIterations: {}".format(n))
+    print("Per iteration cost: mean {:.2f} us, median {:.2f} us, max {:.2f} us".format(
+        sum(costs) / n * 1e6, costs[n // 2] * 1e6, costs[-1] * 1e6))
+    print("Final position: {:.2f} deg".format(result["pos"][-1]))
+    print("\ntime, pos")
+    for t, pos in zip(result["time"], result["pos"]):
+        print(f"{t}, {pos}")
@@ -0,0 +1,113 @@
+"""!
+@file bench_controller_bank.py
+This file compares the cost of stepping N axes with one CLController per axis, with a
+single ControllerBank, and with the NumPy BatchControllerBank when NumPy is installed.
+It also compares the efforts of every tick.  ControllerBank stores its arrays at the
+precision of a Python float, so it must match CLController to within TOLERANCE, and it
+fails if it does not.  Run it from the repository root with
+python bench/bench_controller_bank.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+## numbers of axes to try
+AXIS_COUNTS = (2, 16, 128, 1024)
+
+## number of control ticks per timing run
+TICKS = 200
+
+## virtual time between control ticks in ms, which the derivative terms divide by
+PERIOD_MS = 20
+
+## the largest effort difference in percent allowed between ControllerBank and
+## CLController.  The derivative filter weight is computed once for every axis, so
+## the two only differ by rounding in the last bits of a float
+TOLERANCE = 1e-9
+
+
+def gains(n):
+    """!
+    This function makes a repeatable set of gains and setpoints for n axes
+    @param n - the number of axes
+    @returns kp, ki, kd and setpoint lists
+    """
+    kp = [1.0 + (i % 5) * 0.25 for i in range(n)]
+    ki = [(i % 3) * 0.001 for i in range(n)]
+    kd = [(i % 4) * 0.1 for i in range(n)]
+    setpoints = [90.0 + (i % 7) * 45 for i in range(n)]
+    return kp, ki, kd, setpoints
+
+
+def readings(n):
+    """!
+    This function makes a repeatable set of measurements for every tick
+    @param n - the number of axes
+    @returns a list of TICKS lists of n measured angles
+    """
+    return [[float((t * 3 + i * 11) % 360) for i in range(n)] for t in range(TICKS)]
+
+
+if __name__ == "__main__":
+    sim_host.reset()
+    import sim_clock
+    from controller import CLController
+    from controller_bank import ControllerBank
+    try:
+        import numpy as np
+        from batch_sim import BatchControllerBank
+    except ImportError:
+        np = None
+        print("NumPy is not installed, skipping BatchControllerBank")
+    rows = []
+    failed = False
+    for n in AXIS_COUNTS:
+        kp, ki, kd, setpoints = gains(n)
+        data = readings(n)
+        # set the virtual clock directly so moving time costs next to nothing
+        sim_clock.now_us = 0
+        cons = [CLController(kp[i], ki[i], kd[i], setpoints[i]) for i in range(n)]
+        singles = []
+        start = time.perf_counter()
+        for measured in data:
+            single = [cons[i].run(measured[i]) for i in range(n)]
+            singles.append(single)
+            sim_clock.now_us += PERIOD_MS*1000
+        single_cost = (time.perf_counter() - start) / TICKS
+        sim_clock.now_us = 0
+        bank = ControllerBank(kp, ki, kd, setpoints)
+        start = time.perf_counter()
+        for measured in data:
+            effs = bank.run(measured)
+            sim_clock.now_us += PERIOD_MS*1000
+        bank_cost = (time.perf_counter() - start) / TICKS
+        # run the bank again untimed to compare the efforts of every tick
+        sim_clock.now_us = 0
+        bank = ControllerBank(kp, ki, kd, setpoints)
+        diff = 0.0
+        for measured, single in zip(data, singles):
+            effs = bank.run(measured)
+            diff = max(diff, max(abs(effs[i] - single[i]) for i in range(n)))
+            sim_clock.now_us += PERIOD_MS*1000
+        failed = failed or diff > TOLERANCE
+        batch_cost = float("nan")
+        if np is not None:
+            batch = BatchControllerBank(kp, ki, kd, setpoints, period_ms=PERIOD_MS)
+            arrays = [np.array(measured) for measured in data]
+            start = time.perf_counter()
+            for measured in arrays:
+                batch_effs = batch.run(measured)
+            batch_cost = (time.perf_counter() - start) / TICKS
+            diff = max(diff, float(np.max(np.abs(batch_effs - np.array(single)))))
+        rows.append((n, single_cost * 1e6, bank_cost * 1e6, batch_cost * 1e6, diff))
+    print("\n{:>6} | {:>14} {:>14} {:>14} | {:>9}".format(
+        "axes", "per axis us", "bank us", "numpy us", "max diff"))
+    for row in rows:
+        print("{:>6} | {:>14.1f} {:>14.1f} {:>14.1f} | {:>9.2g}".format(*row))
+    print(f"\nControllerBank matches CLController to within {TOLERANCE:g}: " +
+          ("FAIL" if failed else "PASS"))
+    if failed:
+        sys.exit(1)
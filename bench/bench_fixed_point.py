@@ -0,0 +1,67 @@
+"""!
+@file bench_fixed_point.py
+This file compares the float CLController path (counts converted to degrees every
+tick) against FixedCLController working directly in encoder counts.  Both run the
+same step responses on the host simulator, and the script prints the cost of each
+tick and how far apart the two responses are.  CPython boxes every int and float, so
+the allocation savings of the fixed point path only show up on the board.  Run it from the repository root with python bench/bench_fixed_point.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+## (kp, ki, kd, setpoint) combinations to compare
+CASES = (
+    (1.5, 0, 0, 180),
+    (1.5, 0, 0, 360),
+    (1.63, 0, 0.3, 90),
+    (1.2, 0.0001, 0.2, 270),
+)
+
+
+def tick_cost(fixed, kp, ki, kd, iterations=20000):
+    """!
+    This function times the conversion and controller step alone, without the plant
+    @param fixed - time FixedCLController instead of CLController
+    @param kp - proportional controller constant
+    @param ki - integral controller constant
+    @param kd - derivative controller constant
+    @param iterations - the number of ticks to time
+    @returns the mean time per tick in seconds
+    """
+    from controller import CLController, FixedCLController
+    readings = [(i * 37) % 16384 for i in range(iterations)]
+    if fixed:
+        con = FixedCLController(kp, ki, kd, 180)
+    else:
+        con = CLController(kp, ki, kd, 180)
+
+    def loop():
+        for encoder_reading in readings:
+            if fixed:
+                con.run(encoder_reading)
+            else:
+                encoder_angle = encoder_reading/16/256/4*360
+                con.run(encoder_angle)
+
+    start = time.perf_counter()
+    loop()
+    return (time.perf_counter() - start) / iterations
+
+
+if __name__ == "__main__":
+    sim_host.install()
+    rows = []
+    for kp, ki, kd, setpoint in CASES:
+        float_run = sim_host.run_step_response(kp, ki, kd, setpoint)
+        fixed_run = sim_host.run_step_response(kp, ki, kd, setpoint, fixed=True)
+        diff = max(abs(a - b) for a, b in zip(float_run["pos"], fixed_run["pos"]))
+        rows.append((kp, ki, kd, setpoint, tick_cost(False, kp, ki, kd) * 1e6,
+                     tick_cost(True, kp, ki, kd) * 1e6, diff))
+    print("\n{:>5} {:>6} {:>5} {:>8} | {:>9} {:>9} | {:>9}".format(
+        "kp", "ki", "kd", "setpoint", "float us", "fixed us", "max diff"))
+    for row in rows:
+        print("{:>5} {:>6} {:>5} {:>8} | {:>9.3f} {:>9.3f} | {:>5.2f} deg".format(*row))
@@ -0,0 +1,75 @@
+"""!
+@file bench_isr_control.py
+This file runs both axes from ISRControl on the host simulator at several interrupt
+rates and prints the cost of each interrupt and the step response it produces, so a
+control period well below the 20 ms chosen in the README can be checked before it is
+tried on the board.  It also checks that ISRControl.start() sets up every timer
+channel before the first interrupt, since the simulated pyb raises MemoryError if a
+channel is set up from inside the interrupt, like the board does.  Run it from the
+repository root with
+python bench/bench_isr_control.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+## interrupt rates to try in Hz
+RATES = (50, 100, 200, 500, 1000, 2000)
+
+## setpoints of the two axes in degrees, the same as main.py
+SETPOINTS = (180, 360)
+
+
+def run(freq, duration_ms=1500):
+    """!
+    This function runs both axes from the timer interrupt for a fixed amount of virtual time
+    @param freq - the interrupt rate in Hz
+    @param duration_ms - the amount of virtual time to simulate
+    @returns the wall clock time per interrupt in seconds, the number of interrupts,
+             the peak angle of each axis, the final angle of each axis, and whether
+             every encoder and motor was set up before the first interrupt
+    """
+    sim_host.reset()
+    import pyb
+    import utime
+    from controller import FixedCLController
+    from isr_control import ISRControl
+    axes = [sim_host.SimAxis(i) for i in range(len(SETPOINTS))]
+    isr = ISRControl(pyb.Timer(6), freq, [axis.encoder for axis in axes],
+                     [FixedCLController(1.5, 0, 0, setpoint) for setpoint in SETPOINTS],
+                     [axis.motor for axis in axes])
+    # time the interrupt by itself, without the plant, over a separate batch of calls
+    start = time.perf_counter()
+    for _ in range(1000):
+        isr.tick(None)
+    cost = (time.perf_counter() - start) / 1000
+    sim_host.reset()
+    axes = [sim_host.SimAxis(i) for i in range(len(SETPOINTS))]
+    isr = ISRControl(pyb.Timer(6), freq, [axis.encoder for axis in axes],
+                     [FixedCLController(1.5, 0, 0, setpoint) for setpoint in SETPOINTS],
+                     [axis.motor for axis in axes])
+    isr.start()
+    set_up = all(axis.encoder.ready and axis.motor.ch1 is not None for axis in axes)
+    peaks = [0.0] * len(axes)
+    for _ in range(duration_ms):
+        utime.sleep_ms(1)
+        for i, axis in enumerate(axes):
+            peaks[i] = max(peaks[i], axis.plant.angle())
+    isr.stop()
+    return cost, isr.tick_count, peaks, [axis.plant.angle() for axis in axes], set_up
+
+
+if __name__ == "__main__":
+    rows = [(freq,) + run(freq) for freq in RATES]
+    print("\n{:>6} {:>9} {:>6} | {:>18} | {:>18}".format(
+        "Hz", "us/irq", "irqs", "peak deg", "final deg"))
+    for freq, cost, ticks, peaks, finals, _ in rows:
+        print("{:>6} {:>9.2f} {:>6} | {:>8.1f} {:>9.1f} | {:>8.1f} {:>9.1f}".format(
+            freq, cost * 1e6, ticks, peaks[0], peaks[1], finals[0], finals[1]))
+    set_up = all(row[-1] for row in rows)
+    print("\nTimer channels set up before the first interrupt: " + ("PASS" if set_up else "FAIL"))
+    if not set_up:
+        sys.exit(1)
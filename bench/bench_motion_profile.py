@@ -0,0 +1,68 @@
+"""!
+@file bench_motion_profile.py
+This file compares a single step setpoint against trapezoid and S-curve motion
+profiles on the host simulator at several task periods.  For each run it prints the
+overshoot, settling time, steady state error, the largest distance between the motor
+and the profile, and the number of control ticks per second, so a longer period with
+a profile can be compared against a short period with a step.  Run it from the
+repository root with python bench/bench_motion_profile.py
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import sim_host
+from step_metrics import step_metrics
+
+## task periods to try in ms
+PERIODS = (5, 20, 35, 50)
+
+## setpoint of the move in degrees
+SETPOINT = 180
+
+## profile speed in degrees per second and acceleration in degrees per second squared
+SPEED = 360
+ACCEL = 1440
+
+## controller gains, the same as main.py
+KP, KI, KD = 1.5, 0, 0
+
+
+def fmt(value, spec="{:.1f}"):
+    """!
+    This function formats a metric that may be missing
+    @param value - the value or None
+    @param spec - the format string for the value
+    @returns the formatted string, or "-" for None
+    """
+    return "-" if value is None else spec.format(value)
+
+
+if __name__ == "__main__":
+    sim_host.install()
+    from motion_profile import MotionProfile
+    rows = []
+    for shape in ("step", "trapezoid", "scurve"):
+        for period in PERIODS:
+            table = None
+            if shape != "step":
+                table = MotionProfile(0, SETPOINT, SPEED, ACCEL, shape == "scurve").table(period)
+            result = sim_host.run_step_response(KP, KI, KD, SETPOINT, period_ms=period,
+                                                duration_ms=2500, profile=table)
+            metrics = step_metrics(result["time"], result["pos"], SETPOINT)
+            lag = None
+            if table is not None:
+                # the plant angle is sampled after each tick's sleep, so compare it
+                # against the setpoint given on the next tick
+                lag = max(abs(table[min(k + 1, len(table) - 1)] - pos)
+                          for k, pos in enumerate(result["pos"]))
+            rows.append((shape, period, metrics["overshoot"], metrics["settling_time"],
+                         metrics["ss_error"], lag, 1000 / period))
+    print("\n{:>9} {:>6} | {:>9} {:>9} {:>7} {:>9} | {:>7}".format(
+        "shape", "period", "overshoot", "settle ms", "ss err", "track err", "ticks/s"))
+    for row in rows:
+        print("{:>9} {:>6} | {:>8}% {:>9} {:>7} {:>9} | {:>7.0f}".format(
+            row[0], row[1], fmt(row[2]), fmt(row[3], "{:.0f}"), fmt(row[4], "{:.2f}"),
+            fmt(row[5]), row[6]))
@@ -0,0 +1,84 @@
+"""!
+@file bench_period_sweep.py
+This file replaces the manual period testing described in the README.  It runs the
+motor task loop on the host simulator for every combination of task period, gains and
+setpoint, measures rise time, overshoot, settling time and steady state error, and
+estimates how much of the CPU the control loop would use at each period.  Run it from
+the repository root with python bench/bench_period_sweep.py
+
+The CPU estimate is the measured host cost per tick divided by the period.  MicroPython
+on the board is much slower than CPython on a PC, so pass --cpu-scale with the ratio
+between the two (for example the per tick cost from cotask's profile divided by the
+host cost printed here) to get an estimate for the board.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import sim_host
+from step_metrics import step_metrics
+
+## task periods to try in ms, the same ones tested by hand in the README
+PERIODS = (1, 5, 10, 15, 20, 25, 30, 35, 40, 45, 50)
+
+## (kp, ki, kd) gains to try
+GAINS = ((1.5, 0, 0), (1.63, 0, 0.3))
+
+## setpoints to try in degrees, the same ones used in main.py
+SETPOINTS = (180, 360)
+
+
+def fmt(value, spec="{:.1f}"):
+    """!
+    This function formats a metric that may be missing
+    @param value - the value or None
+    @param spec - the format string for the value
+    @returns the formatted string, or "-" for None
+    """
+    return "-" if value is None else spec.format(value)
+
+
+def main():
+    """!
+    This function runs the sweep and prints the table
+    """
+    parser = argparse.ArgumentParser(description="Sweep control period, gains and setpoint")
+    parser.add_argument("--duration", type=int, default=1500, help="virtual ms per run")
+    parser.add_argument("--cpu-scale", type=float, default=1.0,
+                        help="board cost per tick divided by host cost per tick")
+    parser.add_argument("--csv", help="also write the table to this CSV file")
+    args = parser.parse_args()
+    sim_host.install()
+    header = ("period", "kp", "ki", "kd", "setpoint", "rise_ms", "overshoot_pct",
+              "settle_ms", "ss_err_deg", "tick_us", "cpu_pct")
+    rows = []
+    for kp, ki, kd in GAINS:
+        for setpoint in SETPOINTS:
+            for period in PERIODS:
+                result = sim_host.run_step_response(kp, ki, kd, setpoint, period_ms=period,
+                                                    duration_ms=args.duration)
+                metrics = step_metrics(result["time"], result["pos"], setpoint)
+                costs = sorted(result["cost"])
+                tick = costs[len(costs) // 2] * args.cpu_scale
+                rows.append((period, kp, ki, kd, setpoint, metrics["rise_time"],
+                             metrics["overshoot"], metrics["settling_time"],
+                             metrics["ss_error"], tick * 1e6, tick * 1e3 / period * 100))
+    print("\n{:>6} {:>5} {:>4} {:>4} {:>8} | {:>7} {:>9} {:>9} {:>7} | {:>8} {:>7}".format(
+        "period", "kp", "ki", "kd", "setpoint", "rise ms", "overshoot", "settle ms",
+        "ss err", "tick us", "cpu %"))
+    for row in rows:
+        print("{:>6} {:>5} {:>4} {:>4} {:>8} | {:>7} {:>8}% {:>9} {:>7} | {:>8.2f} {:>7.3f}".format(
+            row[0], row[1], row[2], row[3], row[4], fmt(row[5], "{:.0f}"), fmt(row[6]),
+            fmt(row[7], "{:.0f}"), fmt(row[8], "{:.2f}"), row[9], row[10]))
+    if args.csv:
+        with open(args.csv, "w") as out:
+            out.write(",".join(header) + "\n")
+            for row in rows:
+                out.write(",".join("" if value is None else str(value) for value in row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""!
+@file bench_startup.py
+This file measures the startup of the motor tasks on the host simulator, from a fresh
+interpreter to the first control step of both axes, split into importing the lab
+modules, creating the pins, timers, drivers, encoders and controllers, and the first
+control step.  It runs once with the lazy hardware setup from hal.py and once with
+every Encoder and MotorDriver set up as soon as it is created, the way they used to
+be, and counts the timer channels configured before the first step.  It also checks
+that every module in src imports and runs a control step on a computer with no pyb,
+utime or micropython module at all.  Each measurement runs in its own Python process
+so nothing is already imported.  Set the same numbers on the board by reading the
+startup line main.py prints at shutdown.  Run it from the repository root with
+python bench/bench_startup.py
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+## folder holding the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## modules in src that must import without any MicroPython module
+HOST_MODULES = ("hal", "encoder_reader", "motor_driver", "controller", "controller_bank",
+                "loop_timing", "alloc_profile", "isr_control", "recorder", "telemetry",
+                "motion_profile", "adaptive_rate", "encoder_trace", "command_channel",
+                "sync_control", "supervisor", "axes")
+
+## number of fresh processes each startup is measured in
+RUNS = 5
+
+
+def startup(eager):
+    """!
+    This function runs in a fresh process and times the startup of both axes
+    @param eager - set up every timer channel as soon as its driver or encoder is created
+    @returns a dictionary of the phase times in ms and the timer channels configured
+             before the first control step
+    """
+    start = time.perf_counter()
+    sys.path.insert(0, os.path.join(ROOT, "sim"))
+    import sim_host
+    sim_host.install()
+    import pyb
+    from Lab4.hal import default_backend
+    from Lab4.encoder_reader import Encoder
+    from Lab4.motor_driver import MotorDriver
+    from Lab4.controller import CLController
+    from Lab4 import loop_timing
+    from Lab4.axes import AXES
+    imported = time.perf_counter()
+    axes = []
+    for i, wiring in enumerate(AXES):
+        en_pin = default_backend.pin(wiring["en_pin"], "OPEN_DRAIN", pull="PULL_UP", value=1)
+        in1pin = default_backend.pin(wiring["in1pin"], "OUT_PP")
+        in2pin = default_backend.pin(wiring["in2pin"], "OUT_PP")
+        motor = MotorDriver(en_pin, in1pin, in2pin, default_backend.timer(wiring["pwm_timer"], freq=20000))
+        pin1 = default_backend.pin(wiring["enc_pin1"], "IN")
+        pin2 = default_backend.pin(wiring["enc_pin2"], "IN")
+        encoder = Encoder(pin1, pin2, default_backend.timer(wiring["enc_timer"], prescaler=0, period=65535))
+        if eager:
+            motor.setup()
+            encoder.setup()
+        axes.append((motor, encoder, CLController(1.5, 0, 0, 180*(i + 1)),
+                     loop_timing.LoopTimer(f"Motor {i + 1}", 20000)))
+    created = time.perf_counter()
+    channels = sum(len(timer._channels) for timer in pyb._timers.values())
+    for motor, encoder, con, timing in axes:
+        timing.tick()
+        eff = con.run(encoder.read()/16/256/4*360)
+        motor.set_duty_cycle(eff)
+    first = time.perf_counter()
+    return {"import": (imported - start)*1000, "create": (created - imported)*1000,
+            "first": (first - created)*1000, "total": (first - start)*1000,
+            "channels": channels}
+
+
+def host_import():
+    """!
+    This function runs in a fresh process without the simulator and imports every
+    module in HOST_MODULES, then runs one control step on the stand in clock
+    @returns a dictionary of the modules that failed to import and the effort
+    """
+    import types
+    # the board keeps the lab files in a Lab4 folder, so give them that package name,
+    # but hide any pyb, utime or micropython module so importing one fails
+    package = types.ModuleType("Lab4")
+    package.__path__ = [os.path.join(ROOT, "src")]
+    sys.modules["Lab4"] = package
+    for name in ("pyb", "utime", "micropython"):
+        sys.modules[name] = None
+    failed = []
+    for name in HOST_MODULES:
+        try:
+            __import__("Lab4." + name)
+        except ImportError as error:
+            failed.append(f"{name}: {error}")
+    eff = None
+    if not failed:
+        from Lab4.controller import CLController
+        con = CLController(1.5, 0.0005, 0.2, 90)
+        con.run(0)
+        eff = con.run(0)
+    return {"failed": failed, "eff": eff}
+
+
+def child(mode):
+    """!
+    This function runs one measurement in a fresh Python process
+    @param mode - "lazy", "eager" or "host"
+    @returns the dictionary the measurement printed
+    """
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), mode],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        mode = sys.argv[1]
+        result = host_import() if mode == "host" else startup(mode == "eager")
+        print(json.dumps(result))
+        sys.exit(0)
+    print(f"Boot to first control step of both axes, best of {RUNS} processes")
+    print("{:>6} | {:>9} {:>9} {:>11} {:>9} | {:>8}".format(
+        "setup", "import ms", "create ms", "1st step ms", "total ms", "channels"))
+    for mode in ("lazy", "eager"):
+        runs = [child(mode) for _ in range(RUNS)]
+        best = min(runs, key=lambda run: run["total"])
+        print("{:>6} | {:>9.2f} {:>9.3f} {:>11.3f} {:>9.2f} | {:>8}".format(
+            mode, best["import"], best["create"], best["first"], best["total"],
+            best["channels"]))
+    result = child("host")
+    if result["failed"]:
+        print("Host import check: FAIL")
+        for line in result["failed"]:
+            print("  " + line)
+        sys.exit(1)
+    print(f"Host import check: PASS, {len(HOST_MODULES)} modules, control step effort {result['eff']:.3g}")
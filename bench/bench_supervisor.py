@@ -0,0 +1,202 @@
+"""!
+@file bench_supervisor.py
+This file runs the motor task loop from main.py on the host simulator with a
+Supervisor built from the limits in AXES in axes.py, the table main.py runs, injects each kind of fault partway through a
+move, and checks that the right fault is caught, how long after the injection it is
+caught, and that the motor is left off.  It does the same for isr_mode, where the
+timer interrupt drives the motor and a task checks it, like isr_supervisor in
+main.py.  It also runs normal moves with several gains and both controllers,
+including the default 180 degree step, to check that nothing trips when nothing is
+wrong, and times check() against the rest of the loop.  Run it from the repository
+root with
+python bench/bench_supervisor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+## task period in ms
+PERIOD_MS = 20
+
+## virtual time into the move that faults are injected at, in ms
+INJECT_MS = 400
+
+## interrupt rate of the isr_mode runs in Hz, the same as main.py
+ISR_FREQ = 500
+
+## gains, setpoints and controller of the moves that must not trip
+NORMAL_RUNS = (
+    (1.5, 0, 0, 180, False),
+    (1.5, 0, 0, 360, True),
+    (1.63, 0.0005, 0.3, 90, False),
+    (3.0, 0.001, 0.2, 720, False),
+    (1.2, 0.0001, 0.2, 270, True),
+)
+
+
+def make_supervisor(motor):
+    """!
+    This function creates a supervisor from the limits of the first axis in AXES,
+    the same way setup_supervisor() in main.py does
+    @param motor - the MotorDriver of the axis
+    @returns the Supervisor
+    """
+    from supervisor import Supervisor
+    from axes import AXES
+    axis = AXES[0]
+    return Supervisor("Motor 1", motor, PERIOD_MS, max_speed=axis["max_speed"],
+                      stall_speed=axis["stall_speed"], stall_time=axis["stall_time"])
+
+
+def inject(axis, fault):
+    """!
+    This function injects a stall or a runaway into a simulated axis
+    @param axis - the SimAxis
+    @param fault - "stall" or "runaway"
+    """
+    if fault == "stall":
+        # jam the output shaft
+        axis.plant.load_speed = 1e9
+    elif fault == "runaway":
+        # a glitch on the encoder lines jumps the counter
+        axis.encoder.timer.move_counter(20000)
+
+
+def run(kp, ki, kd, setpoint, fixed=False, fault=None, duration_ms=2000):
+    """!
+    This function runs the supervised motor task loop on a simulated axis
+    @param kp - proportional controller constant
+    @param ki - integral controller constant
+    @param kd - derivative controller constant
+    @param setpoint - the target angle in degrees
+    @param fixed - use FixedCLController instead of CLController
+    @param fault - None, "stall", "runaway" or "late", injected at INJECT_MS
+    @param duration_ms - the amount of virtual time to simulate
+    @returns the Supervisor, whether the enable pin was low at the end, and the
+             wall clock time spent in the loop and in check() in seconds
+    """
+    sim_host.reset()
+    import pyb
+    import utime
+    from controller import CLController, FixedCLController
+    axis = sim_host.SimAxis(0)
+    if fixed:
+        con = FixedCLController(kp, ki, kd, setpoint)
+    else:
+        con = CLController(kp, ki, kd, setpoint)
+    sup = make_supervisor(axis.motor)
+    loop_time = 0.0
+    check_time = 0.0
+    injected = False
+    late = 0
+    while con.get_curr_time() < duration_ms:
+        if fault is not None and not injected and con.get_curr_time() >= INJECT_MS:
+            injected = True
+            if fault == "late":
+                late = 10
+            else:
+                inject(axis, fault)
+        start = time.perf_counter()
+        encoder_reading = axis.encoder.read()
+        if fixed:
+            eff = con.run(encoder_reading)
+        else:
+            eff = con.run(encoder_reading/16/256/4*360)
+        checked = time.perf_counter()
+        healthy = sup.check(encoder_reading, eff, con.get_curr_time())
+        check_time += time.perf_counter() - checked
+        if healthy:
+            axis.motor.set_duty_cycle(eff)
+        loop_time += time.perf_counter() - start
+        if late:
+            # another task hogs the processor for several periods
+            late -= 1
+            utime.sleep_ms(PERIOD_MS*4)
+        utime.sleep_ms(PERIOD_MS)
+    disabled = not pyb.pin_value(axis.wiring["en_pin"])
+    return sup, disabled, loop_time, check_time
+
+
+def run_isr(kp, setpoint, fault=None, duration_ms=2000):
+    """!
+    This function runs an axis from the timer interrupt and checks it from a loop
+    every PERIOD_MS, like isr_supervisor in main.py
+    @param kp - proportional controller constant
+    @param setpoint - the target angle in degrees
+    @param fault - None, "stall", "runaway" or "late", injected at INJECT_MS.  A late
+           fault holds up the checking task, the interrupt keeps running.
+    @param duration_ms - the amount of virtual time to simulate
+    @returns the Supervisor and whether the enable pin was low at the end
+    """
+    sim_host.reset()
+    import pyb
+    import utime
+    from controller import FixedCLController
+    from isr_control import ISRControl
+    axis = sim_host.SimAxis(0)
+    isr = ISRControl(pyb.Timer(6), ISR_FREQ, (axis.encoder,),
+                     (FixedCLController(kp, 0, 0, setpoint),), (axis.motor,))
+    sup = make_supervisor(axis.motor)
+    isr_start = utime.ticks_ms()
+    isr.start()
+    injected = False
+    late = 0
+    now = 0
+    while now < duration_ms:
+        now = utime.ticks_diff(utime.ticks_ms(), isr_start)
+        if fault is not None and not injected and now >= INJECT_MS:
+            injected = True
+            if fault == "late":
+                late = 10
+            else:
+                inject(axis, fault)
+        if isr.enabled[0] and not sup.check(isr.get_pos(0), isr.get_eff(0), now):
+            isr.halt(0)
+        if late:
+            late -= 1
+            utime.sleep_ms(PERIOD_MS*4)
+        utime.sleep_ms(PERIOD_MS)
+    # the interrupt is still running, so a halted motor has stayed off
+    disabled = not pyb.pin_value(axis.wiring["en_pin"])
+    isr.stop()
+    return sup, disabled
+
+
+if __name__ == "__main__":
+    sim_host.install()
+    from supervisor import FAULT_NAMES
+    failed = False
+    print("Moves that must not trip")
+    print("{:>5} {:>7} {:>4} {:>8} {:>6} | {:>8} {:>7}".format(
+        "kp", "ki", "kd", "setpoint", "ctrl", "fault", "check %"))
+    for kp, ki, kd, setpoint, fixed in NORMAL_RUNS:
+        sup, _, loop_time, check_time = run(kp, ki, kd, setpoint, fixed)
+        failed = failed or sup.fault != 0
+        print("{:>5} {:>7} {:>4} {:>8} {:>6} | {:>8} {:>6.1f}%".format(
+            kp, ki, kd, setpoint, "fixed" if fixed else "float", FAULT_NAMES[sup.fault],
+            check_time/loop_time*100))
+    for setpoint in (180, 360):
+        sup, _ = run_isr(1.5, setpoint)
+        failed = failed or sup.fault != 0
+        print("{:>5} {:>7} {:>4} {:>8} {:>6} | {:>8}".format(
+            1.5, 0, 0, setpoint, "isr", FAULT_NAMES[sup.fault]))
+    print(f"\nFaults injected at {INJECT_MS} ms")
+    print("{:>8} {:>5} | {:>8} {:>11} {:>9}".format(
+        "injected", "mode", "caught", "latency ms", "motor off"))
+    for mode in ("task", "isr"):
+        for fault in ("stall", "runaway", "late"):
+            if mode == "task":
+                sup, disabled, _, _ = run(1.5, 0, 0, 720, fault=fault)
+            else:
+                sup, disabled = run_isr(1.5, 720, fault=fault)
+            caught = FAULT_NAMES[sup.fault]
+            failed = failed or caught != fault or not disabled
+            latency = sup.fault_time - INJECT_MS if sup.fault else float("nan")
+            print("{:>8} {:>5} | {:>8} {:>11.0f} {:>9}".format(
+                fault, mode, caught, latency, "yes" if disabled else "no"))
+    print("\nSupervisor check: " + ("FAIL" if failed else "PASS"))
+    if failed:
+        sys.exit(1)
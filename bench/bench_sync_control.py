@@ -0,0 +1,229 @@
+"""!
+@file bench_sync_control.py
+This file measures how far apart in time the axes are sampled and driven when every
+axis has its own task, the way the motor_fun tasks in main.py run, and when they are
+stepped together by SyncControl, for several numbers of axes.  The encoders and
+motor drivers run on stand in timers passed in through a hal backend, which stamp
+the host clock every time a counter is latched or a compare value is written.  No
+simulator is used, so the tick functions come from the hal stand ins and measure
+host time.  The one task per axis numbers are a lower bound, since on the board
+other tasks can also run between the motor tasks.  Both ways must also compute the
+same efforts.  Run it from the repository root with
+python bench/bench_sync_control.py
+"""
+import math
+import os
+import sys
+import time
+import types
+
+## numbers of axes to try
+AXIS_COUNTS = (2, 4, 8, 16)
+
+## number of control steps per run
+TICKS = 2000
+
+## degrees of output shaft rotation per encoder count
+DEG_PER_COUNT = 360/(16*256*4)
+
+# the board keeps the lab files in a Lab4 folder, so give them that package name
+_package = types.ModuleType("Lab4")
+_package.__path__ = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")]
+sys.modules["Lab4"] = _package
+
+
+class StampTimer:
+    """!
+    This class stands in for a pyb.Timer.  The counter holds whatever the benchmark
+    puts in it, and every read is stamped with the host clock.
+    """
+
+    def __init__(self, stamps):
+        """!
+        Creates a timer with a 16 bit period
+        @param stamps - the list every counter read appends its time in ns to
+        """
+        self.stamps = stamps
+        self.value = 0
+
+    def period(self):
+        """!
+        This method returns the auto reload value
+        @returns the period of the timer
+        """
+        return 65535
+
+    def counter(self, value=None):
+        """!
+        This method reads or sets the counter, stamping every read
+        @param value - the value to set, or None to read the counter
+        @returns the counter value when reading
+        """
+        if value is not None:
+            self.value = value
+            return None
+        self.stamps.append(time.perf_counter_ns())
+        return self.value
+
+
+class StampChannel:
+    """!
+    This class stands in for a pyb timer channel, stamping every compare write
+    """
+
+    def __init__(self, stamps):
+        """!
+        Creates a channel
+        @param stamps - the list every compare write appends its time in ns to
+        """
+        self.stamps = stamps
+
+    def pulse_width(self, value):
+        """!
+        This method stamps a compare write
+        @param value - the compare value
+        """
+        self.stamps.append(time.perf_counter_ns())
+
+    def pulse_width_percent(self, value):
+        """!
+        This method ignores the initial duty cycle written by MotorDriver.setup()
+        @param value - the duty cycle in percent
+        """
+
+
+class StampBackend:
+    """!
+    This class implements a hal backend that hands out StampChannel objects
+    """
+
+    def __init__(self, writes):
+        """!
+        Creates the backend
+        @param writes - the list every compare write appends its time in ns to
+        """
+        self.writes = writes
+
+    def encoder_channel(self, timer, number, pin):
+        """!
+        This method stands in for setting up an encoder channel
+        @returns None, since the encoder never uses its channels after setup
+        """
+        return None
+
+    def pwm_channel(self, timer, number, pin):
+        """!
+        This method creates a stamping PWM channel
+        @returns the StampChannel
+        """
+        return StampChannel(self.writes)
+
+
+class StampPin:
+    """!
+    This class stands in for the enable pin of a motor driver
+    """
+
+    def low(self):
+        """!
+        This method does nothing
+        """
+
+    def high(self):
+        """!
+        This method does nothing
+        """
+
+
+def spread(stamps, start):
+    """!
+    This function returns the time between the first and the last stamp of a step
+    @param stamps - the list of stamps
+    @param start - the index of the first stamp of the step
+    @returns the spread in us
+    """
+    return (stamps[-1] - stamps[start])/1000 if len(stamps) > start else 0.0
+
+
+def run(n, synchronized):
+    """!
+    This function runs n axes for TICKS steps and measures the skew of every step
+    @param n - the number of axes
+    @param synchronized - step the axes together with SyncControl instead of one at a time
+    @returns the latch skews and apply skews of every step in us, and the efforts
+    """
+    from Lab4.encoder_reader import Encoder
+    from Lab4.motor_driver import MotorDriver
+    from Lab4.controller import CLController
+    from Lab4.controller_bank import ControllerBank
+    from Lab4.sync_control import SyncControl
+    latches = []
+    writes = []
+    backend = StampBackend(writes)
+    timers = [StampTimer(latches) for _ in range(n)]
+    encoders = [Encoder(None, None, timer, backend=backend) for timer in timers]
+    motors = [MotorDriver(StampPin(), None, None, StampTimer([]), backend) for _ in range(n)]
+    kp = [1.0 + 0.25*(i % 4) for i in range(n)]
+    if synchronized:
+        bank = ControllerBank(kp, [0]*n, [0]*n, [0]*n)
+        group = SyncControl(encoders, motors, bank, DEG_PER_COUNT)
+    else:
+        cons = [CLController(kp[i], 0, 0, 0) for i in range(n)]
+    latch_skew = []
+    apply_skew = []
+    efforts = []
+    for tick in range(TICKS + 1):
+        # a different position every step, small enough not to saturate, so every
+        # motor writes a new compare value
+        for i in range(n):
+            timers[i].value = int(300*math.sin(tick*0.1 + i)) % 65536
+        del latches[:]
+        del writes[:]
+        if synchronized:
+            effs = list(group.step())
+        else:
+            effs = []
+            for i in range(n):
+                eff = cons[i].run(encoders[i].read()*DEG_PER_COUNT)
+                motors[i].set_duty_cycle(eff)
+                effs.append(eff)
+        # the first step sets up the encoders and motors, so it is not counted
+        if tick:
+            latch_skew.append(spread(latches, 0))
+            apply_skew.append(spread(writes, 0))
+            efforts.append(effs)
+    return latch_skew, apply_skew, efforts
+
+
+def percentile(values, fraction):
+    """!
+    This function returns a percentile of a list
+    @param values - the list of values
+    @param fraction - the percentile as a fraction, 0.5 for the median
+    @returns the value below which that fraction of the values fall
+    """
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered)*fraction), len(ordered) - 1)]
+
+
+if __name__ == "__main__":
+    print("Skew between the first and last axis, host us (median / 99th percentile)")
+    print("{:>5} | {:>17} {:>17} | {:>17} {:>17} | {:>9}".format(
+        "axes", "task latch", "task apply", "sync latch", "sync apply", "max diff"))
+    failed = False
+    for n in AXIS_COUNTS:
+        task_latch, task_apply, task_effs = run(n, False)
+        sync_latch, sync_apply, sync_effs = run(n, True)
+        # the bank keeps single precision arrays, the controllers double precision floats
+        diff = max(abs(a - b) for row_a, row_b in zip(task_effs, sync_effs)
+                   for a, b in zip(row_a, row_b))
+        failed = failed or diff > 1e-3
+        print("{:>5} | {:>8.1f} / {:>6.1f} {:>8.1f} / {:>6.1f} | {:>8.1f} / {:>6.1f} "
+              "{:>8.1f} / {:>6.1f} | {:>9.2g}".format(
+                  n, percentile(task_latch, 0.5), percentile(task_latch, 0.99),
+                  percentile(task_apply, 0.5), percentile(task_apply, 0.99),
+                  percentile(sync_latch, 0.5), percentile(sync_latch, 0.99),
+                  percentile(sync_apply, 0.5), percentile(sync_apply, 0.99), diff))
+    if failed:
+        print("Efforts differ between the two ways")
+        sys.exit(1)
@@ -0,0 +1,57 @@
+"""!
+@file check_controller_alloc.py
+This file checks that CLController.run does not grow the heap.  It runs the controller
+with integral and derivative control for thousands of iterations on the host simulator
+and uses tracemalloc to compare the memory held by objects allocated in src before and
+after.  The script exits with an error if the heap grew.  Run it from the repository
+root with
+python bench/check_controller_alloc.py
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+
+def src_memory():
+    """!
+    This function adds up the memory held by objects allocated in the src folder, so
+    the script's own variables and tracemalloc's bookkeeping are not counted
+    @returns the number of bytes
+    """
+    only_src = tracemalloc.Filter(True, os.path.join(sim_host.SRC_DIR, "*"))
+    snapshot = tracemalloc.take_snapshot().filter_traces((only_src,))
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+if __name__ == "__main__":
+    sim_host.reset()
+    import sim_clock
+    from controller import CLController
+    # whole numbers of passes over the 180 readings, so the warmup and the measurement
+    # end in the same state and hold the same kinds of objects
+    warmup = 360
+    iterations = 5040
+    con = CLController(1.63, 0.0005, 0.3, 90)
+    # a virtual time for every reading, so each run integrates over 20 ms.  The loops
+    # only take existing objects out of the list so they allocate nothing themselves
+    samples = [((i + 1) * 20000, float(i % 180)) for i in range(warmup + iterations)]
+    warmup_samples = samples[:warmup]
+    samples = samples[warmup:]
+    tracemalloc.start()
+    # warm up while tracing so every attribute already holds a traced object
+    # before the measurement starts
+    for now, reading in warmup_samples:
+        sim_clock.now_us = now
+        con.run(reading)
+    before = src_memory()
+    for now, reading in samples:
+        sim_clock.now_us = now
+        con.run(reading)
+    after = src_memory()
+    tracemalloc.stop()
+    growth = after - before
+    print("Heap growth over {} iterations: {} bytes".format(iterations, growth))
+    if growth != 0:
+        sys.exit(1)
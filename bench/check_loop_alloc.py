@@ -0,0 +1,75 @@
+"""!
+@file check_loop_alloc.py
+This file profiles the heap allocation of each stage of the motor task loop from
+main.py (encoder read, controller run, duty cycle update, and recording) on the host
+simulator, with both controllers, and fails if the loop still holds more than
+alloc_profile.HOST_SLACK bytes of new memory after the warmup.  It uses AllocProfile through a LoopTimer the same way main.py does
+when profile_alloc is set.  On the host tracemalloc only sees memory that is kept, so
+a short lived float in the float controller is not caught here.  Set profile_alloc in
+main.py to see every allocation on the board.  Run it from the repository root with
+python bench/check_loop_alloc.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sim"))
+import sim_host
+
+
+def profile_loop(fixed, iterations=3000, warmup=1000, period_ms=5):
+    """!
+    This function runs the motor task loop on a simulated axis with allocation profiling
+    @param fixed - use FixedCLController instead of CLController
+    @param iterations - the number of loop iterations to run
+    @param warmup - the number of iterations to run before counting
+    @param period_ms - the task period in ms
+    @returns the AllocProfile of the loop
+    """
+    sim_host.reset()
+    import utime
+    from Lab4.controller import CLController, FixedCLController
+    from Lab4.recorder import Recorder
+    from Lab4.encoder_trace import EncoderTrace
+    from Lab4 import loop_timing
+    from Lab4.alloc_profile import AllocProfile
+    axis = sim_host.SimAxis(0)
+    name = "fixed point" if fixed else "float"
+    if fixed:
+        con = FixedCLController(1.63, 0.0005, 0.3, 90)
+    else:
+        con = CLController(1.63, 0.0005, 0.3, 90)
+    rec = Recorder(200, saturation=100)
+    trace = EncoderTrace(iterations, {})
+    # warm up well past filling the derivative history and wrapping the recorder,
+    # so the memory in use on the host has settled at its usual high
+    alloc = AllocProfile(name, warmup=warmup)
+    timing = loop_timing.LoopTimer(name, period_ms*1000, alloc=alloc)
+    for _ in range(iterations):
+        timing.tick()
+        encoder_reading = axis.encoder.read()
+        timing.mark(loop_timing.READ)
+        if fixed:
+            eff = con.run(encoder_reading)
+        else:
+            encoder_angle = encoder_reading/16/256/4*360
+            eff = con.run(encoder_angle)
+        timing.mark(loop_timing.RUN)
+        axis.motor.set_duty_cycle(eff)
+        timing.mark(loop_timing.SET)
+        rec.record(con.get_curr_time(), con.get_pos(), con.get_err(), con.get_eff())
+        trace.record(axis.encoder.new, con.get_curr_time(), con.setpoint, eff, con.last_us)
+        timing.mark(loop_timing.LOG)
+        utime.sleep_ms(period_ms)
+    return alloc
+
+
+if __name__ == "__main__":
+    sim_host.install()
+    failed = False
+    for fixed in (False, True):
+        alloc = profile_loop(fixed)
+        print(alloc)
+        failed = failed or not alloc.steady()
+    print("Steady state allocation check: " + ("FAIL" if failed else "PASS"))
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,116 @@
+"""!
+@file batch_sim.py
+This file contains NumPy versions of ControllerBank and the motor plant for stepping
+large numbers of axes on a PC.  Every axis is one element of a NumPy array, so one
+call steps all of them.  It needs NumPy, which is only used on the host.
+"""
+import numpy as np
+from motor_plant import COUNTS_PER_REV
+
+
+class BatchControllerBank:
+    """!
+    This class implements the ControllerBank control law with NumPy arrays.
+    It takes the same arguments and gives the same efforts as ControllerBank.
+    """
+
+    def __init__(self, kp, ki, kd, setpoints, period_ms=20, tau=10):
+        """!
+        Creates a batch controller bank.  Every argument is a sequence with one entry per axis.
+        @param kp - proportional controller constants
+        @param ki - integral controller constants, per ms
+        @param kd - derivative controller constants, per ms
+        @param setpoints - the target position of each axis
+        @param period_ms - the time between calls to run() in ms.  ControllerBank
+               measures it, but every batch run is stepped at the same fixed period
+        @param tau - the time constant of the derivative filter in ms
+        """
+        self.kp = np.asarray(kp, dtype=float)
+        self.ki = np.asarray(ki, dtype=float)
+        self.kd = np.asarray(kd, dtype=float)
+        self.setpoint = np.asarray(setpoints, dtype=float)
+        self.n = len(self.setpoint)
+        self.period_ms = period_ms
+        self.alpha = period_ms / (tau + period_ms)
+        self.eff = np.zeros(self.n)
+        self.curr = np.zeros(self.n)
+        self.err_acc = np.zeros(self.n)
+        self.last_err = np.zeros(self.n)
+        self.deriv = np.zeros(self.n)
+        self.primed = False
+
+    def run(self, measured):
+        """!
+        This method calculates the effort of every axis from their measured values
+        @param measured - an array with the measured value of each axis
+        @returns self.eff - the array of efforts in percent, one per axis
+        """
+        self.curr[:] = measured
+        err = self.setpoint - self.curr
+        acc = self.err_acc
+        if self.primed:
+            dt = self.period_ms
+            acc = self.err_acc + err * dt
+            self.deriv += ((err - self.last_err) / dt - self.deriv) * self.alpha
+        self.primed = True
+        self.last_err[:] = err
+        np.multiply(self.kp, err, out=self.eff)
+        self.eff += self.ki * acc + self.kd * self.deriv
+        # the same anti-windup as ControllerBank, keeping the old integral where the
+        # effort saturated in the direction the error pushes it
+        high = self.eff > 100
+        low = self.eff < -100
+        hold = (high & (err > 0)) | (low & (err < 0))
+        self.err_acc = np.where(hold, self.err_acc, acc)
+        np.clip(self.eff, -100, 100, out=self.eff)
+        return self.eff
+
+
+class BatchMotorPlant:
+    """!
+    This class implements the MotorPlant speed model for many motors at once.  It
+    works directly on duty cycles and angles with no simulated pins or timers, and
+    quantizes the position to whole encoder counts the same way the encoder does.
+    """
+
+    def __init__(self, n, no_load_speed=720.0, time_constant=0.05, deadband=8.0):
+        """!
+        Creates n identical motors at rest at zero degrees
+        @param n - the number of motors
+        @param no_load_speed - the output speed at 100% duty in degrees per second
+        @param time_constant - the mechanical time constant in seconds
+        @param deadband - the duty cycle in percent needed to overcome static friction
+        """
+        self.n = n
+        self.no_load_speed = no_load_speed
+        self.time_constant = time_constant
+        self.deadband = deadband
+        self.speed = np.zeros(n)
+        self.pos = np.zeros(n)
+
+    def step(self, level, dt):
+        """!
+        This method holds the given duty cycles for dt seconds
+        @param level - an array of signed duty cycles in percent
+        @param dt - the time to advance in seconds
+        """
+        level = np.clip(level, -100, 100)
+        drive = np.sign(level) * np.maximum(np.abs(level) - self.deadband, 0) / (100 - self.deadband)
+        target = drive * self.no_load_speed * COUNTS_PER_REV / 360
+        decay = np.exp(-dt / self.time_constant)
+        self.pos += target * dt + (self.speed - target) * self.time_constant * (1 - decay)
+        self.speed = target + (self.speed - target) * decay
+
+    def counts(self):
+        """!
+        This method returns what the encoders would read
+        @returns an array of whole encoder counts
+        """
+        return np.floor(self.pos)
+
+    def angle(self):
+        """!
+        This method returns the encoder positions in degrees
+        @returns an array of angles in degrees
+        """
+        return self.counts() * 360 / COUNTS_PER_REV
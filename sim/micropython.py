@@ -0,0 +1,75 @@
+"""!
+@file micropython.py
+This file contains a host side stand in for the MicroPython micropython module.  The
+code emitters are turned into plain decorators and const just hands back its argument
+so the lab modules import and behave the same on a PC.
+"""
+
+
+def const(value):
+    """!
+    This function mimics micropython.const, which simply returns the value
+    @param value - the constant value
+    @returns the same value
+    """
+    return value
+
+
+def native(function):
+    """!
+    This decorator mimics the native code emitter by leaving the function unchanged
+    @param function - the function to decorate
+    @returns the same function
+    """
+    return function
+
+
+def viper(function):
+    """!
+    This decorator mimics the viper code emitter by leaving the function unchanged
+    @param function - the function to decorate
+    @returns the same function
+    """
+    return function
+
+
+def alloc_emergency_exception_buf(size):
+    """!
+    This function mimics the emergency exception buffer allocation, which is not needed on a PC
+    @param size - the size of the buffer in bytes
+    """
+    pass
+
+
+def schedule(function, arg):
+    """!
+    This function mimics micropython.schedule.  There are no real interrupts in
+    the simulator so the function is simply called right away.
+    @param function - the function to call
+    @param arg - the argument to pass to the function
+    """
+    function(arg)
+
+
+def heap_lock():
+    """!
+    This function mimics micropython.heap_lock, which the host cannot enforce
+    @returns zero, the previous lock depth
+    """
+    return 0
+
+
+def heap_unlock():
+    """!
+    This function mimics micropython.heap_unlock, which the host cannot enforce
+    @returns zero, the new lock depth
+    """
+    return 0
+
+
+def mem_info(verbose=False):
+    """!
+    This function mimics micropython.mem_info by printing a short notice
+    @param verbose - ignored in the simulator
+    """
+    print("mem_info is not available in the simulator")
@@ -0,0 +1,98 @@
+"""!
+@file motor_plant.py
+This file contains a simple model of an Ametek Pittman gear motor driven by the ME 405
+motor driver.  The plant reads the simulated enable pin and PWM channels, integrates a
+first order speed model and moves the simulated encoder counter to match.
+"""
+import math
+import pyb
+import sim_clock
+
+## encoder counts per output shaft revolution, the same 16*256*4 used by the motor tasks
+COUNTS_PER_REV = 16 * 256 * 4
+
+
+class MotorPlant:
+    """!
+    This class implements a first order DC motor model attached to simulated hardware.
+    The output speed follows the applied voltage through a single time constant, and a
+    duty cycle deadband stands in for static friction in the gearbox.
+    """
+
+    def __init__(self, en_pin, pwm_timer, enc_timer, no_load_speed=720.0,
+                 time_constant=0.05, deadband=8.0, load_speed=0.0):
+        """!
+        Creates a motor plant and registers it with the virtual clock
+        @param en_pin - the board name of the driver enable pin, for example "PA10"
+        @param pwm_timer - the number of the timer generating the PWM on channels 1 and 2
+        @param enc_timer - the number of the timer counting the encoder in ENC_AB mode
+        @param no_load_speed - the output speed at 100% duty in degrees per second
+        @param time_constant - the mechanical time constant in seconds
+        @param deadband - the duty cycle in percent needed to overcome static friction
+        @param load_speed - a constant disturbance expressed as a speed drop in degrees per second
+        """
+        self.en_pin = en_pin
+        self.pwm_timer = pwm_timer
+        self.enc_timer = enc_timer
+        self.no_load_speed = no_load_speed
+        self.time_constant = time_constant
+        self.deadband = deadband
+        self.load_speed = load_speed
+        # speed in counts per second and position in counts
+        self.speed = 0.0
+        self.pos = 0.0
+        # the encoder count last pushed into the timer counter
+        self.count = 0
+        sim_clock.add_listener(self)
+
+    def duty(self):
+        """!
+        This method returns the signed duty cycle the driver is currently applying
+        @returns the duty cycle in percent, positive when channel 1 is driving
+        """
+        if not pyb.pin_value(self.en_pin):
+            return 0.0
+        timer = pyb.Timer(self.pwm_timer)
+        ch1 = timer.channel(1)
+        ch2 = timer.channel(2)
+        level = 0.0
+        if ch1 is not None:
+            level += ch1.duty()
+        if ch2 is not None:
+            level -= ch2.duty()
+        return level * 100
+
+    def step(self, dt_us):
+        """!
+        This method advances the motor model using the exact solution of the first
+        order speed model over the interval, then updates the encoder counter.
+        @param dt_us - the time to advance in microseconds
+        """
+        dt = dt_us / 1000000
+        level = self.duty()
+        if level > self.deadband:
+            drive = (level - self.deadband) / (100 - self.deadband)
+        elif level < -self.deadband:
+            drive = (level + self.deadband) / (100 - self.deadband)
+        else:
+            drive = 0.0
+        target = drive * self.no_load_speed
+        if target > 0:
+            target = max(target - self.load_speed, 0.0)
+        elif target < 0:
+            target = min(target + self.load_speed, 0.0)
+        target *= COUNTS_PER_REV / 360
+        decay = math.exp(-dt / self.time_constant)
+        self.pos += target * dt + (self.speed - target) * self.time_constant * (1 - decay)
+        self.speed = target + (self.speed - target) * decay
+        count = math.floor(self.pos)
+        if count != self.count:
+            pyb.Timer(self.enc_timer).move_counter(count - self.count)
+            self.count = count
+
+    def angle(self):
+        """!
+        This method returns the true output shaft angle of the model
+        @returns the angle in degrees
+        """
+        return self.pos * 360 / COUNTS_PER_REV
@@ -0,0 +1,512 @@
+"""!
+@file pyb.py
+This file contains a host side stand in for the parts of the MicroPython pyb module used
+by the lab code: Pin, Timer and timer channels in ENC_AB and PWM modes, and USB_VCP.  Hardware state
+lives in module level registries keyed by pin name and timer number so a motor plant
+model can read the PWM outputs and drive the encoder counters.  Like the board, setting
+up a timer channel from inside a timer callback raises MemoryError, since the heap is
+locked in an interrupt.
+"""
+import sim_clock
+
+## clock feeding the timers, in Hz.  This matches the 80 MHz timer clock on the
+## Nucleo L476RG used in the ME 405 kit
+TIMER_SOURCE_FREQ = 80000000
+
+## every pin that has been created, keyed by its board name
+_pins = {}
+
+## every timer that has been created, keyed by its timer number
+_timers = {}
+
+## bytes sent from the computer that the board has not read yet
+_vcp_in = bytearray()
+
+## bytes the board has written to the computer
+_vcp_out = bytearray()
+
+## the number of timer callbacks currently running, nonzero inside an interrupt
+_irq_depth = 0
+
+
+class _Board:
+    """!
+    This class stands in for pyb.Pin.board.  Any attribute is the name of a pin.
+    """
+
+    def __getattr__(self, name):
+        return name
+
+
+class Pin:
+    """!
+    This class implements a simulated GPIO pin which simply remembers its value.
+    """
+    board = _Board()
+    IN = 0
+    OUT_PP = 1
+    OUT_OD = 17
+    OPEN_DRAIN = 17
+    AF_PP = 2
+    AF_OD = 18
+    ANALOG = 3
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=IN, pull=PULL_NONE, value=None, **kwargs):
+        """!
+        Creates a simulated pin and registers it by name so the plant can find it
+        @param id - the board name of the pin, for example pyb.Pin.board.PA10
+        @param mode - the pin mode
+        @param pull - the pull up or pull down setting
+        @param value - the initial output value, if any
+        """
+        self._name = str(id)
+        self._mode = mode
+        self._pull = pull
+        old = _pins.get(self._name)
+        if value is not None:
+            self._value = 1 if value else 0
+        elif old is not None:
+            self._value = old._value
+        else:
+            self._value = 1 if pull == Pin.PULL_UP else 0
+        _pins[self._name] = self
+
+    def value(self, value=None):
+        """!
+        This method gets or sets the value of the pin
+        @param value - the value to set, or None to read the pin
+        @returns the pin value when reading
+        """
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+
+    def high(self):
+        """!
+        This method drives the pin high
+        """
+        self._value = 1
+
+    def low(self):
+        """!
+        This method drives the pin low
+        """
+        self._value = 0
+
+    on = high
+    off = low
+
+    def name(self):
+        """!
+        This method returns the board name of the pin
+        @returns the pin name
+        """
+        return self._name
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+def pin_value(name):
+    """!
+    This function reads the value of a pin by its board name.  It is only used by the simulator.
+    @param name - the board name of the pin
+    @returns the pin value, or 0 if the pin was never created
+    """
+    pin = _pins.get(name)
+    return pin._value if pin is not None else 0
+
+
+class TimerChannel:
+    """!
+    This class implements a simulated timer channel holding a compare value.
+    """
+
+    def __init__(self, timer, number, mode, pin=None):
+        """!
+        Creates a simulated timer channel
+        @param timer - the Timer the channel belongs to
+        @param number - the channel number
+        @param mode - the channel mode, for example Timer.PWM or Timer.ENC_AB
+        @param pin - the pin the channel is routed to
+        """
+        self._timer = timer
+        self._number = number
+        self._mode = mode
+        self._pin = pin
+        self._compare = 0
+        self._callback = None
+
+    def pulse_width(self, value=None):
+        """!
+        This method gets or sets the raw compare value of the channel
+        @param value - the compare value to set, or None to read it
+        @returns the compare value when reading
+        """
+        if value is None:
+            return self._compare
+        self._compare = int(value)
+
+    def pulse_width_percent(self, value=None):
+        """!
+        This method gets or sets the duty cycle of the channel in percent
+        @param value - the duty cycle to set from 0 to 100, or None to read it
+        @returns the duty cycle in percent when reading
+        """
+        top = self._timer._period + 1
+        if value is None:
+            return self._compare * 100 / top
+        if value < 0:
+            value = 0
+        elif value > 100:
+            value = 100
+        self._compare = int(value * top / 100 + 0.5)
+
+    def compare(self, value=None):
+        """!
+        This method is the same as pulse_width, matching the pyb API
+        @param value - the compare value to set, or None to read it
+        @returns the compare value when reading
+        """
+        return self.pulse_width(value)
+
+    def callback(self, fun):
+        """!
+        This method stores a channel callback.  Channel interrupts are not simulated.
+        @param fun - the callback function
+        """
+        self._callback = fun
+
+    def duty(self):
+        """!
+        This method returns the duty cycle as a fraction of the period.  It is only used by the simulator.
+        @returns the duty cycle between 0 and 1
+        """
+        if self._mode != Timer.PWM:
+            return 0.0
+        top = self._timer._period + 1
+        if self._compare >= top:
+            return 1.0
+        return self._compare / top
+
+
+class Timer:
+    """!
+    This class implements a simulated hardware timer.  Constructing a Timer with a
+    number that already exists hands back the same object, like the hardware does.
+    """
+    UP = 0
+    DOWN = 16
+    CENTER = 32
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+    IC = 8
+    ENC_A = 9
+    ENC_B = 10
+    ENC_AB = 11
+    HIGH = 0
+    LOW = 2
+    RISING = 0
+    FALLING = 2
+    BOTH = 10
+
+    def __new__(cls, id, *args, **kwargs):
+        timer = _timers.get(id)
+        if timer is None:
+            timer = super().__new__(cls)
+            timer._id = id
+            timer._prescaler = 0
+            timer._period = 0xFFFF
+            timer._count = 0
+            timer._channels = {}
+            timer._callback = None
+            timer._elapsed_us = 0.0
+            _timers[id] = timer
+        return timer
+
+    def __init__(self, id, *args, **kwargs):
+        """!
+        Creates or reconfigures a simulated timer
+        @param id - the timer number
+        @param freq - the desired update frequency in Hz
+        @param prescaler - the prescaler value, used with period
+        @param period - the auto reload value, used with prescaler
+        """
+        if args or kwargs:
+            self.init(*args, **kwargs)
+
+    def init(self, freq=None, prescaler=None, period=None, callback=None, **kwargs):
+        """!
+        This method configures the timer either from a frequency or from a prescaler and period
+        @param freq - the desired update frequency in Hz
+        @param prescaler - the prescaler value
+        @param period - the auto reload value
+        @param callback - a function to call on every timer update
+        """
+        if freq is not None:
+            prescaler = 0
+            while TIMER_SOURCE_FREQ / (prescaler + 1) / freq - 1 > 0xFFFF:
+                prescaler += 1
+            period = int(TIMER_SOURCE_FREQ / (prescaler + 1) / freq + 0.5) - 1
+        if prescaler is not None:
+            self._prescaler = int(prescaler)
+        if period is not None:
+            self._period = int(period)
+        self._count = self._count % (self._period + 1)
+        self._elapsed_us = 0.0
+        if callback is not None:
+            self.callback(callback)
+
+    def deinit(self):
+        """!
+        This method stops the timer and removes its callback
+        """
+        self.callback(None)
+        self._channels.clear()
+
+    def channel(self, channel, mode=None, pin=None, **kwargs):
+        """!
+        This method creates or returns one of the timer's channels
+        @param channel - the channel number
+        @param mode - the channel mode
+        @param pin - the pin the channel is routed to
+        @returns the TimerChannel object
+        """
+        if mode is None:
+            return self._channels.get(channel)
+        if _irq_depth:
+            # creating a channel object allocates, which the board cannot do here
+            raise MemoryError("memory allocation failed, heap is locked")
+        ch = TimerChannel(self, channel, mode, pin)
+        width = kwargs.get("pulse_width_percent")
+        if width is not None:
+            ch.pulse_width_percent(width)
+        self._channels[channel] = ch
+        return ch
+
+    def counter(self, value=None):
+        """!
+        This method gets or sets the counter value
+        @param value - the value to set, or None to read the counter
+        @returns the counter value when reading
+        """
+        if value is None:
+            return self._count
+        self._count = int(value) % (self._period + 1)
+
+    def period(self, value=None):
+        """!
+        This method gets or sets the auto reload value
+        @param value - the value to set, or None to read it
+        @returns the auto reload value when reading
+        """
+        if value is None:
+            return self._period
+        self._period = int(value)
+
+    def prescaler(self, value=None):
+        """!
+        This method gets or sets the prescaler
+        @param value - the value to set, or None to read it
+        @returns the prescaler when reading
+        """
+        if value is None:
+            return self._prescaler
+        self._prescaler = int(value)
+
+    def source_freq(self):
+        """!
+        This method returns the frequency of the clock feeding the timer
+        @returns the source frequency in Hz
+        """
+        return TIMER_SOURCE_FREQ
+
+    def freq(self, value=None):
+        """!
+        This method gets or sets the timer update frequency
+        @param value - the frequency to set in Hz, or None to read it
+        @returns the frequency in Hz when reading
+        """
+        if value is None:
+            return TIMER_SOURCE_FREQ / (self._prescaler + 1) / (self._period + 1)
+        self.init(freq=value)
+
+    def callback(self, fun):
+        """!
+        This method sets a function to be called on every timer update.  In the
+        simulator the callback runs as the virtual clock passes each update.
+        @param fun - the function to call with the timer as its argument, or None to disable
+        """
+        self._callback = fun
+        self._elapsed_us = 0.0
+        if fun is None:
+            sim_clock.remove_listener(self)
+        else:
+            sim_clock.add_listener(self)
+
+    def step(self, dt_us):
+        """!
+        This method is called by the virtual clock to fire the timer callback.  It is only used by the simulator.
+        @param dt_us - the time that has passed in microseconds
+        """
+        global _irq_depth
+        if self._callback is None:
+            return
+        interval = 1000000 / self.freq()
+        self._elapsed_us += dt_us
+        while self._elapsed_us >= interval and self._callback is not None:
+            self._elapsed_us -= interval
+            _irq_depth += 1
+            try:
+                self._callback(self)
+            finally:
+                _irq_depth -= 1
+
+    def move_counter(self, delta):
+        """!
+        This method moves the counter by a signed number of counts, wrapping at the
+        period like a quadrature counter.  It is only used by the simulator.
+        @param delta - the number of encoder counts to move by
+        """
+        self._count = (self._count + delta) % (self._period + 1)
+
+
+def reset():
+    """!
+    This function forgets every simulated pin and timer.  It is only used by the simulator.
+    """
+    global _irq_depth
+    _irq_depth = 0
+    for timer in _timers.values():
+        sim_clock.remove_listener(timer)
+    _pins.clear()
+    _timers.clear()
+    _vcp_in.clear()
+    _vcp_out.clear()
+
+
+class USB_VCP:
+    """!
+    This class mimics the USB virtual serial port.  Every USB_VCP object shares the
+    same simulated port, like on the board.  The simulator sends bytes to the board
+    with feed() and reads what the board wrote with take_output().
+    """
+
+    def any(self):
+        """!
+        This method tells whether there are bytes waiting to be read
+        @returns True if read() would return data
+        """
+        return len(_vcp_in) > 0
+
+    def read(self, nbytes=None):
+        """!
+        This method reads waiting bytes without blocking
+        @param nbytes - the most bytes to read, or None for all of them
+        @returns the bytes read, or None if nothing was waiting
+        """
+        if not _vcp_in:
+            return None
+        n = len(_vcp_in) if nbytes is None else min(nbytes, len(_vcp_in))
+        data = bytes(_vcp_in[:n])
+        del _vcp_in[:n]
+        return data
+
+    def readinto(self, buf, maxlen=None):
+        """!
+        This method reads waiting bytes into a buffer without blocking
+        @param buf - the buffer to fill
+        @param maxlen - the most bytes to read, or None for the length of buf
+        @returns the number of bytes read, or None if nothing was waiting
+        """
+        if not _vcp_in:
+            return None
+        n = len(buf) if maxlen is None else min(maxlen, len(buf))
+        n = min(n, len(_vcp_in))
+        buf[:n] = _vcp_in[:n]
+        del _vcp_in[:n]
+        return n
+
+    def write(self, data):
+        """!
+        This method sends bytes to the computer
+        @param data - the bytes to send
+        @returns the number of bytes written
+        """
+        _vcp_out.extend(data)
+        return len(data)
+
+    def feed(self, data):
+        """!
+        This method queues bytes as if the computer had sent them.  It is only used
+        by the simulator.
+        @param data - the bytes to queue
+        """
+        _vcp_in.extend(data)
+
+    def take_output(self):
+        """!
+        This method returns and clears everything the board has written.  It is only
+        used by the simulator.
+        @returns the bytes written since the last call
+        """
+        data = bytes(_vcp_out)
+        _vcp_out.clear()
+        return data
+
+
+def delay(ms):
+    """!
+    This function mimics pyb.delay by advancing the virtual clock
+    @param ms - the time to wait in milliseconds
+    """
+    sim_clock.advance_us(ms * 1000)
+
+
+def udelay(us):
+    """!
+    This function mimics pyb.udelay by advancing the virtual clock
+    @param us - the time to wait in microseconds
+    """
+    sim_clock.advance_us(us)
+
+
+def millis():
+    """!
+    This function mimics pyb.millis using the virtual clock
+    @returns the virtual time in milliseconds
+    """
+    return sim_clock.now_us // 1000
+
+
+def micros():
+    """!
+    This function mimics pyb.micros using the virtual clock
+    @returns the virtual time in microseconds
+    """
+    return sim_clock.now_us
+
+
+def disable_irq():
+    """!
+    This function mimics pyb.disable_irq.  There are no real interrupts in the simulator.
+    @returns the previous interrupt state
+    """
+    return True
+
+
+def enable_irq(state=True):
+    """!
+    This function mimics pyb.enable_irq.  There are no real interrupts in the simulator.
+    @param state - the interrupt state to restore
+    """
+    pass
@@ -0,0 +1,61 @@
+"""!
+@file sim_clock.py
+This file contains the virtual clock shared by the simulated pyb and utime modules.
+Time only moves when something sleeps or when the simulation harness advances it,
+so the control code can run against the plant model much faster than real time.
+"""
+
+## the current virtual time in microseconds since "boot"
+now_us = 0
+
+## objects with a step(dt_us) method that are advanced whenever time moves,
+## for example motor plants and timers with callbacks
+_listeners = []
+
+## the largest amount of time a listener is stepped in one go.  Timer callbacks
+## are only fired on these boundaries so this sets the callback resolution
+max_step_us = 100
+
+
+def add_listener(listener):
+    """!
+    This function registers an object to be stepped whenever virtual time advances
+    @param listener - an object with a step(dt_us) method
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """!
+    This function stops an object from being stepped by the virtual clock
+    @param listener - a previously registered listener
+    """
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def advance_us(dt_us):
+    """!
+    This function moves the virtual clock forward and steps every listener
+    in chunks of at most max_step_us microseconds.
+    @param dt_us - the number of microseconds to advance the clock by
+    """
+    global now_us
+    dt_us = int(dt_us)
+    while dt_us > 0:
+        step = dt_us if dt_us < max_step_us else max_step_us
+        now_us += step
+        dt_us -= step
+        for listener in _listeners:
+            listener.step(step)
+
+
+def reset():
+    """!
+    This function puts the clock back to zero and forgets every listener so a
+    new simulation can start from a clean state
+    """
+    global now_us
+    now_us = 0
+    _listeners.clear()
@@ -0,0 +1,131 @@
+"""!
+@file sim_host.py
+This file sets up a PC so the lab code can run against the simulated hardware.  It puts
+the simulated pyb, utime and micropython modules ahead of everything else on the import
+path, makes the Lab3 and Lab4 package names used on the board point at the src folder,
+and provides helpers that build a simulated axis and run the real control loop on it.
+"""
+import os
+import sys
+import types
+import time
+
+## folder holding the simulated modules
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+
+## folder holding the lab code that runs on the board
+SRC_DIR = os.path.join(os.path.dirname(SIM_DIR), "src")
+
+def install():
+    """!
+    This function makes the simulated hardware modules and the lab code importable.
+    It is safe to call more than once.
+    """
+    for path in (SRC_DIR, SIM_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    # the board keeps the lab files in folders named after the lab, so make those
+    # names packages whose contents are the src folder
+    for name in ("Lab3", "Lab4"):
+        if name not in sys.modules:
+            package = types.ModuleType(name)
+            package.__path__ = [SRC_DIR]
+            sys.modules[name] = package
+
+
+def reset():
+    """!
+    This function clears the virtual clock, pins and timers so a new simulation starts fresh
+    """
+    install()
+    import sim_clock
+    import pyb
+    pyb.reset()
+    sim_clock.reset()
+
+
+class SimAxis:
+    """!
+    This class builds one motor axis the same way the motor tasks in main.py do, with
+    a motor plant attached to its simulated pins and timers.
+    """
+
+    def __init__(self, number=0, pwm_freq=20000, **plant_args):
+        """!
+        Creates the pins, timers, MotorDriver, Encoder and MotorPlant for one axis
+        @param number - the index of the axis in AXES, the table in axes.py that
+               main.py runs the board from
+        @param pwm_freq - the PWM frequency in Hz
+        @param plant_args - keyword arguments passed on to MotorPlant
+        """
+        install()
+        import pyb
+        from motor_plant import MotorPlant
+        from encoder_reader import Encoder
+        from motor_driver import MotorDriver
+        from axes import AXES
+        wiring = AXES[number]
+        self.wiring = wiring
+        en_pin = pyb.Pin(getattr(pyb.Pin.board, wiring["en_pin"]), mode=pyb.Pin.OPEN_DRAIN,
+                         pull=pyb.Pin.PULL_UP, value=1)
+        in1pin = pyb.Pin(getattr(pyb.Pin.board, wiring["in1pin"]), pyb.Pin.OUT_PP)
+        in2pin = pyb.Pin(getattr(pyb.Pin.board, wiring["in2pin"]), pyb.Pin.OUT_PP)
+        timer = pyb.Timer(wiring["pwm_timer"], freq=pwm_freq)
+        self.motor = MotorDriver(en_pin, in1pin, in2pin, timer)
+        pin1 = pyb.Pin(getattr(pyb.Pin.board, wiring["enc_pin1"]), pyb.Pin.IN)
+        pin2 = pyb.Pin(getattr(pyb.Pin.board, wiring["enc_pin2"]), pyb.Pin.IN)
+        timer = pyb.Timer(wiring["enc_timer"], prescaler=0, period=65535)
+        self.encoder = Encoder(pin1, pin2, timer)
+        self.plant = MotorPlant(wiring["en_pin"], wiring["pwm_timer"], wiring["enc_timer"],
+                                **plant_args)
+
+
+def run_step_response(kp, ki, kd, setpoint, period_ms=20, duration_ms=1500, fixed=False,
+                      profile=None, **plant_args):
+    """!
+    This function runs the motor task loop from main.py on a simulated axis and
+    records the response.  Virtual time advances by one period per iteration, so the
+    run takes however long the host needs to execute the loop, not duration_ms.
+    @param kp - proportional controller constant
+    @param ki - integral controller constant
+    @param kd - derivative controller constant
+    @param setpoint - the target angle in degrees
+    @param period_ms - the task period in milliseconds
+    @param duration_ms - the amount of virtual time to simulate
+    @param fixed - use FixedCLController on raw encoder counts instead of CLController
+    @param profile - an optional table of setpoints in degrees, one per tick, streamed
+           into set_setpoint the way the motor tasks do.  The last entry is held.
+    @param plant_args - keyword arguments passed on to MotorPlant
+    @returns a dictionary holding lists of times, plant angles and efforts, the wall
+             clock cost of each iteration in seconds, and the simulated axis
+    """
+    reset()
+    import utime
+    from controller import CLController, FixedCLController
+    axis = SimAxis(0, **plant_args)
+    if fixed:
+        con = FixedCLController(kp, ki, kd, setpoint)
+    else:
+        con = CLController(kp, ki, kd, setpoint)
+    times = []
+    positions = []
+    efforts = []
+    costs = []
+    for step in range(int(duration_ms // period_ms)):
+        if profile is not None and step < len(profile):
+            con.set_setpoint(profile[step])
+        start = time.perf_counter()
+        encoder_reading = axis.encoder.read()
+        if fixed:
+            eff = con.run(encoder_reading)
+        else:
+            encoder_angle = encoder_reading/16/256/4*360
+            eff = con.run(encoder_angle)
+        axis.motor.set_duty_cycle(eff)
+        costs.append(time.perf_counter() - start)
+        times.append(con.get_curr_time())
+        positions.append(axis.plant.angle())
+        efforts.append(eff)
+        utime.sleep_ms(period_ms)
+    return {"time": times, "pos": positions, "eff": efforts, "cost": costs, "axis": axis}
@@ -0,0 +1,91 @@
+"""!
+@file utime.py
+This file contains a host side stand in for the MicroPython utime module.  All of the
+tick functions read the virtual clock in sim_clock, and the sleep functions advance it
+instead of blocking, which steps any simulated motors along with it.
+"""
+import sim_clock
+
+## the tick counters wrap at this value, matching the MicroPython ports
+TICKS_PERIOD = 1 << 30
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+def ticks_us():
+    """!
+    This function returns the virtual time in microseconds, wrapped like the board does
+    @returns the current tick count in microseconds
+    """
+    return sim_clock.now_us & _TICKS_MAX
+
+
+def ticks_ms():
+    """!
+    This function returns the virtual time in milliseconds, wrapped like the board does
+    @returns the current tick count in milliseconds
+    """
+    return (sim_clock.now_us // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    """!
+    This function returns the highest resolution tick count available, which in
+    the simulator is the microsecond counter
+    @returns the current tick count
+    """
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    """!
+    This function offsets a tick value by delta, wrapping the same way the tick counters do
+    @param ticks - a value from one of the tick functions
+    @param delta - the signed offset to add
+    @returns the wrapped sum
+    """
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    """!
+    This function returns the signed difference ticks1 - ticks2, accounting for wrap around
+    @param ticks1 - the later tick value
+    @param ticks2 - the earlier tick value
+    @returns the signed difference between the two tick values
+    """
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    diff = ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+    return diff
+
+
+def sleep_us(us):
+    """!
+    This function advances the virtual clock by the given number of microseconds
+    @param us - the time to sleep in microseconds
+    """
+    sim_clock.advance_us(us)
+
+
+def sleep_ms(ms):
+    """!
+    This function advances the virtual clock by the given number of milliseconds
+    @param ms - the time to sleep in milliseconds
+    """
+    sim_clock.advance_us(ms * 1000)
+
+
+def sleep(seconds):
+    """!
+    This function advances the virtual clock by the given number of seconds
+    @param seconds - the time to sleep in seconds
+    """
+    sim_clock.advance_us(seconds * 1000000)
+
+
+def time():
+    """!
+    This function returns the number of whole virtual seconds since the simulation started
+    @returns the virtual time in seconds
+    """
+    return sim_clock.now_us // 1000000
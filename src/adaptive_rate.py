@@ -0,0 +1,105 @@
+"""!
+@file adaptive_rate.py
+This file contains a rate divider that lets a motor task run its control step less
+often once the axis has settled.  The task keeps its scheduler period, but while the
+error stays inside a deadband only every divider-th run does the control work, and
+the divider grows the longer the axis stays settled.  As soon as the error or its
+rate of change grows past the limits the divider drops back to one.  Separate
+entry and exit bands give hysteresis so the rate does not chatter at the edge.
+"""
+
+
+class AdaptiveRate:
+    """!
+    This class implements an adaptive control rate with a deadband and hysteresis.
+    Call should_run() every time the task runs, and update() with the controller
+    error every time the control step actually runs.
+    """
+
+    def __init__ (self, band_in, band_out, rate_limit, max_divider=8, settle_ticks=5):
+        """!
+        Creates an adaptive rate divider, starting at the full rate
+        @param band_in - the error magnitude the axis must stay under to count as settled
+        @param band_out - the error magnitude that makes a settled axis run at full
+               rate again.  It should be larger than band_in.
+        @param rate_limit - the largest change in error between control steps
+               allowed while settled
+        @param max_divider - the most task runs between control steps
+        @param settle_ticks - how many control steps in a row must be inside band_in
+               before the rate starts to drop
+        @param divider - the current number of task runs per control step
+        @param settled - True while the axis is settled
+        @param ticks_run - the number of task runs that did the control step
+        @param ticks_skipped - the number of task runs that skipped it
+        @param skip - the number of task runs since the last control step
+        @param count - the number of control steps in a row inside band_in
+        @param last_err - the error from the previous control step
+        """
+        self.band_in = band_in
+        self.band_out = band_out
+        self.rate_limit = rate_limit
+        self.max_divider = max_divider
+        self.settle_ticks = settle_ticks
+        self.divider = 1
+        self.settled = False
+        self.skip = 0
+        self.count = 0
+        self.last_err = 0
+        self.ticks_run = 0
+        self.ticks_skipped = 0
+
+    def should_run(self):
+        """!
+        This method tells the task whether to do the control step this time
+        @returns True if the control step should run
+        """
+        self.skip += 1
+        if self.skip >= self.divider:
+            self.skip = 0
+            self.ticks_run += 1
+            return True
+        self.ticks_skipped += 1
+        return False
+
+    def update(self, err):
+        """!
+        This method adapts the rate to the error from the control step that just ran
+        @param err - the controller error
+        """
+        rate = err - self.last_err
+        self.last_err = err
+        if rate < 0:
+            rate = -rate
+        if err < 0:
+            err = -err
+        if self.settled:
+            if err > self.band_out or rate > self.rate_limit:
+                self.wake()
+            elif self.divider < self.max_divider:
+                # stretch gradually so a slow drift is still caught quickly
+                self.divider += 1
+        elif err < self.band_in and rate <= self.rate_limit:
+            self.count += 1
+            if self.count >= self.settle_ticks:
+                self.settled = True
+        else:
+            self.count = 0
+
+    def wake(self):
+        """!
+        This method goes back to running the control step every time, for example
+        when the setpoint changes
+        """
+        self.settled = False
+        self.divider = 1
+        self.skip = 0
+        self.count = 0
+
+    def __str__(self):
+        """!
+        This method formats how much of the time the control step ran
+        @returns the formatted counts
+        """
+        total = self.ticks_run + self.ticks_skipped
+        percent = 100*self.ticks_run//total if total else 100
+        return f"control steps run {self.ticks_run}, skipped {self.ticks_skipped} ({percent}% duty)"
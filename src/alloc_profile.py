@@ -0,0 +1,173 @@
+"""!
+@file alloc_profile.py
+This file contains heap allocation instrumentation for the control loops.  It uses
+the same stages as loop_timing and counts the bytes allocated by each stage of every
+loop iteration into fixed bucket histograms, so the garbage collector pauses that an
+allocating loop eventually causes can be traced back to the stage responsible.  On
+the board the bytes come from gc.mem_alloc(), which counts every allocation until the
+next collection.  On the host simulator gc.mem_alloc() does not exist, so tracemalloc
+is used instead.  It reports the memory still held, so objects created in one stage
+and freed in a later one, or in the next iteration, show up in the stage histograms.
+On the host an iteration only counts as allocating if the next one starts with more
+memory in use than any iteration before it.  CPython frees and reuses objects at
+slightly different times every iteration, and every integer held in an attribute is a
+boxed object that can grow by a few bytes as its value grows, so on the host a loop
+fails steady() if that high grows by more than HOST_SLACK bytes in total after the
+warmup, however many iterations run.  That catches growing lists and leaks of even
+one object every few hundred iterations, but not short lived floats, which CPython
+always boxes and frees again.
+show_all() formats every profile for printing at shutdown next to loop_timing.show_all().
+"""
+import gc
+from Lab4.loop_timing import Histogram, STAGE_NAMES
+
+try:
+    mem_alloc = gc.mem_alloc
+    _tracemalloc = None
+except AttributeError:
+    import tracemalloc as _tracemalloc
+
+    def mem_alloc():
+        """!
+        This function stands in for gc.mem_alloc() on the host
+        @returns the number of bytes tracemalloc sees in use
+        """
+        return _tracemalloc.get_traced_memory()[0]
+
+## bytes the memory in use may grow on the host after the warmup and still count as
+## steady.  The counters and times held by the loop and by this profile are boxed
+## integers on the host, and they grew by a fixed 224 bytes in bench/check_loop_alloc.py
+## whether 2000 or 9000 iterations were counted
+HOST_SLACK = 256
+
+## every AllocProfile that has been created, so show_all() can print them
+_profiles = []
+
+
+class AllocProfile:
+    """!
+    This class implements the allocation instrumentation for one control loop.  Call
+    tick() at the top of every iteration and mark() after each stage, in the same
+    places as a LoopTimer, or pass it to a LoopTimer to have them called for you.
+    The first warmup iterations are not counted, since buffers and attributes are
+    filled in then.
+    """
+
+    def __init__ (self, name, warmup=10, width=16, buckets=16):
+        """!
+        Creates an allocation profile and registers it with show_all()
+        @param name - the name printed with the profile
+        @param warmup - the number of iterations to ignore at the start
+        @param width - the bucket width of the stage histograms in bytes
+        @param buckets - the number of buckets in every histogram
+        @param stages - one Histogram per stage, indexed by READ, RUN, SET and LOG
+        @param iterations - the number of iterations since the profile was cleared
+        @param allocating - the number of finished iterations after the warmup that
+               allocated.  On the host, the number that left more memory in use than
+               ever before.
+        @param collections - the number of stages the memory in use shrank in, because
+               a garbage collection ran or, on the host, because objects were freed.
+               Those stages are counted as allocating nothing.
+        """
+        self.name = name
+        self.warmup = warmup
+        self.stages = tuple(Histogram(0, width, buckets, "bytes") for _ in STAGE_NAMES)
+        self.start_alloc = 0
+        self.mark_alloc = 0
+        self.high_alloc = 0
+        self.warm_alloc = 0
+        self.clear()
+        if _tracemalloc is not None and not _tracemalloc.is_tracing():
+            _tracemalloc.start()
+        _profiles.append(self)
+
+    def tick(self):
+        """!
+        This method marks the start of a loop iteration and of its first stage, and
+        finishes the previous iteration
+        """
+        now = mem_alloc()
+        if self.iterations > self.warmup:
+            # on the board other tasks may allocate between iterations, so only the
+            # stages count.  On the host objects from one iteration are freed in
+            # the next and the memory in use wobbles, so only a new high counts
+            if _tracemalloc is None:
+                grew = self.mark_alloc > self.start_alloc
+            else:
+                grew = now > self.high_alloc
+            if grew:
+                self.allocating += 1
+        if now > self.high_alloc:
+            self.high_alloc = now
+        self.iterations += 1
+        if self.iterations == self.warmup + 1:
+            self.warm_alloc = self.high_alloc
+        self.start_alloc = now
+        self.mark_alloc = now
+
+    def mark(self, stage):
+        """!
+        This method marks the end of a stage and the start of the next one
+        @param stage - the stage that just finished, READ, RUN, SET or LOG
+        """
+        now = mem_alloc()
+        used = now - self.mark_alloc
+        self.mark_alloc = now
+        if self.iterations <= self.warmup:
+            return
+        if used < 0:
+            # the heap shrank, so a collection ran during the stage
+            self.collections += 1
+            used = 0
+        self.stages[stage].add(used)
+
+    def steady(self):
+        """!
+        This method tells whether the loop has run without allocating
+        @returns True if no finished iteration after the warmup allocated since the
+                 profile was cleared, or on the host if the memory in use did not
+                 grow by more than HOST_SLACK bytes after the warmup
+        """
+        counted = self.iterations - self.warmup - 1
+        if counted <= 0:
+            return False
+        if _tracemalloc is None:
+            return self.allocating == 0
+        return self.high_alloc - self.warm_alloc <= HOST_SLACK
+
+    def clear(self):
+        """!
+        This method empties every histogram and starts a new warmup
+        """
+        for hist in self.stages:
+            hist.clear()
+        self.iterations = 0
+        self.high_alloc = 0
+        self.allocating = 0
+        self.collections = 0
+
+    def __str__(self):
+        """!
+        This method formats the bytes allocated by every stage
+        @returns the formatted profile
+        """
+        counted = self.iterations - self.warmup - 1
+        if counted < 0:
+            counted = 0
+        lines = [f"{self.name} heap allocation (bytes), {self.allocating} of {counted} "
+                 f"iterations allocated, {self.collections} collections"]
+        if _tracemalloc is not None:
+            lines.append(f"  memory in use grew {self.high_alloc - self.warm_alloc} bytes "
+                         "after the warmup")
+        for name, hist in zip(STAGE_NAMES, self.stages):
+            lines.append(f"  {name}")
+            lines.append(str(hist))
+        return "\n".join(lines)
+
+
+def show_all():
+    """!
+    This function formats every allocation profile that has been created
+    @returns the formatted profiles
+    """
+    return "\n".join(str(profile) for profile in _profiles)
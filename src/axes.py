@@ -0,0 +1,23 @@
+"""!
+@file axes.py
+This file contains the wiring, gains and fault limits of every motor axis.  main.py
+runs the board from this table, and the host simulator and benches build their
+simulated axes from the same one, so the two can never disagree.  It imports
+nothing, so it loads on the board and on any computer.
+"""
+
+## Wiring, gains and fault limits of every axis.  Adding a motor only needs a new
+## entry here.  Pins are board pin names, the pwm timer drives channels 1 and 2 on
+## in1pin and in2pin, and the encoder timer counts enc_pin1 and enc_pin2 in ENC_AB
+## mode.  The supervisor limits come from the gear motor: its output shaft turns at
+## about 720 degrees per second at full duty with no load, so max_speed is half as
+## fast again, and a saturated motor turning slower than stall_speed degrees per
+## second for stall_time ms is jammed.
+AXES = (
+    {"en_pin": "PA10", "in1pin": "PB4", "in2pin": "PB5", "pwm_timer": 3,
+     "enc_pin1": "PC6", "enc_pin2": "PC7", "enc_timer": 8, "kp": 1.5, "ki": 0, "kd": 0,
+     "max_speed": 1080, "stall_speed": 10, "stall_time": 500},
+    {"en_pin": "PC1", "in1pin": "PA0", "in2pin": "PA1", "pwm_timer": 5,
+     "enc_pin1": "PB6", "enc_pin2": "PB7", "enc_timer": 4, "kp": 1.5, "ki": 0, "kd": 0,
+     "max_speed": 1080, "stall_speed": 10, "stall_time": 500},
+)
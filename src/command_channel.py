@@ -0,0 +1,198 @@
+"""!
+@file command_channel.py
+This file contains a parser for a compact text command protocol read from the USB
+serial port, so setpoints and gains can be changed while the motors run instead of
+by editing main.py and rebooting.  poll() only reads bytes that have already
+arrived, at most a fixed number per call, so it never blocks the control tasks.
+Bytes are collected into a preallocated line buffer and numbers are parsed in place,
+without building strings or lists.
+
+Every command is one line ending in a newline or carriage return, with the fields
+separated by spaces.  Axes are indexes into AXES in main.py.
+  - s <axis> <degrees>        set the setpoint of an axis
+  - g <axis> <kp> <ki> <kd>   set the PID gains of an axis
+  - r <axis>                  reset the controller of an axis
+For example "s 1 90" moves the second motor to 90 degrees.  Each line is answered
+with "ok" or "err" unless replies are turned off.
+"""
+from array import array
+
+## command that sets the setpoint of an axis
+SETPOINT = ord('s')
+
+## command that sets the PID gains of an axis
+GAINS = ord('g')
+
+## command that resets the controller of an axis
+RESET = ord('r')
+
+## number of numbers that follow the axis of each command
+ARG_COUNTS = {SETPOINT: 1, GAINS: 3, RESET: 0}
+
+## reply written after a command is accepted
+OK = b"ok\n"
+
+## reply written after a line is rejected
+ERR = b"err\n"
+
+
+class CommandChannel:
+    """!
+    This class implements a non-blocking command reader.  Call poll() from a task
+    every period.  When it returns True a complete command is waiting in cmd, axis
+    and args, and stays there until the next call.
+    """
+
+    def __init__ (self, stream, axes, size=48, max_args=3, reply=True):
+        """!
+        Creates a command channel
+        @param stream - the object the commands are read from, with any() and
+               readinto() methods, for example pyb.USB_VCP()
+        @param axes - the number of axes commands may address
+        @param size - the length of the longest line accepted, and the most bytes
+               read in one call to poll()
+        @param max_args - the most numbers accepted after the axis
+        @param reply - write "ok" or "err" back to the stream after every line.  Turn
+               it off when the binary telemetry shares the port.
+        @param line - the preallocated buffer the current line is collected in
+        @param length - the number of bytes in line
+        @param overflow - True if the current line was too long and will be rejected
+        @param cmd - the command of the last accepted line, SETPOINT, GAINS or RESET
+        @param axis - the axis of the last accepted line
+        @param args - the numbers of the last accepted line after the axis
+        @param commands - the number of accepted commands
+        @param errors - the number of rejected lines
+        """
+        self.stream = stream
+        self.axes = axes
+        self.size = size
+        self.reply = reply
+        self.line = bytearray(size)
+        self.byte = bytearray(1)
+        self.length = 0
+        self.overflow = False
+        self.cmd = 0
+        self.axis = 0
+        self.args = array('f', [0] * max_args)
+        self.commands = 0
+        self.errors = 0
+
+    def poll(self):
+        """!
+        This method reads the bytes that have arrived, up to the end of the first
+        complete line, without waiting for more
+        @returns True if a command was accepted and is ready in cmd, axis and args
+        """
+        n = 0
+        while n < self.size and self.stream.any():
+            if not self.stream.readinto(self.byte, 1):
+                break
+            n += 1
+            c = self.byte[0]
+            if c == 10 or c == 13:
+                if self.length == 0 and not self.overflow:
+                    # the other half of a \r\n, or a blank line
+                    continue
+                ok = not self.overflow and self.parse()
+                self.length = 0
+                self.overflow = False
+                if ok:
+                    self.commands += 1
+                else:
+                    self.errors += 1
+                if self.reply:
+                    self.stream.write(OK if ok else ERR)
+                if ok:
+                    return True
+            elif self.length < self.size:
+                self.line[self.length] = c
+                self.length += 1
+            else:
+                self.overflow = True
+        return False
+
+    def parse(self):
+        """!
+        This method parses the line buffer into cmd, axis and args
+        @returns True if the line is a valid command
+        """
+        line = self.line
+        end = self.length
+        pos = self.skip(0)
+        if pos >= end:
+            return False
+        cmd = line[pos]
+        count = ARG_COUNTS.get(cmd, -1)
+        if count < 0:
+            return False
+        pos += 1
+        if pos < end and line[pos] != 32:
+            return False
+        # the axis is a small whole number
+        pos = self.skip(pos)
+        start = pos
+        axis = 0
+        while pos < end and 48 <= line[pos] <= 57:
+            axis = axis*10 + line[pos] - 48
+            pos += 1
+        if pos == start or axis >= self.axes:
+            return False
+        i = 0
+        while i < count:
+            pos = self.skip(pos)
+            pos = self.number(pos, i)
+            if pos < 0:
+                return False
+            i += 1
+        if self.skip(pos) != end:
+            return False
+        self.cmd = cmd
+        self.axis = axis
+        return True
+
+    def skip(self, pos):
+        """!
+        This method skips spaces in the line buffer
+        @param pos - the index to start at
+        @returns the index of the next byte that is not a space
+        """
+        while pos < self.length and self.line[pos] == 32:
+            pos += 1
+        return pos
+
+    def number(self, pos, index):
+        """!
+        This method parses a decimal number such as -12, 0.5 or .25 from the line
+        buffer into args
+        @param pos - the index of the first character of the number
+        @param index - the index in args to store the number at
+        @returns the index after the number, or -1 if there is no number there
+        """
+        line = self.line
+        end = self.length
+        sign = 1
+        if pos < end and (line[pos] == 45 or line[pos] == 43):
+            if line[pos] == 45:
+                sign = -1
+            pos += 1
+        value = 0.0
+        scale = 0.0
+        digits = 0
+        while pos < end:
+            c = line[pos]
+            if 48 <= c <= 57:
+                if scale:
+                    value += (c - 48)*scale
+                    scale *= 0.1
+                else:
+                    value = value*10 + c - 48
+                digits += 1
+            elif c == 46 and not scale:
+                scale = 0.1
+            else:
+                break
+            pos += 1
+        if not digits or (pos < end and line[pos] != 32):
+            return -1
+        self.args[index] = sign*value
+        return pos
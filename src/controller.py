@@ -9,31 +9,44 @@ an encoder input reading.
 @date 22-Feb-2024
 """
 
-import micropython
-import pyb
-import utime
-from Lab3.encoder_reader import Encoder
-from Lab3.motor_driver import MotorDriver
+from Lab4.hal import ticks_ms, ticks_us, ticks_diff
+
+## the largest effort magnitude in percent, where MotorDriver saturates
+MAX_EFFORT = 100
+
+## FixedCLController measures each time step in units of 1/2**DT_SHIFT ms, so a 1 or
+## 2 ms interrupt period is still resolved to a few percent
+DT_SHIFT = 4
+
+## the longest time step FixedCLController integrates over, in 1/2**DT_SHIFT ms units,
+## so a long pause cannot turn err*dt into a big integer
+DT_MAX = 1000 << DT_SHIFT
 
 class CLController:
     """! 
     This class implements a closed loop controller based on an input sensor.  This class uses previously created . 
     """
 
-    def __init__ (self, kp, ki, kd, setpoint):
+    def __init__ (self, kp, ki, kd, setpoint, tau=10):
         """! 
         Creates a motor driver by initializing GPIO
         pins and turning off the motor for safety. 
         @param sensor - the sensor the controller will be using and reading to calculate error
-        @param kp - proportional controller constant
-        @param ki - integral controller constant
-        @param kd - derivative controller constant
+        @param kp - proportional controller constant in percent per unit of error
+        @param ki - integral controller constant in percent per unit of error per ms
+        @param kd - derivative controller constant in percent per unit of error per ms
         @param setpoint - the target postition for the controller to aim for
+        @param tau - the time constant of the low pass filter on the derivative in ms.
+               0 turns the filter off.
         @param eff - the effort the controller aims to send to the plant in percentage
         @param curr - the current position/value of the plant
-        @param err_acc - the accumulation of the error used for integral control
-        @param prev_error - a list of previous errors used to calculate derivative control
-        @param self.deriv_amount - the amount of time for each update of the controller (roughly)
+        @param err_acc - the integral of the error over time in ms, used for integral control
+        @param last_err - the error from the previous run, used for derivative control
+        @param deriv - the filtered rate of change of the error per ms
+        @param primed - False until the first run, which has no interval to integrate over
+        @param last_us - the ticks_us() time of the previous run.  The interval between
+               runs is measured in us, since ticks_ms() cannot tell a 1 ms period from
+               a 0 or 2 ms one.
         @param self.initial_time - the initial time for when the controller starts
         @param self.curr_time - the current time of control
         """
@@ -48,33 +61,64 @@ class CLController:
         # error is how far current value is from sensor
         self.err = self.setpoint - self.curr
         self.err_acc = 0
-        self.prev_err_list = []
-        self.deriv_amount = 10
-        self.update_time = 10
-        self.initial_time = utime.ticks_ms()
-        self.curr_time = utime.ticks_diff(utime.ticks_ms(),self.initial_time)
+        self.tau = tau
+        self.last_err = 0
+        self.deriv = 0
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = ticks_diff(ticks_ms(),self.initial_time)
     
     # why would this method accept the setpoint
-    def run(self, measured):
+    def run(self, measured, rate=None):
         """!
         This method calculates the the effort to apply to an actuator based
         measured sensor value and a desired setpoint.  This method implements a
-        PID Controller approach
+        discrete PID Controller using the time measured since the previous run, so
+        it behaves the same at any task period.  The effort is limited to
+        MAX_EFFORT, and while it is the integrator stops growing in that direction.
         @param measured - the measured value from the sensor
+        @param rate - the measured rate of change of the sensor value per ms, for
+               example from Encoder.get_velocity().  If it is given the derivative
+               term acts on it directly, otherwise on the change in error since the
+               previous run.
         @returns self.eff - the effort the motor should push at in terms of percentage
         """
         self.curr = measured
-        self.curr_time = utime.ticks_diff(utime.ticks_ms(),self.initial_time)
-        self.err = self.setpoint - self.curr
-        self.err_acc += self.err
-        self.eff = self.kp*self.err + self.ki*self.err_acc
-        if self.kd > 0:
-            self.prev_err_list.append(self.err)
-        if self.kd > 0 and len(self.prev_err_list) >= self.deriv_amount:
-            err_slope = (self.prev_err_list[self.deriv_amount-1]-self.prev_err_list[0])/(self.deriv_amount*self.update_time)
-            self.eff += self.kd*err_slope
-            self.prev_err_list.pop(0)
-        return self.eff
+        now_us = ticks_us()
+        # the interval in ms, from the microsecond clock
+        dt = ticks_diff(now_us, self.last_us)/1000 if self.primed else 0
+        self.last_us = now_us
+        self.curr_time = ticks_diff(ticks_ms(),self.initial_time)
+        self.primed = True
+        err = self.setpoint - measured
+        self.err = err
+        acc = self.err_acc
+        if dt > 0:
+            acc += err*dt
+            if self.kd:
+                if rate is None:
+                    slope = (err - self.last_err)/dt
+                else:
+                    # the error falls as fast as the measurement rises
+                    slope = -rate
+                # first order low pass filter, discretized for the measured interval
+                self.deriv += (slope - self.deriv)*dt/(self.tau + dt)
+        self.last_err = err
+        eff = self.kp*err + self.ki*acc + self.kd*self.deriv
+        # anti-windup: when saturated, keep the old integral if the error would
+        # only push the effort further past the limit
+        if eff > MAX_EFFORT:
+            eff = MAX_EFFORT
+            if err > 0:
+                acc = self.err_acc
+        elif eff < -MAX_EFFORT:
+            eff = -MAX_EFFORT
+            if err < 0:
+                acc = self.err_acc
+        self.err_acc = acc
+        self.eff = eff
+        return eff
 
     def set_setpoint(self, setpoint):
         """!
@@ -95,14 +139,14 @@ class CLController:
         This method sets the ki based on the function input
         @param ki - the integral gain for the integral part of the PID controller
         """
-        self.ki = self.ki
+        self.ki = ki
 
     def set_kd(self, kd):
         """!
-        This method sets the ki based on the function input
+        This method sets the kd based on the function input
         @param kd - the derivative gain for the derivative part of the PID controller
         """
-        self.kd = self.kd
+        self.kd = kd
 
     def get_pos(self):
         """!
@@ -110,6 +154,20 @@ class CLController:
         @returns self.curr - the current position/value of the plant
         """
         return self.curr
+
+    def get_err(self):
+        """!
+        This method returns the error from the most recent run
+        @returns self.err - the setpoint minus the measured value
+        """
+        return self.err
+
+    def get_eff(self):
+        """!
+        This method returns the effort from the most recent run
+        @returns self.eff - the effort in percent
+        """
+        return self.eff
     
     def get_curr_time(self):
         """!
@@ -126,11 +184,198 @@ class CLController:
         self.eff = 0
         self.err_acc = 0
         self.curr = 0
-        self.initial_time = utime.ticks_ms()
-        self.curr_time = utime.ticks_ms()-self.initial_time
-        
-        
+        self.last_err = 0
+        self.deriv = 0
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = ticks_ms()-self.initial_time
+
+
+class FixedCLController:
+    """!
+    This class implements the same PID controller as CLController using only integer
+    math.  It works directly in encoder counts, so the counts to degrees conversion
+    is folded into gains that are scaled and rounded once at construction.  Every
+    value in run() stays a small integer, so on MicroPython a tick allocates nothing.
+    """
+
+    def __init__ (self, kp, ki, kd, setpoint, counts_per_deg=16*256*4/360, q=16, tau=10):
+        """!
+        Creates a fixed point controller.  The gains and setpoint are given in the
+        same units as CLController so the two can be swapped.
+        @param kp - proportional controller constant in percent per degree
+        @param ki - integral controller constant in percent per degree per ms
+        @param kd - derivative controller constant in percent per degree per ms
+        @param setpoint - the target position in degrees
+        @param counts_per_deg - the number of encoder counts in one degree
+        @param q - the number of fractional bits in the integer gains
+        @param kp_q - the proportional gain scaled to counts and shifted by q bits
+        @param ki_q - the integral gain scaled to counts and shifted by q bits
+        @param kd_q - the derivative gain scaled to counts and shifted by q bits
+        @param tau - the time constant of the low pass filter on the derivative in ms
+        @param tau_q - tau in the 1/2**DT_SHIFT ms units time steps are measured in
+        @param acc_max - the integrator limit that keeps ki_q*err_acc a small integer
+        @param err_acc - the integral of the error in counts times 1/2**DT_SHIFT ms
+        @param deriv - the filtered derivative term, already multiplied by kd_q
+        @param last_us - the ticks_us() time of the previous run
+        """
+        self.counts_per_deg = counts_per_deg
+        self.q = q
+        self.half = 1 << (q-1)
+        self.tau = tau
+        self.tau_q = tau << DT_SHIFT
+        self.kp_q = 0
+        self.ki_q = 0
+        self.kd_q = 0
+        self.acc_max = 0
+        self.set_kp(kp)
+        self.set_ki(ki)
+        self.set_kd(kd)
+        self.setpoint = 0
+        self.set_setpoint(setpoint)
+        self.eff = 0
+        self.curr = 0
+        self.err = self.setpoint
+        self.err_acc = 0
+        self.last_err = 0
+        self.deriv = 0
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = 0
+
+    def run(self, measured):
+        """!
+        This method calculates the effort to apply to the motor from an encoder reading,
+        with the same time scaling, derivative filter and anti-windup as CLController
+        @param measured - the encoder position in counts
+        @returns self.eff - the effort the motor should push at, as an integer percentage
+        """
+        self.curr = measured
+        now_us = ticks_us()
+        # the interval in 1/2**DT_SHIFT ms, rounded, from the microsecond clock
+        dt = ((ticks_diff(now_us, self.last_us) << DT_SHIFT) + 500)//1000 if self.primed else 0
+        if dt > DT_MAX:
+            dt = DT_MAX
+        self.last_us = now_us
+        self.curr_time = ticks_diff(ticks_ms(),self.initial_time)
+        self.primed = True
+        err = self.setpoint - measured
+        self.err = err
+        acc = self.err_acc
+        if dt > 0:
+            acc += err*dt
+            # clamp the integrator so the product below can never become a big integer
+            if acc > self.acc_max:
+                acc = self.acc_max
+            elif acc < -self.acc_max:
+                acc = -self.acc_max
+            if self.kd_q:
+                slope = (self.kd_q*(err - self.last_err) << DT_SHIFT)//dt
+                self.deriv += (slope - self.deriv)*dt//(self.tau_q + dt)
+        self.last_err = err
+        eff = self.kp_q*err + ((self.ki_q*acc) >> DT_SHIFT) + self.deriv
+        # shift back to a percentage, rounding to the nearest integer
+        eff = (eff + self.half) >> self.q
+        if eff > MAX_EFFORT:
+            eff = MAX_EFFORT
+            if err > 0:
+                acc = self.err_acc
+        elif eff < -MAX_EFFORT:
+            eff = -MAX_EFFORT
+            if err < 0:
+                acc = self.err_acc
+        self.err_acc = acc
+        self.eff = eff
+        return eff
+
+    def set_setpoint(self, setpoint):
+        """!
+        This method sets the setpoint, converting it from degrees to encoder counts
+        @param setpoint - the setpoint in degrees
+        """
+        self.setpoint = int(round(setpoint*self.counts_per_deg))
+
+    def set_setpoint_counts(self, setpoint):
+        """!
+        This method sets the setpoint directly in encoder counts, with no conversion
+        @param setpoint - the setpoint in encoder counts, an integer
+        """
+        self.setpoint = setpoint
+
+    def set_kp(self, kp):
+        """!
+        This method sets the proportional gain, scaling it to integer counts
+        @param kp - the proportional gain in percent per degree
+        """
+        self.kp_q = int(round(kp/self.counts_per_deg*(1 << self.q)))
+
+    def set_ki(self, ki):
+        """!
+        This method sets the integral gain, scaling it to integer counts
+        @param ki - the integral gain in percent per degree per ms
+        """
+        self.ki_q = int(round(ki/self.counts_per_deg*(1 << self.q)))
+        # keep ki_q*err_acc under 2**28 so it stays a small integer on MicroPython
+        self.acc_max = (1 << 28)//self.ki_q if self.ki_q else 0
+
+    def set_kd(self, kd):
+        """!
+        This method sets the derivative gain, scaling it to integer counts
+        @param kd - the derivative gain in percent per degree per ms
+        """
+        self.kd_q = int(round(kd/self.counts_per_deg*(1 << self.q)))
+
+    def get_pos(self):
+        """!
+        This method returns the last position given to run()
+        @returns self.curr - the position in encoder counts
+        """
+        return self.curr
+
+    def get_err(self):
+        """!
+        This method returns the error from the most recent run
+        @returns self.err - the setpoint minus the measured value in encoder counts
+        """
+        return self.err
+
+    def get_eff(self):
+        """!
+        This method returns the effort from the most recent run
+        @returns self.eff - the effort in percent
+        """
+        return self.eff
+
+    def get_curr_time(self):
+        """!
+        This method returns the current time of operation of the controller
+        @returns self.curr_time - the current time of operation of the controller in ms
+        """
+        return self.curr_time
+
+    def reset_controller(self):
+        """!
+        This method resets the controller to run again
+        """
+        self.err = 0
+        self.eff = 0
+        self.err_acc = 0
+        self.curr = 0
+        self.last_err = 0
+        self.deriv = 0
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = 0
+
+
 if __name__ == "__main__":
+    import pyb
+    from Lab4.hal import sleep_ms
+    from Lab4.encoder_reader import Encoder
+    from Lab4.motor_driver import MotorDriver
     # create pin to power motor
     en_pin =  pyb.Pin(pyb.Pin.board.PA10, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value=1)
     
@@ -173,4 +418,4 @@ if __name__ == "__main__":
         except ValueError:
             motor.set_duty_cycle(0)
             raise ValueError
-        utime.sleep_ms(1)
+        sleep_ms(1)
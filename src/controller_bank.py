@@ -0,0 +1,167 @@
+"""!
+@file controller_bank.py
+This file contains a controller that runs the CLController PID law for many axes at
+once.  The gains, setpoints, integrators and derivative filters of every axis are kept
+in parallel arrays, so a single task can step all of the axes in one call instead of
+needing one task and one CLController per motor.  The arrays hold floats at the same
+precision as a Python float on the platform, single on the board and double on a PC,
+so every axis gives the same effort as a CLController would on the same platform.
+"""
+from array import array
+from Lab4.hal import ticks_ms, ticks_us, ticks_diff
+
+## the largest effort magnitude in percent, where MotorDriver saturates
+MAX_EFFORT = 100
+
+## the array typecode that stores a Python float without rounding it, 'f' where
+## floats are single precision like on the board and 'd' where they are double
+FLOAT = 'f' if array('f', [0.1])[0] == 0.1 else 'd'
+
+
+class ControllerBank:
+    """!
+    This class implements a bank of PID controllers, one per axis, stored as
+    parallel arrays.  Each axis follows the same control law as CLController.
+    """
+
+    def __init__ (self, kp, ki, kd, setpoints, tau=10):
+        """!
+        Creates a controller bank.  Every argument is a list with one entry per axis.
+        @param kp - proportional controller constants
+        @param ki - integral controller constants, per ms
+        @param kd - derivative controller constants, per ms
+        @param setpoints - the target position of each axis
+        @param tau - the time constant of the derivative filter in ms, shared by every axis
+        @param n - the number of axes
+        @param eff - the most recent effort of each axis in percent
+        @param curr - the most recent measured value of each axis
+        @param err_acc - the integral of the error of each axis over time in ms
+        @param last_err - the error of each axis from the previous run
+        @param deriv - the filtered rate of change of the error of each axis per ms
+        @param primed - False until the first run, which has no interval to integrate over
+        @param last_us - the ticks_us() time of the previous run, so the interval is
+               measured to the us like CLController
+        """
+        self.n = len(setpoints)
+        self.kp = array(FLOAT, kp)
+        self.ki = array(FLOAT, ki)
+        self.kd = array(FLOAT, kd)
+        self.setpoint = array(FLOAT, setpoints)
+        self.eff = array(FLOAT, [0] * self.n)
+        self.curr = array(FLOAT, [0] * self.n)
+        self.err_acc = array(FLOAT, [0] * self.n)
+        self.last_err = array(FLOAT, [0] * self.n)
+        self.deriv = array(FLOAT, [0] * self.n)
+        self.tau = tau
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = 0
+
+    def run(self, measured):
+        """!
+        This method calculates the effort of every axis from their measured values
+        @param measured - a list or array with the measured value of each axis
+        @returns self.eff - the array of efforts in percent, one per axis.  The same
+                 array is reused every call.
+        """
+        now_us = ticks_us()
+        # the interval in ms, from the microsecond clock
+        dt = ticks_diff(now_us, self.last_us)/1000 if self.primed else 0
+        self.last_us = now_us
+        self.curr_time = ticks_diff(ticks_ms(),self.initial_time)
+        self.primed = True
+        # every axis is stepped together so the interval and filter weight are shared
+        alpha = dt/(self.tau + dt) if dt > 0 else 0
+        n = self.n
+        i = 0
+        while i < n:
+            curr = measured[i]
+            self.curr[i] = curr
+            err = self.setpoint[i] - curr
+            acc = self.err_acc[i]
+            kd = self.kd[i]
+            deriv = self.deriv[i]
+            if dt > 0:
+                acc += err*dt
+                if kd:
+                    deriv += ((err - self.last_err[i])/dt - deriv)*alpha
+                    self.deriv[i] = deriv
+            self.last_err[i] = err
+            eff = self.kp[i]*err + self.ki[i]*acc + kd*deriv
+            # the same anti-windup as CLController
+            if eff > MAX_EFFORT:
+                eff = MAX_EFFORT
+                if err > 0:
+                    acc = self.err_acc[i]
+            elif eff < -MAX_EFFORT:
+                eff = -MAX_EFFORT
+                if err < 0:
+                    acc = self.err_acc[i]
+            self.err_acc[i] = acc
+            self.eff[i] = eff
+            i += 1
+        return self.eff
+
+    def set_setpoint(self, axis, setpoint):
+        """!
+        This method sets the setpoint of one axis
+        @param axis - the index of the axis
+        @param setpoint - the setpoint to set the axis to
+        """
+        self.setpoint[axis] = setpoint
+
+    def set_gains(self, axis, kp, ki, kd):
+        """!
+        This method sets the PID gains of one axis
+        @param axis - the index of the axis
+        @param kp - the proportional gain
+        @param ki - the integral gain
+        @param kd - the derivative gain
+        """
+        self.kp[axis] = kp
+        self.ki[axis] = ki
+        self.kd[axis] = kd
+
+    def get_pos(self, axis):
+        """!
+        This method returns the most recent measured value of one axis
+        @param axis - the index of the axis
+        @returns the measured value passed to the last run()
+        """
+        return self.curr[axis]
+
+    def get_curr_time(self):
+        """!
+        This method returns the current time of operation of the bank
+        @returns self.curr_time - the current time of operation in ms
+        """
+        return self.curr_time
+
+    def reset_axis(self, axis):
+        """!
+        This method resets the integrator and derivative filter of one axis without
+        disturbing the others
+        @param axis - the index of the axis
+        """
+        self.eff[axis] = 0
+        self.err_acc[axis] = 0
+        self.last_err[axis] = self.setpoint[axis] - self.curr[axis]
+        self.deriv[axis] = 0
+
+    def reset_controller(self):
+        """!
+        This method resets every axis to run again
+        """
+        i = 0
+        while i < self.n:
+            self.eff[i] = 0
+            self.curr[i] = 0
+            self.err_acc[i] = 0
+            self.last_err[i] = 0
+            self.deriv[i] = 0
+            i += 1
+        self.primed = False
+        self.last_us = ticks_us()
+        self.initial_time = ticks_ms()
+        self.curr_time = 0
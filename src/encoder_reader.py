@@ -7,49 +7,91 @@ if the encoder can handle overflows both positively and negatively, and if the e
 @author Jared Sinasohn, Sydney Ulvick, Sean Nakashimo
 @date 15-Feb-2024
 """
-import micropython
-import pyb
-import utime
+from array import array
+from Lab4.hal import ticks_us, ticks_diff, default_backend
 
 class Encoder:
     """! 
     This class implements an encoder for an ME405 kit. 
     """
 
-    def __init__ (self, pin1, pin2, timer):
+    def __init__ (self, pin1, pin2, timer, window=4, backend=None):
         """! 
-        Creates a motor driver by initializing GPIO
-        pins, setting up timer channels to read encoder values.
+        Creates an encoder.  The timer channels are not set up until the first
+        read() or zero(), or an explicit call to setup().
         @param pin1 - the pin that encoder channel A will send data to
         @param pin2 - the pin that encoder channel B will send data to
         @param timer - the timer the encoder will use for counting its ticks
-        @param ch1 - the PWM timing channel used by the first input pin
-        @param ch2 - the PWM timing channel used by the second input pin
+        @param window - the number of reads the velocity and acceleration are
+               estimated over, an even number
+        @param backend - the hal backend that sets up the timer channels, the pyb
+               one by default
+        @param ch1 - the timer channel used by the first input pin, None until setup()
+        @param ch2 - the timer channel used by the second input pin, None until setup()
+        @param ready - True once setup() has configured the timer channels
         @param pos - the position of the encoder
         @param prev - the previous reading of the encoder
         @param new - the new value of the encoder that has just been read
+        @param counter_range - the number of counts before the timer counter wraps, the period + 1
+        @param half_range - half of counter_range, the delta that indicates an overflow
+        @param time - the ticks_us() time of the most recent read
+        @param hist_delta - the change in position at each of the last window+1 reads,
+               as a ring buffer.  Changes are stored instead of positions since they
+               always fit in 32 bits, however far the motor turns.
+        @param hist_time - the times of the last window+1 reads in us, as a ring buffer
+        @param hist_idx - the slot in the ring buffers holding the most recent read
+        @param hist_count - how many reads are in the ring buffers, up to window+1
+        @param half - the number of reads in the newer half of the window
+        @param moved - the change in position over the last window reads, kept as a
+               running sum
+        @param moved_half - the change in position over the last half reads, kept
+               as a running sum
         """
         # initialize passed through variables to self variables
         self.pin1 = pin1
         self.pin2 = pin2
         self.timer = timer
+        self.backend = backend if backend is not None else default_backend
+        self.ch1 = None
+        self.ch2 = None
+        self.ready = False
         
-        # set up each channel for data collection.  Both should trigger on
-        # both encoder channel edges, and set to their respective pins
-        self.ch1 = self.timer.channel(1, pyb.Timer.ENC_AB, pin=self.pin1)
-        self.ch2 = self.timer.channel(2, pyb.Timer.ENC_AB, pin=self.pin2)
-        print("\nCreating encoder")
-        
-        # initialize counter to zero
-        self.timer.counter(0)
+        # cache the counter range so reads do not need to ask the timer
+        self.cache_period()
         
-        # set the initial encoder position to the counter
-        self.pos = self.timer.counter()
+        # the counter is zeroed by setup(), so the position starts at zero
+        self.pos = 0
         
         # initialize previous encoder val and new encoder val.  Both are
         # used in delta calculations
         self.prev = 0
         self.new = 0
+        
+        # preallocate the history the rates are estimated from so reads never
+        # allocate.  The changes over the window and its newer half are kept as
+        # running sums so a rate never has to add up the whole window
+        self.window = window
+        self.half = window//2
+        self.hist_delta = array('i', [0] * (window + 1))
+        self.hist_time = array('i', [0] * (window + 1))
+        self.hist_idx = 0
+        self.hist_count = 0
+        self.moved = 0
+        self.moved_half = 0
+        self.time = 0
+
+    def setup(self):
+        """!
+        This method sets up the timer channels and zeroes the counter.  It runs on
+        the first read() or zero(), and can be called earlier to do it before the
+        control loop starts.
+        """
+        # set up each channel for data collection.  Both should trigger on
+        # both encoder channel edges, and set to their respective pins
+        self.ch1 = self.backend.encoder_channel(self.timer, 1, self.pin1)
+        self.ch2 = self.backend.encoder_channel(self.timer, 2, self.pin2)
+        self.ready = True
+        self.zero()
 
     def read(self):
         """!
@@ -57,55 +99,165 @@ class Encoder:
         It accounts for overflows and adjusts accordingly.
         @returns self.pos - the position of the encoder
         """
-        
-        # the AR is the max value of the encoder.  This is equal to the period
-        # of the timer
-        AR = self.timer.period()
-        
-        # the new encoder value is the current value of the timer
-        self.new = self.timer.counter()
+        if not self.ready:
+            self.setup()
+        now = ticks_us()
+        return self.update(self.timer.counter(), now)
+
+    def update(self, new, now=None):
+        """!
+        This method updates the encoder position from a counter value that has
+        already been read.  read_many() uses this so it can latch several
+        counters back to back before doing any of the overflow math.
+        @param new - the raw counter value of the timer
+        @param now - the ticks_us() time the counter was read at.  The current time
+               is used if it is not given.
+        @returns self.pos - the position of the encoder
+        """
+        if now is None:
+            now = ticks_us()
+        self.new = new
         
         # delta is the difference between the previous encoder value and the new encoder value
-        delta = self.new-self.prev
+        delta = new-self.prev
         
-        # the overflow value is the value that indicates there is probably an overflow
-        # it is half of the maximum encoder value
-        overflow = (AR+1)/2
-        
-        # if the delta is bigger than the overflow value, the value underflowed and so
-        # we need to subtract the period + 1 from the delta
-        if delta >= overflow:
-            delta -= overflow*2
-            
-        # if the delta is smaller than negative of the overflow value, the value overflowed and so
-        # we need to add the period + 1 to the delta
-        elif delta <= -1*overflow:
-            delta += overflow*2
-            
-        # if neither of these conditions are met, we good
-        else:
-            delta = delta
+        # if the delta is at least half the counter range, the value underflowed and so
+        # we need to subtract the period + 1 from the delta.  If it is at most negative
+        # half the range, the value overflowed and we need to add the period + 1.
+        # all of these are integers so the delta never turns into a float
+        if delta >= self.half_range:
+            delta -= self.counter_range
+        elif delta <= -self.half_range:
+            delta += self.counter_range
             
         # add the delta to the position
-        # note, for some reason the delta when it overflows will convert to a float
-        # so i am casting to an int to compensate.  I think it may be because my
-        # AR value is using a single backslash but I am not certain
-        self.pos += int(delta)
+        self.pos += delta
         
         # the current motor count is now the previous motor count for the next reading
-        self.prev = self.new
+        self.prev = new
+        
+        # store the change and time over the oldest read in the history.  The
+        # first read after a reset has nothing before it in the history, so its
+        # change is stored as zero and never counts toward a rate
+        count = self.hist_count
+        if count == 0:
+            delta = 0
+        idx = self.hist_idx + 1
+        if idx > self.window:
+            idx = 0
+        
+        # add the new change to the running sums and take off the changes that
+        # just dropped out of them, once there are enough reads for that
+        self.moved += delta
+        self.moved_half += delta
+        if count >= self.window:
+            self.moved -= self.hist_delta[self._back(self.window - 1)]
+        if count >= self.half:
+            self.moved_half -= self.hist_delta[self._back(self.half - 1)]
+        
+        self.hist_delta[idx] = delta
+        self.hist_time[idx] = now
+        self.hist_idx = idx
+        if count <= self.window:
+            self.hist_count = count + 1
+        self.time = now
         
         # return the position
         return self.pos
+    
+    def _back(self, n):
+        """!
+        This method finds the slot of an older read in the history
+        @param n - how many reads back from the most recent one
+        @returns the index of that read in hist_delta and hist_time
+        """
+        idx = self.hist_idx - n
+        if idx < 0:
+            idx += self.window + 1
+        return idx
+    
+    def get_time(self):
+        """!
+        This method returns the time of the most recent read
+        @returns self.time - the ticks_us() time the counter was read at
+        """
+        return self.time
+    
+    def get_dt(self):
+        """!
+        This method returns the time between the two most recent reads
+        @returns the time between the reads in us, or 0 before the second read
+        """
+        if self.hist_count < 2:
+            return 0
+        return ticks_diff(self.hist_time[self.hist_idx], self.hist_time[self._back(1)])
+    
+    def get_velocity(self):
+        """!
+        This method estimates the velocity from the reads in the history window.
+        The estimate is the change in position over the measured time between the
+        oldest and the newest read, so it does not depend on the reads being evenly
+        spaced.
+        @returns the velocity in counts per second, or 0 before the second read
+        """
+        n = self.hist_count - 1
+        if n < 1:
+            return 0.0
+        idx = self.hist_idx
+        old = self._back(n)
+        dt = ticks_diff(self.hist_time[idx], self.hist_time[old])
+        if dt <= 0:
+            return 0.0
+        return self.moved*1000000/dt
+    
+    def get_acceleration(self):
+        """!
+        This method estimates the acceleration from the reads in the history window.
+        The window is split in half, the velocity is estimated over each half, and
+        the change in velocity is divided by the time between the middles of the halves.
+        @returns the acceleration in counts per second squared, or 0 until the
+                 history is full
+        """
+        if self.hist_count <= self.window:
+            return 0.0
+        idx = self.hist_idx
+        mid = self._back(self.half)
+        old = self._back(self.window)
+        dt_new = ticks_diff(self.hist_time[idx], self.hist_time[mid])
+        dt_old = ticks_diff(self.hist_time[mid], self.hist_time[old])
+        if dt_new <= 0 or dt_old <= 0:
+            return 0.0
+        v_new = self.moved_half*1000000/dt_new
+        v_old = (self.moved - self.moved_half)*1000000/dt_old
+        return (v_new - v_old)*2000000/(dt_new + dt_old)
         
+    def cache_period(self):
+        """!
+        This method reads the auto reload value of the timer and stores the
+        counter range and overflow threshold so read() does not have to
+        compute them every time.  It is called at construction and by zero(),
+        and should be called again if the timer period is ever changed.
+        """
+        # the AR is the max value of the encoder.  This is equal to the period
+        # of the timer
+        self.counter_range = self.timer.period() + 1
+        # the overflow value is the value that indicates there is probably an overflow
+        # it is half of the counter range
+        self.half_range = self.counter_range // 2
     
     def zero(self):
         """!
         This method resets the current encoder value and the
         position of the encoder to zero.
         """
+        if not self.ready:
+            # setup() zeroes the counter once the channels are configured
+            self.setup()
+            return
         # set the value of the counter to zero
         self.timer.counter(0)
+        # refresh the cached counter range in case the timer was reconfigured
+        self.cache_period()
         # set the value of the encoder of the position within the class
         # to zero
         self.pos = 0
@@ -113,11 +265,58 @@ class Encoder:
         # future calculations
         self.prev = 0
         self.new = 0
+        # the position jumped, so the history no longer describes the motion
+        self.hist_count = 0
+        self.moved = 0
+        self.moved_half = 0
+
+def latch_many(encoders, out):
+    """!
+    This function latches the raw counters of several encoders back to back, with
+    nothing else between the reads, so the axes are sampled at nearly the same instant
+    @param encoders - a list or tuple of Encoder objects
+    @param out - a preallocated list or array to fill with the raw counter values
+    """
+    n = len(encoders)
+    i = 0
+    while i < n:
+        if not encoders[i].ready:
+            encoders[i].setup()
+        i += 1
+    i = 0
+    while i < n:
+        out[i] = encoders[i].timer.counter()
+        i += 1
+
+def read_many(encoders, out=None):
+    """!
+    This function reads several encoders with as little time between them as
+    possible.  All the counters are latched back to back first and the overflow
+    math is done afterwards, so axes are sampled at nearly the same instant.
+    @param encoders - a list or tuple of Encoder objects
+    @param out - an optional preallocated list or array to fill with the positions,
+           so repeated calls do not allocate
+    @returns out - the positions of the encoders, in the same order
+    """
+    n = len(encoders)
+    if out is None:
+        out = [0] * n
+    # latch every counter first, all stamped with the same time
+    now = ticks_us()
+    latch_many(encoders, out)
+    # then turn the raw counts into positions
+    i = 0
+    while i < n:
+        out[i] = encoders[i].update(out[i], now)
+        i += 1
+    return out
 
 if __name__ == "__main__":
     # Testing code to test encoder.  This code does not run the motor, the motor
     # is simply hand spun to determine if the encoder reads properly.
     # This code does not run if the file is imported as a module
+    import pyb
+    from Lab4.hal import sleep_ms
     
     # create the pin object to read encoder channel A
     pin1 = pyb.Pin(pyb.Pin.board.PC6, pyb.Pin.IN)
@@ -159,5 +358,5 @@ if __name__ == "__main__":
         # the encoder won't overflow due to a rotation being completed before
         # the code updates.  10ms when pushed by a hand is probably
         # fine.  We haven't overflowed yet.
-        utime.sleep_ms(10)
+        sleep_ms(10)
 
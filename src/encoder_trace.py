@@ -0,0 +1,141 @@
+"""!
+@file encoder_trace.py
+This file contains a recorder for the raw encoder counter values, controller times,
+setpoints and efforts of one axis, and functions to save and load them as a binary trace file.
+A trace recorded on the board can be replayed on a PC through Encoder and the
+controller with tools/replay_trace.py to check that a changed controller still
+gives the same efforts as the one that ran on the board.
+
+Trace file layout, all values little endian:
+  - 4 bytes  magic number b'ETRC'
+  - uint16   version, currently 2
+  - uint16   length of the settings in bytes
+  - settings JSON text describing the controller, for example
+             {"controller": "fixed", "kp": 1.5, "ki": 0, "kd": 0, "setpoint": 180}
+  - uint32   number of samples n
+  - n int32  raw timer counter values read by the encoder
+  - n uint32 controller times in ms, from get_curr_time()
+  - n float32 setpoints, in the controller's own units
+  - n float32 efforts returned by the controller
+  - n uint32 ticks_us() times of the controller steps, which the controller
+             measures its intervals from.  Version 1 files do not have them.
+"""
+import json
+import struct
+from array import array
+
+## first four bytes of every trace file
+MAGIC = b'ETRC'
+
+## version of the trace file layout
+VERSION = 2
+
+
+class EncoderTrace:
+    """!
+    This class implements a fixed size trace of one axis.  Recording stops when
+    the trace is full, so the start of a run is always kept intact for replay.
+    """
+
+    def __init__ (self, size, settings):
+        """!
+        Creates an empty trace
+        @param size - the largest number of samples kept
+        @param settings - a dictionary describing the controller, saved with the
+               trace so the replay can build the same one
+        @param counter - the raw timer counter value of each sample
+        @param time - the controller time of each sample in ms
+        @param setpoint - the controller setpoint of each sample, which changes
+               every tick while following a motion profile
+        @param eff - the effort of each sample
+        @param stamp - the ticks_us() time of the controller step of each sample
+        @param count - the number of samples recorded
+        """
+        self.size = size
+        self.settings = settings
+        self.counter = array('i', [0] * size)
+        self.time = array('I', [0] * size)
+        self.setpoint = array('f', [0] * size)
+        self.eff = array('f', [0] * size)
+        self.stamp = array('I', [0] * size)
+        self.count = 0
+
+    def record(self, counter, time, setpoint, eff, stamp=0):
+        """!
+        This method stores one sample if there is room
+        @param counter - the raw timer counter value, Encoder.new after read()
+        @param time - the controller time in ms
+        @param setpoint - the setpoint the controller used
+        @param eff - the effort returned by the controller
+        @param stamp - the ticks_us() time of the controller step, the last_us of
+               the controller
+        """
+        n = self.count
+        if n < self.size:
+            self.counter[n] = counter
+            self.time[n] = time
+            self.setpoint[n] = setpoint
+            self.eff[n] = eff
+            self.stamp[n] = stamp
+            self.count = n + 1
+
+    def full(self):
+        """!
+        This method tells whether the trace has run out of room
+        @returns True if no more samples will be recorded
+        """
+        return self.count >= self.size
+
+    def save(self, path):
+        """!
+        This method writes the recorded samples to a trace file
+        @param path - the file to write
+        """
+        settings = json.dumps(self.settings).encode()
+        n = self.count
+        with open(path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<HH', VERSION, len(settings)))
+            file.write(settings)
+            file.write(struct.pack('<I', n))
+            # write only the used part of each array, through memoryviews so
+            # nothing is copied
+            file.write(memoryview(self.counter)[:n])
+            file.write(memoryview(self.time)[:n])
+            file.write(memoryview(self.setpoint)[:n])
+            file.write(memoryview(self.eff)[:n])
+            file.write(memoryview(self.stamp)[:n])
+
+
+def load(path):
+    """!
+    This function reads a trace file
+    @param path - the file to read
+    @returns an EncoderTrace holding the samples and settings from the file.  A
+             version 1 file has no step times, so they are made from the times in ms.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[0:4] != MAGIC:
+        raise ValueError("not an encoder trace: " + str(path))
+    version, length = struct.unpack_from('<HH', data, 4)
+    if version not in (1, VERSION):
+        raise ValueError("unsupported trace version " + str(version))
+    pos = 8
+    settings = json.loads(data[pos:pos + length].decode())
+    pos += length
+    n = struct.unpack_from('<I', data, pos)[0]
+    pos += 4
+    trace = EncoderTrace(n, settings)
+    names = ('counter', 'time', 'setpoint', 'eff', 'stamp') if version > 1 else \
+            ('counter', 'time', 'setpoint', 'eff')
+    for name in names:
+        values = getattr(trace, name)
+        size = n * values.itemsize
+        values[:] = array(values.typecode, data[pos:pos + size])
+        pos += size
+    if version == 1:
+        for i in range(n):
+            trace.stamp[i] = trace.time[i]*1000
+    trace.count = n
+    return trace
@@ -0,0 +1,139 @@
+"""!
+@file hal.py
+This file contains a thin hardware abstraction layer between the lab code and the
+MicroPython pyb, utime and micropython modules.  The tick functions come from utime
+when it exists and from a stand in built on the time module otherwise, so the
+controllers, encoder, motor driver and instrumentation import on any computer.
+Timer channels are configured through a backend object that only imports pyb the
+first time it is used, and Encoder and MotorDriver only ask their backend to set up
+the hardware on their first read or duty cycle, so creating them costs almost
+nothing at startup.  A different backend can be passed to either class to run them
+against other hardware or a test double.
+"""
+try:
+    from utime import ticks_ms, ticks_us, ticks_diff, sleep_ms
+except ImportError:
+    import time as _time
+
+    ## the tick counters wrap at this value, matching the MicroPython ports
+    TICKS_PERIOD = 1 << 30
+    _TICKS_MAX = TICKS_PERIOD - 1
+    _TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+    def ticks_ms():
+        """!
+        This function stands in for utime.ticks_ms() on a computer
+        @returns the current tick count in milliseconds
+        """
+        return (_time.perf_counter_ns() // 1000000) & _TICKS_MAX
+
+    def ticks_us():
+        """!
+        This function stands in for utime.ticks_us() on a computer
+        @returns the current tick count in microseconds
+        """
+        return (_time.perf_counter_ns() // 1000) & _TICKS_MAX
+
+    def ticks_diff(ticks1, ticks2):
+        """!
+        This function stands in for utime.ticks_diff() on a computer
+        @param ticks1 - the later tick value
+        @param ticks2 - the earlier tick value
+        @returns the signed difference between the two tick values
+        """
+        diff = (ticks1 - ticks2) & _TICKS_MAX
+        return ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+    def sleep_ms(ms):
+        """!
+        This function stands in for utime.sleep_ms() on a computer
+        @param ms - the time to sleep in milliseconds
+        """
+        _time.sleep(ms/1000)
+
+
+def alloc_emergency_exception_buf(size):
+    """!
+    This function reserves memory for reporting exceptions raised in interrupts.
+    It does nothing where the micropython module does not exist.
+    @param size - the size of the buffer in bytes
+    """
+    try:
+        import micropython
+    except ImportError:
+        return
+    micropython.alloc_emergency_exception_buf(size)
+
+
+class PybBackend:
+    """!
+    This class implements the hardware backend for the pyb module.  pyb is imported
+    the first time the backend is used, not when it is created.
+    """
+
+    def __init__ (self):
+        """!
+        Creates the backend without touching any hardware
+        @param pyb - the pyb module once it has been imported, None before
+        """
+        self.pyb = None
+
+    def module(self):
+        """!
+        This method imports pyb the first time it is needed
+        @returns the pyb module
+        """
+        if self.pyb is None:
+            import pyb
+            self.pyb = pyb
+        return self.pyb
+
+    def pin(self, name, mode, pull=None, value=None):
+        """!
+        This method creates a pin from its board name
+        @param name - the board pin name, for example "PA10"
+        @param mode - the name of the pyb.Pin mode, for example "OUT_PP"
+        @param pull - the name of the pyb.Pin pull, for example "PULL_UP", or None
+        @param value - the initial value of an output pin, or None
+        @returns the pyb.Pin
+        """
+        pyb = self.module()
+        kwargs = {"mode": getattr(pyb.Pin, mode)}
+        if pull is not None:
+            kwargs["pull"] = getattr(pyb.Pin, pull)
+        if value is not None:
+            kwargs["value"] = value
+        return pyb.Pin(getattr(pyb.Pin.board, name), **kwargs)
+
+    def timer(self, number, **kwargs):
+        """!
+        This method creates a timer
+        @param number - the timer number
+        @param kwargs - the settings passed on to pyb.Timer, such as freq or period
+        @returns the pyb.Timer
+        """
+        return self.module().Timer(number, **kwargs)
+
+    def encoder_channel(self, timer, number, pin):
+        """!
+        This method sets up a timer channel to count quadrature encoder edges
+        @param timer - the timer counting the encoder
+        @param number - the channel number, 1 or 2
+        @param pin - the pin of the encoder channel
+        @returns the timer channel
+        """
+        return timer.channel(number, self.module().Timer.ENC_AB, pin=pin)
+
+    def pwm_channel(self, timer, number, pin):
+        """!
+        This method sets up a timer channel to generate PWM
+        @param timer - the timer generating the PWM
+        @param number - the channel number
+        @param pin - the pin driven by the channel
+        @returns the timer channel
+        """
+        return timer.channel(number, self.module().Timer.PWM, pin=pin)
+
+
+## the backend used by Encoder and MotorDriver when none is given
+default_backend = PybBackend()
@@ -0,0 +1,123 @@
+"""!
+@file isr_control.py
+This file contains a class that runs the encoder read, controller and motor driver
+step for one or more axes from a hardware timer interrupt instead of a cotask task.
+Because MicroPython does not allow heap allocation inside an interrupt, the axes must
+use FixedCLController, and every value the interrupt touches is preallocated.
+"""
+from array import array
+from Lab4.hal import alloc_emergency_exception_buf
+
+
+class ISRControl:
+    """!
+    This class implements timer interrupt driven closed loop control.  The
+    interrupt only reads encoders, runs the controllers and sets duty cycles.
+    Positions, efforts and the tick count are written into preallocated arrays
+    so a cotask task can pick them up for telemetry and supervision.  A task that
+    finds a fault calls halt() so the interrupt stops driving that axis.
+    """
+
+    def __init__ (self, timer, freq, encoders, controllers, motors):
+        """!
+        Creates the interrupt controller.  Nothing runs until start() is called.
+        @param timer - the pyb.Timer that will generate the control interrupt
+        @param freq - the control rate in Hz
+        @param encoders - a list of Encoder objects, one per axis
+        @param controllers - a list of FixedCLController objects, one per axis
+        @param motors - a list of MotorDriver objects, one per axis
+        @param pos - the last encoder position of each axis in counts
+        @param eff - the last effort of each axis in percent
+        @param tick_count - the number of interrupts that have run
+        @param enabled - 1 for every axis the interrupt drives, 0 for a halted one
+        """
+        self.timer = timer
+        self.freq = freq
+        # store the axes as tuples so the interrupt can index them without allocating
+        self.encoders = tuple(encoders)
+        self.controllers = tuple(controllers)
+        self.motors = tuple(motors)
+        self.n = len(self.encoders)
+        self.pos = array('i', [0] * self.n)
+        self.eff = array('i', [0] * self.n)
+        self.tick_count = 0
+        self.enabled = bytearray([1] * self.n)
+        # creating a bound method allocates, so do it once here and not in start()
+        self.tick_cb = self.tick
+
+    def tick(self, timer):
+        """!
+        This method is the timer callback.  It runs one control step for each axis
+        using a while loop, since a for loop over a tuple creates an iterator.
+        @param timer - the timer that triggered the interrupt
+        """
+        i = 0
+        while i < self.n:
+            pos = self.encoders[i].read()
+            eff = self.controllers[i].run(pos)
+            if self.enabled[i]:
+                self.motors[i].set_duty_cycle(eff)
+            self.pos[i] = pos
+            self.eff[i] = eff
+            i += 1
+        self.tick_count += 1
+
+    def start(self):
+        """!
+        This method sets up the timer channels of every encoder and motor that has
+        not been set up yet, then configures the timer and attaches the control
+        interrupt.  The encoders and motors set themselves up on first use, which
+        allocates, so it must not be left to the first interrupt.
+        """
+        for encoder in self.encoders:
+            if not encoder.ready:
+                encoder.setup()
+        for motor in self.motors:
+            if motor.ch1 is None:
+                motor.setup()
+        # let exceptions raised inside the interrupt be reported
+        alloc_emergency_exception_buf(100)
+        self.timer.init(freq=self.freq)
+        self.timer.callback(self.tick_cb)
+
+    def stop(self):
+        """!
+        This method detaches the control interrupt and turns every motor off
+        """
+        self.timer.callback(None)
+        for motor in self.motors:
+            motor.set_duty_cycle(0)
+
+    def halt(self, axis):
+        """!
+        This method stops the interrupt from driving an axis and turns its motor off.
+        The axis keeps being read and its controller keeps running.
+        @param axis - the index of the axis
+        """
+        # clear the flag first, so an interrupt between the two lines cannot drive
+        # the motor again after it is disabled
+        self.enabled[axis] = 0
+        self.motors[axis].disable()
+
+    def resume(self, axis):
+        """!
+        This method lets the interrupt drive a halted axis again
+        @param axis - the index of the axis
+        """
+        self.enabled[axis] = 1
+
+    def get_pos(self, axis):
+        """!
+        This method returns the position of an axis from the most recent interrupt
+        @param axis - the index of the axis
+        @returns the position in encoder counts
+        """
+        return self.pos[axis]
+
+    def get_eff(self, axis):
+        """!
+        This method returns the effort of an axis from the most recent interrupt
+        @param axis - the index of the axis
+        @returns the effort in percent
+        """
+        return self.eff[axis]
@@ -0,0 +1,198 @@
+"""!
+@file loop_timing.py
+This file contains lightweight timing instrumentation for the control loops.  Each
+stage of a loop (encoder read, controller run, duty cycle update, logging) and the interval
+between loop iterations is timed in microseconds and counted into a fixed bucket
+histogram, so timing can be left on while the motors run without allocating memory.
+show_all() formats every loop timer for printing at shutdown next to task_share.show_all().
+"""
+from array import array
+from Lab4.hal import ticks_us, ticks_diff
+
+## stage index for the encoder read
+READ = 0
+
+## stage index for the controller run
+RUN = 1
+
+## stage index for the duty cycle update
+SET = 2
+
+## stage index for recording and queueing the results
+LOG = 3
+
+## names of the stages, in stage index order
+STAGE_NAMES = ("read", "run", "set", "log")
+
+## every LoopTimer that has been created, so show_all() can print them
+_timers = []
+
+
+class Histogram:
+    """!
+    This class implements a histogram with a fixed number of equal width buckets.
+    Values below the first bucket are counted in the first bucket and values above
+    the last bucket in the last bucket.  The minimum, maximum and total are also
+    kept.  The total is split over two integers so it never outgrows a small
+    integer, which would allocate on MicroPython.
+    """
+
+    def __init__ (self, low, width, buckets=32, unit="us"):
+        """!
+        Creates an empty histogram
+        @param low - the lowest value of the first bucket
+        @param width - the width of every bucket
+        @param buckets - the number of buckets
+        @param unit - the unit printed after each bucket
+        """
+        self.low = low
+        self.width = width
+        self.buckets = buckets
+        self.unit = unit
+        self.counts = array('I', [0] * buckets)
+        self.clear()
+
+    def add(self, value):
+        """!
+        This method counts one value
+        @param value - the value to count, an integer
+        """
+        idx = (value - self.low)//self.width
+        if idx < 0:
+            idx = 0
+        elif idx >= self.buckets:
+            idx = self.buckets - 1
+        self.counts[idx] += 1
+        self.n += 1
+        lo = self.total_lo + value
+        if lo >= 0x100000 or lo < 0:
+            self.total_hi += lo >> 20
+            lo &= 0xFFFFF
+        self.total_lo = lo
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def clear(self):
+        """!
+        This method empties the histogram
+        """
+        for i in range(self.buckets):
+            self.counts[i] = 0
+        self.n = 0
+        self.total_hi = 0
+        self.total_lo = 0
+        self.min = 1 << 29
+        self.max = -(1 << 29)
+
+    def __str__(self):
+        """!
+        This method formats the histogram, listing only buckets that have counts
+        @returns the formatted histogram
+        """
+        if self.n == 0:
+            return "    no samples"
+        total = (self.total_hi << 20) + self.total_lo
+        lines = [f"    n={self.n} min={self.min} mean={total//self.n} max={self.max}"]
+        for i in range(self.buckets):
+            if self.counts[i]:
+                start = self.low + i*self.width
+                if i == 0 and self.min < start:
+                    label = f"<{start + self.width}"
+                elif i == self.buckets - 1 and self.max >= start + self.width:
+                    label = f">={start}"
+                else:
+                    label = f"{start}-{start + self.width}"
+                lines.append(f"    {label:>14} {self.unit}: {self.counts[i]}")
+        return "\n".join(lines)
+
+
+class LoopTimer:
+    """!
+    This class implements the timing instrumentation for one control loop.  Call
+    tick() at the top of every iteration and mark() after each stage.
+    """
+
+    def __init__ (self, name, period_us, stage_width=20, buckets=32, alloc=None):
+        """!
+        Creates a loop timer and registers it with show_all()
+        @param name - the name printed with the timings
+        @param period_us - the nominal period of the loop in microseconds.  The
+               interval histogram is centered on it.
+        @param stage_width - the bucket width of the stage histograms in microseconds
+        @param buckets - the number of buckets in every histogram
+        @param alloc - an optional AllocProfile from alloc_profile whose tick() and
+               mark() are called along with this timer's, so one set of calls in
+               the loop profiles both time and heap allocation
+        @param stages - one Histogram per stage, indexed by READ, RUN, SET and LOG
+        @param interval - the Histogram of the time between tick() calls
+        @param first_tick - the ticks_us() time of the first tick(), or -1 before it,
+               so the startup time can be measured from the first control step
+        """
+        self.name = name
+        self.period_us = period_us
+        self.stages = tuple(Histogram(0, stage_width, buckets) for _ in STAGE_NAMES)
+        interval_width = max(period_us//(buckets*2), 1)
+        self.interval = Histogram(period_us - interval_width*(buckets//2), interval_width, buckets)
+        self.last_tick = -1
+        self.first_tick = -1
+        self.mark_time = 0
+        self.alloc = alloc
+        _timers.append(self)
+
+    def tick(self):
+        """!
+        This method marks the start of a loop iteration, counting the time since the
+        previous iteration started and starting the first stage
+        """
+        now = ticks_us()
+        if self.last_tick >= 0:
+            self.interval.add(ticks_diff(now, self.last_tick))
+        elif self.first_tick < 0:
+            self.first_tick = now
+        self.last_tick = now
+        self.mark_time = now
+        if self.alloc is not None:
+            self.alloc.tick()
+
+    def mark(self, stage):
+        """!
+        This method marks the end of a stage and the start of the next one
+        @param stage - the stage that just finished, READ, RUN, SET or LOG
+        """
+        now = ticks_us()
+        self.stages[stage].add(ticks_diff(now, self.mark_time))
+        self.mark_time = now
+        if self.alloc is not None:
+            self.alloc.mark(stage)
+
+    def clear(self):
+        """!
+        This method empties every histogram
+        """
+        for hist in self.stages:
+            hist.clear()
+        self.interval.clear()
+        self.last_tick = -1
+
+    def __str__(self):
+        """!
+        This method formats the timings of every stage and of the loop interval
+        @returns the formatted timings
+        """
+        lines = [f"{self.name} loop timing (us)"]
+        for name, hist in zip(STAGE_NAMES, self.stages):
+            lines.append(f"  {name}")
+            lines.append(str(hist))
+        lines.append(f"  interval (nominal {self.period_us})")
+        lines.append(str(self.interval))
+        return "\n".join(lines)
+
+
+def show_all():
+    """!
+    This function formats every loop timer that has been created
+    @returns the formatted timings of every loop timer
+    """
+    return "\n".join(str(timer) for timer in _timers)
@@ -11,85 +11,214 @@
     Public License, Version 2. 
 """
 import utime
+# taken before anything else is imported, so the startup time printed at shutdown
+# covers importing and creating everything up to the first control step
+boot_us = utime.ticks_us()
 import gc
+import json
 import pyb
 import cotask
 import task_share
+from Lab4.hal import default_backend
+from Lab4.axes import AXES
 from Lab4.encoder_reader import Encoder
 from Lab4.motor_driver import MotorDriver
-from Lab4.controller import CLController
+from Lab4.controller import CLController, FixedCLController
+from Lab4.isr_control import ISRControl
+from Lab4.controller_bank import ControllerBank
+from Lab4 import sync_control
+from Lab4.sync_control import SyncControl
+from Lab4.telemetry import TelemetryWriter
+from Lab4.recorder import Recorder
+from Lab4 import loop_timing
+from Lab4 import alloc_profile
+from Lab4.motion_profile import MotionProfile
+from Lab4.adaptive_rate import AdaptiveRate
+from Lab4.encoder_trace import EncoderTrace
+from Lab4 import supervisor
+from Lab4.supervisor import Supervisor
+from Lab4.command_channel import CommandChannel, SETPOINT, GAINS, RESET
 
-def motor_fun_1():
+## degrees of output shaft rotation per encoder count
+DEG_PER_COUNT = 360/(16*256*4)
+
+def load_gains(path="gains.json"):
     """!
-    This function controls the first motor as part of the first task
-    It runs the motor from 0 degrees to 180 degrees using a proportional controller
+    This function loads gains written by tools/gain_tuner.py and applies them to
+    every axis in AXES.  Nothing changes if the file is not on the board, and a
+    file that cannot be read or is missing a gain is reported and ignored, so the
+    built in gains are used.
+    @param path - the file holding the gains
+    @returns the task period in ms found by the tuner, or None if there is no
+             usable file
+    """
+    try:
+        with open(path) as file:
+            gains = json.load(file)
+        # read every value before changing any axis, so a bad file changes nothing
+        kp = float(gains["kp"])
+        ki = float(gains["ki"])
+        kd = float(gains["kd"])
+        period = gains.get("period")
+        if period is not None:
+            period = int(period)
+    except OSError:
+        return None
+    except (ValueError, KeyError, TypeError) as error:
+        print(f"Ignoring {path}, using the built in gains: {repr(error)}")
+        return None
+    for axis in AXES:
+        axis["kp"] = kp
+        axis["ki"] = ki
+        axis["kd"] = kd
+    print(f"Loaded gains from {path}: {gains}")
+    return period
+
+def setup_axis(axis, backend=default_backend):
+    """!
+    This function creates the motor driver and encoder for one entry of AXES.  Their
+    timer channels are set up on the first duty cycle and the first read.
+    @param axis - the dictionary describing the axis
+    @param backend - the hal backend that creates the pins and timers
+    @returns motor, encoder - the MotorDriver and Encoder objects for the axis
     """
     # motor setup
-    en_pin =  pyb.Pin(pyb.Pin.board.PA10, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value=1)
-    in1pin = pyb.Pin(pyb.Pin.board.PB4, pyb.Pin.OUT_PP)
-    in2pin = pyb.Pin(pyb.Pin.board.PB5, pyb.Pin.OUT_PP)
-    timer = pyb.Timer(3, freq=20000) #setting frequency for motor 
-    motor = MotorDriver(en_pin,in1pin,in2pin,timer) #create motor object
+    en_pin = backend.pin(axis["en_pin"], "OPEN_DRAIN", pull="PULL_UP", value=1)
+    in1pin = backend.pin(axis["in1pin"], "OUT_PP")
+    in2pin = backend.pin(axis["in2pin"], "OUT_PP")
+    timer = backend.timer(axis["pwm_timer"], freq=20000) #setting frequency for motor 
+    motor = MotorDriver(en_pin,in1pin,in2pin,timer,backend) #create motor object
     # encoder setup
-    # create the pin object to read encoder channel A
-    pin1 = pyb.Pin(pyb.Pin.board.PC6, pyb.Pin.IN)
-    # create the pin object to read encoder channel B
-    pin2 = pyb.Pin(pyb.Pin.board.PC7, pyb.Pin.IN)
-    # create the timer object.  For C6 and C7 use timer 8,
-    # set the prescaler to zero and the period to the max 16bit number
-    timer = pyb.Timer(8, prescaler = 0, period = 65535)
+    # create the pin objects to read encoder channels A and B
+    pin1 = backend.pin(axis["enc_pin1"], "IN")
+    pin2 = backend.pin(axis["enc_pin2"], "IN")
+    # create the timer object.  Set the prescaler to zero and the period to
+    # the max 16bit number
+    timer = backend.timer(axis["enc_timer"], prescaler = 0, period = 65535)
     # create the encoder object
-    encoder = Encoder(pin1, pin2, timer)
-    # create controller object
-    con = CLController(1.5, 0, 0, angle1) 
- 
-    while True:
-        encoder_reading = encoder.read() #read encoder
-        encoder_angle = encoder_reading/16/256/4*360 #convert to ticks 
-        eff = con.run(encoder_angle) 
-        motor.set_duty_cycle(eff)
-        if not pos1.full(): #if the position queue is not full
-            pos1.put(con.get_pos()) #add position data to the queue
-        if not time1.full():
-            time1.put(con.get_curr_time())
-        yield 0
+    encoder = Encoder(pin1, pin2, timer, backend=backend)
+    return motor, encoder
 
 
-def motor_fun_2():
+def setup_supervisor(i, motor):
     """!
-    This function controls the second motor as part of the first task
-    It runs the motor from 0 degrees to 180 degrees using a proportional controller
+    This function creates the supervisor of one entry of AXES from its limits and
+    registers it in supervisors
+    @param i - the index of the axis in AXES
+    @param motor - the MotorDriver of the axis
+    @returns the Supervisor
     """
-    # motor setup
-    en_pin =  pyb.Pin(pyb.Pin.board.PC1, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value=1)
-    in1pin = pyb.Pin(pyb.Pin.board.PA0, pyb.Pin.OUT_PP)
-    in2pin = pyb.Pin(pyb.Pin.board.PA1, pyb.Pin.OUT_PP)
-    timer = pyb.Timer(5, freq=20000) #setting frequency for motor 
-    motor = MotorDriver(en_pin,in1pin,in2pin,timer) #create motor object
-    # encoder setup
-    # create the pin object to read encoder channel A
-    pin1 = pyb.Pin(pyb.Pin.board.PB6, pyb.Pin.IN)
-    # create the pin object to read encoder channel B
-    pin2 = pyb.Pin(pyb.Pin.board.PB7, pyb.Pin.IN)
-    # create the timer object.  For C6 and C7 use timer 8,
-    # set the prescaler to zero and the period to the max 16bit number
-    timer = pyb.Timer(4, prescaler = 0, period = 65535)
-    # create the encoder object
-    encoder = Encoder(pin1, pin2, timer)
-    # create controller object
-    con = CLController(1.5, 0, 0, angle2) 
+    axis = AXES[i]
+    sup = Supervisor(f"Motor {i + 1}", motor, period_task, 1/DEG_PER_COUNT,
+                     max_speed=axis["max_speed"], stall_speed=axis["stall_speed"],
+                     stall_time=axis["stall_time"], late_factor=late_factor)
+    supervisors[i] = sup
+    return sup
+
+
+def adaptive_limits():
+    """!
+    This function converts the adaptive rate settings into the units of the
+    controllers, which are encoder counts for the fixed point controller
+    @returns band_in, band_out, rate_limit, max_divider, settle_ticks - the
+             arguments for AdaptiveRate
+    """
+    scale = 1/DEG_PER_COUNT if fixed_point else 1
+    return (adaptive_band*scale, adaptive_band*adaptive_hysteresis*scale,
+            adaptive_rate_limit*scale, adaptive_max_divider, 5)
+
+
+def trace_settings(axis, angle):
+    """!
+    This function describes the controller of one axis for its encoder trace, so
+    tools/replay_trace.py can build the same controller on the computer
+    @param axis - the dictionary describing the axis
+    @param angle - the setpoint of the axis in degrees
+    @returns a dictionary of the controller type, gains, setpoint and task period
+    """
+    return {"controller": "fixed" if fixed_point else "float", "kp": axis["kp"],
+            "ki": axis["ki"], "kd": axis["kd"], "setpoint": angle, "period": period_task,
+            "encoder_rate": use_encoder_rate and not fixed_point}
+
+
+def motor_fun(i):
+    """!
+    This function controls the motor of one entry of AXES as a task.  It runs the
+    motor from 0 degrees to the setpoint of the axis in angles using a closed loop
+    controller.  Each axis gets its own task from a lambda that calls this with its index.
+    @param i - the index of the axis in AXES
+    """
+    axis = AXES[i]
+    motor, encoder = setup_axis(axis)
+    angle = angles[i]
+    # create controller object.  The fixed point controller works in encoder counts
+    # so there is no conversion to degrees each tick
+    if fixed_point:
+        con = FixedCLController(axis["kp"], axis["ki"], axis["kd"], angle)
+    else:
+        con = CLController(axis["kp"], axis["ki"], axis["kd"], angle)
+    controllers[i] = con
+    sup = setup_supervisor(i, motor)
+    # look up the objects of this axis once, so the loop only uses locals
+    rate = rates[i]
+    timing = timings[i]
+    rec = recorders[i]
+    pos_queue = positions[i]
+    time_queue = times[i]
+    trace = traces[i] if record_trace else None
+    # precompute the move as one setpoint per tick.  The fixed point controller
+    # takes its table in encoder counts so nothing is converted while moving
+    if use_profile:
+        profile = MotionProfile(0, angle, profile_speed, profile_accel, profile_scurve)
+        if fixed_point:
+            table = profile.table(period_task, con.counts_per_deg, 'i')
+        else:
+            table = profile.table(period_task)
+        step = 0
  
     while True:
-        encoder_reading = encoder.read()
-        encoder_angle = encoder_reading/16/256/4*360
-        eff = con.run(encoder_angle)
-        motor.set_duty_cycle(eff)
-        if not pos2.full():
-            pos2.put(con.get_pos())
-        if not time2.full():
-            time2.put(con.get_curr_time())
+        if use_profile and step < len(table):
+            if fixed_point:
+                con.set_setpoint_counts(table[step])
+            else:
+                con.set_setpoint(table[step])
+            step += 1
+            # a moving setpoint needs every tick
+            if adaptive:
+                rate.wake()
+        if adaptive and not rate.should_run():
+            yield 0
+            continue
+        timing.tick()
+        encoder_reading = encoder.read() #read encoder
+        timing.mark(loop_timing.READ)
+        if fixed_point:
+            eff = con.run(encoder_reading)
+        else:
+            encoder_angle = encoder_reading/16/256/4*360 #convert to ticks 
+            if use_encoder_rate:
+                # the velocity from the encoder's timestamped reads, in degrees per ms
+                eff = con.run(encoder_angle, encoder.get_velocity()*DEG_PER_COUNT/1000)
+            else:
+                eff = con.run(encoder_angle)
+        timing.mark(loop_timing.RUN)
+        if record_trace:
+            trace.record(encoder.new, con.get_curr_time(), con.setpoint, eff, con.last_us)
+        # a faulted axis is never driven again until the fault is cleared
+        if not supervise or sup.check(encoder_reading, eff, con.get_curr_time()):
+            motor.set_duty_cycle(eff)
+        timing.mark(loop_timing.SET)
+        if adaptive:
+            rate.update(con.get_err())
+        rec.record(con.get_curr_time(), con.get_pos(), con.get_err(), con.get_eff())
+        if not pos_queue.full(): #if the position queue is not full
+            pos_queue.put(con.get_pos()) #add position data to the queue
+        if not time_queue.full():
+            time_queue.put(con.get_curr_time())
+        timing.mark(loop_timing.LOG)
         yield 0
 
+
 def serial_communication():
     """!
     This function controls the serial communication between the microcontroller
@@ -103,6 +232,161 @@ def serial_communication():
             while time1.any() and pos1.any():
                 print(f"{time1.get()}, {pos1.get()}")
                 yield 0
+
+def binary_telemetry():
+    """!
+    This function sends the data for both motors to the computer as binary
+    telemetry frames once the queues are full.  One frame of records is packed
+    and written each time the task runs, instead of printing a line per sample.
+    Use tools/telemetry_decode.py on the computer to read the stream.
+    """
+    writer = TelemetryWriter(pyb.USB_VCP())
+    while True:
+        if not (time1.full() and pos1.full() and time2.full() and pos2.full()):
+            yield 0
+        else:
+            while time1.any() and pos1.any() and time2.any() and pos2.any():
+                n = 0
+                while n < writer.records_per_frame and time1.any() and pos1.any() \
+                        and time2.any() and pos2.any():
+                    writer.add(time1.get(), pos1.get(), time2.get(), pos2.get())
+                    n += 1
+                writer.flush()
+                yield 0
+
+
+def bank_fun():
+    """!
+    This function controls every axis in AXES from a single task using a
+    ControllerBank and SyncControl.  All of the encoders are latched back to back,
+    every effort is computed in one call, and then every duty cycle is written back
+    to back, so the axes are sampled and driven at nearly the same instant.
+    """
+    n = len(AXES)
+    motors = []
+    encoders = []
+    for axis in AXES:
+        motor, encoder = setup_axis(axis)
+        motors.append(motor)
+        encoders.append(encoder)
+    bank = ControllerBank([axis["kp"] for axis in AXES], [axis["ki"] for axis in AXES],
+                          [axis["kd"] for axis in AXES], angles)
+    for i in range(n):
+        controllers[i] = bank
+        if supervise:
+            setup_supervisor(i, motors[i])
+    group = SyncControl(encoders, motors, bank, DEG_PER_COUNT,
+                        supervisors=supervisors if supervise else None)
+    while True:
+        group.step()
+        if not pos1.full():
+            pos1.put(group.get_pos(0))
+        if not time1.full():
+            time1.put(bank.get_curr_time())
+        if n > 1:
+            if not pos2.full():
+                pos2.put(group.get_pos(1))
+            if not time2.full():
+                time2.put(bank.get_curr_time())
+        yield 0
+
+
+def apply_command(channel):
+    """!
+    This function applies a command from the serial port to the controller of its
+    axis.  The tasks only switch between ticks, so a command never lands halfway
+    through a control step.  In isr_mode the timer interrupt is held off while the
+    command is applied, so all three gains change together.
+    @param channel - the CommandChannel holding the command
+    """
+    axis = channel.axis
+    args = channel.args
+    con = controllers[axis]
+    if con is None:
+        return
+    if isr_mode:
+        irq_state = pyb.disable_irq()
+    if bank_mode:
+        if channel.cmd == SETPOINT:
+            con.set_setpoint(axis, args[0])
+        elif channel.cmd == GAINS:
+            con.set_gains(axis, args[0], args[1], args[2])
+        else:
+            con.reset_axis(axis)
+    else:
+        if channel.cmd == SETPOINT:
+            con.set_setpoint(args[0])
+        elif channel.cmd == GAINS:
+            con.set_kp(args[0])
+            con.set_ki(args[1])
+            con.set_kd(args[2])
+        else:
+            con.reset_controller()
+    # a new setpoint restarts the capture, so the recorder keeps the samples
+    # leading up to the change and the response after it
+    if channel.cmd == SETPOINT:
+        recorders[axis].rearm()
+        recorders[axis].trigger()
+    # a reset also clears a fault, so a jammed axis can be freed and run again
+    if channel.cmd == RESET and supervisors[axis] is not None:
+        supervisors[axis].clear()
+        if isr_mode:
+            isr.resume(axis)
+    if isr_mode:
+        pyb.enable_irq(irq_state)
+    # a new setpoint or new gains need the control step every tick again
+    if adaptive and not (isr_mode or bank_mode):
+        rates[axis].wake()
+
+
+def command_fun():
+    """!
+    This function reads commands from the serial port and applies them.  poll()
+    never waits for bytes, so a half sent line does not hold up the motor tasks.
+    """
+    while True:
+        if commands.poll():
+            apply_command(commands)
+        yield 0
+
+
+def isr_telemetry():
+    """!
+    This function logs both motors when they are controlled from the timer
+    interrupt instead of the motor_fun tasks.  The interrupt does all of
+    the control, so this task only copies the latest positions into the queues.
+    The interrupt works in encoder counts, so the positions are converted to
+    degrees like the other modes log them.
+    """
+    con1, con2 = isr.controllers
+    while True:
+        now = utime.ticks_diff(utime.ticks_ms(), isr_start)
+        if not pos1.full():
+            pos1.put(isr.get_pos(0)/con1.counts_per_deg)
+        if not time1.full():
+            time1.put(now)
+        if not pos2.full():
+            pos2.put(isr.get_pos(1)/con2.counts_per_deg)
+        if not time2.full():
+            time2.put(now)
+        yield 0
+
+def isr_supervisor():
+    """!
+    This function checks both motors when they are controlled from the timer
+    interrupt.  The checks run in this task, not the interrupt, from the latest
+    positions and efforts the interrupt stored.  An axis that faults is halted so
+    the interrupt stops driving it.
+    """
+    while True:
+        now = utime.ticks_diff(utime.ticks_ms(), isr_start)
+        i = 0
+        while i < isr.n:
+            if isr.enabled[i] and not supervisors[i].check(isr.get_pos(i), isr.get_eff(i), now):
+                isr.halt(i)
+            i += 1
+        yield 0
+
 # This code creates a share, a queue, and two tasks, then starts the tasks. The
 # tasks run until somebody presses ENTER, at which time the scheduler stops and
 # printouts show diagnostic information about the tasks, share, and queue.
@@ -116,6 +400,47 @@ if __name__ == "__main__":
     collection_time = 1.5 # in seconds
     #period for  motors, gotten from testing, max value which does not produce overshoot
     period_task = 20
+    # use the gains and period from tools/gain_tuner.py if gains.json is on the board
+    use_tuned_gains = True
+    if use_tuned_gains:
+        tuned_period = load_gains()
+        if tuned_period:
+            period_task = tuned_period
+    # use the integer controller, which works in encoder counts and logs positions in counts
+    fixed_point = False
+    # give the float controller the velocity measured by the encoder for its
+    # derivative term instead of the slope of its recent errors
+    use_encoder_rate = False
+    # run both control loops from a timer interrupt at isr_freq instead of as tasks.
+    # This always uses the integer controller since interrupts cannot allocate
+    isr_mode = False
+    isr_freq = 500 # in Hz
+    # run every axis in AXES from one task with a ControllerBank, reading every
+    # encoder and then driving every motor together, and print the skew between the
+    # axes at shutdown
+    bank_mode = False
+    # move to the setpoints along a motion profile instead of with a single step.
+    # Speeds are in degrees per second and accelerations in degrees per second squared
+    use_profile = False
+    profile_speed = 360
+    profile_accel = 1440
+    profile_scurve = True
+    # run the control step less often once a motor has settled.  Inside
+    # adaptive_band degrees of error, changing by less than adaptive_rate_limit
+    # degrees per step, the control step slows down to once every
+    # adaptive_max_divider task periods.  It returns to every period when the
+    # error grows past adaptive_band*adaptive_hysteresis.  With only proportional
+    # control the band has to be a bit larger than the steady state error
+    adaptive = False
+    adaptive_band = 6.0
+    adaptive_hysteresis = 1.5
+    adaptive_rate_limit = 0.5
+    adaptive_max_divider = 8
+    rate1 = AdaptiveRate(*adaptive_limits())
+    rate2 = AdaptiveRate(*adaptive_limits())
+    rates = (rate1, rate2)
+    # setpoints of every axis in AXES for the controller bank
+    angles = (angle1, angle2)
     # Creating two queues to test function and diagnostic printouts
     time1 = task_share.Queue('I', int(1000/period_task*collection_time), thread_protect=False, overwrite=False,  #queue object
                           name="Time Queue")
@@ -125,36 +450,146 @@ if __name__ == "__main__":
                           name="Time Queue")
     pos2 = task_share.Queue('d', int(1000/period_task*collection_time), thread_protect=False, overwrite=False,  #queue object
                           name="Position Queue")
+    # Continuous recorders for both motors.  They keep the last recorder_size
+    # samples, storing every recorder_decimation-th tick, and freeze half a buffer
+    # after a setpoint command or after the effort saturates so the samples around
+    # it are kept.  Saturation only triggers once recorder_holdoff ms have passed,
+    # since the first step from rest always saturates
+    recorder_size = 200
+    recorder_decimation = 1
+    recorder_holdoff = 2000 # in ms
+    rec1 = Recorder(recorder_size, recorder_decimation, saturation=100,
+                    holdoff=recorder_holdoff//period_task)
+    rec2 = Recorder(recorder_size, recorder_decimation, saturation=100,
+                    holdoff=recorder_holdoff//period_task)
+    recorders = (rec1, rec2)
+    # the queues of every axis, in the order of AXES
+    times = (time1, time2)
+    positions = (pos1, pos2)
+    # print the recorders when the program is stopped
+    dump_recorders = False
+    # per stage and loop interval timing for both motor tasks
+    # count the bytes each stage of both motor tasks allocates.  A loop that
+    # allocates will eventually stop for a garbage collection mid control
+    profile_alloc = False
+    alloc1 = alloc_profile.AllocProfile("Motor 1") if profile_alloc else None
+    alloc2 = alloc_profile.AllocProfile("Motor 2") if profile_alloc else None
+    timing1 = loop_timing.LoopTimer("Motor 1", period_task*1000, alloc=alloc1)
+    timing2 = loop_timing.LoopTimer("Motor 2", period_task*1000, alloc=alloc2)
+    timings = (timing1, timing2)
+    # record the raw encoder counts, times, setpoints and efforts of both motor
+    # tasks and save them to trace1.bin and trace2.bin when the program is
+    # stopped.  Replay them on the computer with tools/replay_trace.py
+    record_trace = False
+    trace_size = 500
+    if record_trace:
+        trace1 = EncoderTrace(trace_size, trace_settings(AXES[0], angle1))
+        trace2 = EncoderTrace(trace_size, trace_settings(AXES[1], angle2))
+        traces = (trace1, trace2)
+    # take setpoint, gain and reset commands from the serial port while running, see
+    # command_channel.py for the protocol.  With use_profile the profile keeps
+    # setting the setpoint of its axis until the move is finished
+    serial_commands = False
+    # the controller of every axis, filled in by whichever task creates it
+    controllers = [None] * len(AXES)
+    # check every axis each control step for a stall, a runaway encoder or late
+    # steps, and turn its motor off if one is found.  The limits are in AXES and
+    # the fault counters are printed at shutdown.  In isr_mode a task checks the
+    # interrupt every period_task ms.  Adaptive rate control skips steps on
+    # purpose, so it allows longer gaps between them
+    supervise = True
+    late_factor = adaptive_max_divider + 2 if adaptive else 3
+    supervisors = [None] * len(AXES)
     # Create the tasks. If trace is enabled for any task, memory will be
     # allocated for state transition tracing, and the application will run out
     # of memory after a while and quit. Therefore, use tracing only for 
     # debugging and set trace to False when it's not needed
     
-    task1 = cotask.Task(motor_fun_1, name="Task 1", priority=1,period=period_task,
+    task1 = cotask.Task(lambda: motor_fun(0), name="Task 1", priority=1,period=period_task,
                         profile=True, trace=False)
-    task2 = cotask.Task(motor_fun_2, name="Task 2", priority=2,period=period_task,
+    task2 = cotask.Task(lambda: motor_fun(1), name="Task 2", priority=2,period=period_task,
                         profile=True, trace=False)
-    task3 = cotask.Task(serial_communication, name="Task 3", priority=3,period=10,
+    # send telemetry as binary frames instead of printed lines
+    binary_log = False
+    task3 = cotask.Task(binary_telemetry if binary_log else serial_communication,
+                        name="Task 3", priority=3,period=10,
                         profile=True, trace=False)
     
     # adding the tasks to task list, commenting out task3, used for acquiring data for plotting
-    cotask.task_list.append(task1) #add tasks to scheduler list
-    cotask.task_list.append(task2) #add tasks to scheduler list
+    if isr_mode:
+        # the interrupt does the control, the scheduler only runs telemetry
+        motor1, encoder1 = setup_axis(AXES[0])
+        motor2, encoder2 = setup_axis(AXES[1])
+        isr = ISRControl(pyb.Timer(6), isr_freq, (encoder1, encoder2),
+                         (FixedCLController(AXES[0]["kp"], AXES[0]["ki"], AXES[0]["kd"], angle1),
+                          FixedCLController(AXES[1]["kp"], AXES[1]["ki"], AXES[1]["kd"], angle2)),
+                         (motor1, motor2))
+        controllers[0], controllers[1] = isr.controllers
+        task4 = cotask.Task(isr_telemetry, name="Task 4", priority=1, period=period_task,
+                            profile=True, trace=False)
+        cotask.task_list.append(task4)
+        if supervise:
+            setup_supervisor(0, motor1)
+            setup_supervisor(1, motor2)
+            task7 = cotask.Task(isr_supervisor, name="Task 7", priority=2, period=period_task,
+                                profile=True, trace=False)
+            cotask.task_list.append(task7)
+    elif bank_mode:
+        task5 = cotask.Task(bank_fun, name="Task 5", priority=1, period=period_task,
+                            profile=True, trace=False)
+        cotask.task_list.append(task5)
+    else:
+        cotask.task_list.append(task1) #add tasks to scheduler list
+        cotask.task_list.append(task2) #add tasks to scheduler list
     #cotask.task_list.append(task3)
+    if serial_commands:
+        # replies would corrupt the binary telemetry frames on the same port
+        commands = CommandChannel(pyb.USB_VCP(), len(AXES), reply=not binary_log)
+        task6 = cotask.Task(command_fun, name="Task 6", priority=0, period=50,
+                            profile=True, trace=False)
+        cotask.task_list.append(task6)
     
     
     # Run the memory garbage collector to ensure memory is as defragmented as
     # possible before the real-time scheduler is started
     gc.collect()
+    if isr_mode:
+        isr_start = utime.ticks_ms()
+        isr.start()
     # Run the scheduler with the chosen scheduling algorithm. Quit if ^C pressed
     while True:
         try:
             cotask.task_list.pri_sched()
         except KeyboardInterrupt:
             break
+    if isr_mode:
+        isr.stop()
 
     # Print a table of task data and a table of shared information data
     print('\n' + str (cotask.task_list))
     print(task_share.show_all())
+    print(loop_timing.show_all())
+    if bank_mode:
+        print(sync_control.show_all())
+    if timing1.first_tick >= 0:
+        print(f"Startup: {utime.ticks_diff(timing1.first_tick, boot_us)} us from boot to the first control step")
+    if profile_alloc:
+        print(alloc_profile.show_all())
+        print("Steady state allocation check: " +
+              ("PASS" if alloc1.steady() and alloc2.steady() else "FAIL"))
+    if supervise:
+        print(supervisor.show_all())
+    if serial_commands:
+        print(f"Commands: {commands.commands} applied, {commands.errors} rejected")
+    if adaptive:
+        print(f"Motor 1 {rate1}")
+        print(f"Motor 2 {rate2}")
     print(task1.get_trace())
+    if dump_recorders:
+        rec1.dump("Motor 1")
+        rec2.dump("Motor 2")
+    if record_trace:
+        trace1.save("trace1.bin")
+        trace2.save("trace2.bin")
+        print(f"Saved {trace1.count} and {trace2.count} samples to trace1.bin and trace2.bin")
     print('')
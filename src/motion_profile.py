@@ -0,0 +1,99 @@
+"""!
+@file motion_profile.py
+This file contains a motion profile generator that turns a move from one position to
+another into a smooth series of setpoints.  The speed follows a trapezoid, or an
+S-curve whose acceleration ramps up and down smoothly, so the motor is not hit with a
+full step that saturates it.  The whole profile is computed once into a compact table
+before the move, and the motor task just streams one entry into set_setpoint per tick.
+"""
+import math
+from array import array
+
+
+class MotionProfile:
+    """!
+    This class implements a point to point motion profile with limited speed and
+    acceleration.  If the move is too short to reach full speed the profile
+    becomes triangular with a lower peak speed.
+    """
+
+    def __init__ (self, start, end, v_max, a_max, scurve=False):
+        """!
+        Creates a motion profile
+        @param start - the starting position
+        @param end - the final position
+        @param v_max - the largest speed allowed, in position units per second
+        @param a_max - the largest acceleration allowed, in position units per second squared
+        @param scurve - shape the acceleration as a smooth bump instead of a constant
+        @param v_peak - the speed actually reached, which may be less than v_max
+        @param t_acc - the time spent accelerating, which is also the time spent decelerating
+        @param t_cruise - the time spent at v_peak
+        @param duration - the total time of the move in seconds
+        """
+        self.start = start
+        self.end = end
+        self.scurve = scurve
+        distance = abs(end - start)
+        self.direction = 1 if end >= start else -1
+        # the S-curve peaks at twice its average acceleration, so it has to
+        # accelerate at half the rate of the trapezoid on average
+        a_avg = a_max/2 if scurve else a_max
+        v_peak = v_max
+        # both shapes cover v_peak*t_acc/2 while accelerating, and the same while
+        # decelerating, so a move shorter than v_peak*t_acc never reaches v_max
+        if v_peak*v_peak/a_avg > distance:
+            v_peak = math.sqrt(distance*a_avg)
+        self.v_peak = v_peak
+        self.t_acc = v_peak/a_avg if v_peak > 0 else 0.0
+        self.t_cruise = distance/v_peak - self.t_acc if v_peak > 0 else 0.0
+        self.duration = 2*self.t_acc + self.t_cruise
+        self.distance = distance
+
+    def _accel_distance(self, t):
+        """!
+        This method returns the distance covered t seconds into the acceleration phase
+        @param t - the time since the start of the move, at most t_acc
+        @returns the distance covered
+        """
+        if self.t_acc == 0:
+            return 0.0
+        if self.scurve:
+            w = 2*math.pi/self.t_acc
+            return self.v_peak*(t*t/(2*self.t_acc) + (math.cos(w*t) - 1)/(w*w*self.t_acc))
+        return self.v_peak*t*t/(2*self.t_acc)
+
+    def position(self, t):
+        """!
+        This method returns the setpoint at a given time into the move
+        @param t - the time since the start of the move in seconds
+        @returns the position at that time
+        """
+        if t <= 0:
+            return self.start
+        if t >= self.duration:
+            return self.end
+        if t < self.t_acc:
+            covered = self._accel_distance(t)
+        elif t <= self.t_acc + self.t_cruise:
+            covered = self.v_peak*(t - self.t_acc/2)
+        else:
+            covered = self.distance - self._accel_distance(self.duration - t)
+        return self.start + self.direction*covered
+
+    def table(self, period_ms, scale=1, typecode='f'):
+        """!
+        This method computes the setpoint for every tick of the move.  The last
+        entry is always the final position.
+        @param period_ms - the time between ticks in ms
+        @param scale - a factor applied to every entry, for example encoder counts
+               per degree to make a table for FixedCLController
+        @param typecode - the array type of the table, 'f' for floats or 'i' for
+               integers, which are rounded
+        @returns an array with one setpoint per tick
+        """
+        n = int(math.ceil(self.duration*1000/period_ms)) + 1
+        out = array(typecode, [0] * n)
+        for k in range(n):
+            value = self.position(k*period_ms/1000)*scale
+            out[k] = int(round(value)) if typecode != 'f' and typecode != 'd' else value
+        return out
@@ -7,38 +7,65 @@ bad pwm levels.
 @author Jared Sinasohn, Sydney Ulvick, Sean Nakashimo
 @date 15-Feb-2024
 """
-import pyb
-import utime
-import micropython
+from Lab4.hal import default_backend
 
 class MotorDriver:
     """! 
     This class implements a motor driver for an ME405 kit. 
     """
 
-    def __init__ (self, en_pin, in1pin, in2pin, timer):
+    def __init__ (self, en_pin, in1pin, in2pin, timer, backend=None):
         """! 
-        Creates a motor driver by initializing GPIO
-        pins and turning off the motor for safety.
+        Creates a motor driver and turns off the motor for safety.  The PWM
+        channels are not set up until the first duty cycle, or an explicit call
+        to setup().
         @param en_pin: enabling pin for the motor
         @param in1pin: where the PWM is being sent for 1
         @param in2pin: where the PWM is being sent for 2
         @param timer: timer that the motor uses for the PWM
-        @param ch1: where the timer is being channeled to send to pin1
-        @param ch2: where the timer is being channeled to send to pin2
+        @param backend: the hal backend that sets up the PWM channels, the pyb one
+               by default
+        @param ch1: where the timer is being channeled to send to pin1, None until setup()
+        @param ch2: where the timer is being channeled to send to pin2, None until setup()
+        @param top: the compare value for a 100% duty cycle, the timer period + 1
+        @param direction: the direction last applied, 1, -1, 0 or None if unknown
+        @param compare: the compare value last written to the driving channel
+        @param writes_applied: the number of duty cycle updates that changed the PWM
+        @param writes_skipped: the number of duty cycle updates that changed nothing
+        @param staged_direction: the direction worked out by the last stage()
+        @param staged_compare: the compare value worked out by the last stage()
         """
-        print ("Creating a motor driver")
         # defining parameters needed to characterize motor
         self.en_pin = en_pin 
         self.in1pin = in1pin
         self.in2pin = in2pin
         self.timer = timer
+        self.backend = backend if backend is not None else default_backend
         self.en_pin.low() #disable the motor (for safety)
-        self.ch1 = self.timer.channel(1, pyb.Timer.PWM, pin=self.in1pin)
-        self.ch2 = self.timer.channel(2, pyb.Timer.PWM, pin=self.in2pin)
+        self.ch1 = None
+        self.ch2 = None
+        # precompute the compare values so duty cycles can be written without
+        # going through pulse_width_percent
+        self.top = self.timer.period() + 1
+        self.compare_per_percent = self.top/100
+        # the enable pin is low so the first nonzero level has to enable the motor
+        self.direction = None
+        self.compare = 0
+        self.writes_applied = 0
+        self.writes_skipped = 0
+        self.staged_direction = 0
+        self.staged_compare = 0
+
+    def setup(self):
+        """!
+        This method sets up both PWM channels with the motor off.  It runs on the
+        first duty cycle, and can be called earlier to do it before the control
+        loop starts.
+        """
+        self.ch1 = self.backend.pwm_channel(self.timer, 1, self.in1pin)
+        self.ch2 = self.backend.pwm_channel(self.timer, 2, self.in2pin)
         self.ch1.pulse_width_percent(0)
         self.ch2.pulse_width_percent(0)
-    
         
     def set_duty_cycle (self, level):
         """!
@@ -47,48 +74,122 @@ class MotorDriver:
         cause torque in one direction, negative values
         in the opposite direction.  This function also
         saturates the level if the level is greater than 100
-        or -100
+        or -100.  The driver remembers what it last wrote, so
+        the enable pin and the idle channel are only written
+        when the direction changes, and the driving channel
+        is only written when its compare value changes.
         @param level A signed integer holding the duty
                cycle of the voltage sent to the motor 
         """
         #setting the duty cycle
         try:
+            self.stage(level)
+            self.commit()
+        except ValueError:
+            if self.ch1 is not None:
+                self.ch1.pulse_width(0)
+                self.ch2.pulse_width(0)
+            self.direction = 0
+            self.compare = 0
+            raise ValueError
+
+    def stage(self, level):
+        """!
+        This method works out the direction and compare value for a duty cycle
+        without writing anything to the hardware.  commit() writes them.  Staging
+        every motor first and then committing them all back to back applies the
+        new duty cycles of several axes as close together as possible.
+        @param level - the signed duty cycle in percent, as for set_duty_cycle()
+        """
+        # integer levels from the fixed point controller are used as is so
+        # they do not have to be boxed into a float every tick
+        if not isinstance(level, int):
             level = float(level)
-            if level < 0: #for negative in range
+        if level < 0: #for negative in range
+            direction = -1
+            level = -level
+        elif level > 0: #for positive in range
+            direction = 1
+        else:
+            direction = 0
+        # convert the level to a raw compare value.  Anything at or past 100
+        # saturates to a full period regardless of how big the level is
+        if level >= 100:
+            compare = self.top
+        elif isinstance(level, int):
+            compare = level*self.top//100
+        else:
+            compare = int(level*self.compare_per_percent)
+        self.staged_direction = direction
+        self.staged_compare = compare
+
+    def commit(self):
+        """!
+        This method writes the duty cycle from the last stage() to the hardware
+        """
+        if self.ch1 is None:
+            self.setup()
+        direction = self.staged_direction
+        compare = self.staged_compare
+        if direction != self.direction:
+            if direction > 0:
                 self.en_pin.high() #enable the motor
-                self.ch1.pulse_width_percent(0) #set in2 to zero
-                # if the level is greater than -100, nothing happens
-                # if it is less than -100, set the PWM to 100
-                # this saturates the level to -100 regardless of how big the level is
-                if level >= -100:
-                    self.ch2.pulse_width_percent(abs(level))
-                else:
-                    self.ch2.pulse_width_percent(100)
-            elif level > 0: #for positive in range
+                self.ch2.pulse_width(0) #set in2 to zero
+            elif direction < 0:
                 self.en_pin.high() #enable the motor
-                self.ch2.pulse_width_percent(0) #set in1 to zero
-                # if the level is less than 100, nothing happens
-                # if it is greater than 100, set the PWM to 100
-                # this saturates the level to 100 regardless of how big the level is
-                if level <= 100:
-                    self.ch1.pulse_width_percent(level)
-                else:
-                    self.ch1.pulse_width_percent(100)  
+                self.ch1.pulse_width(0) #set in1 to zero
             else:
-                self.ch1.pulse_width_percent(0)
-                self.ch2.pulse_width_percent(0)
-        except ValueError:
-            self.ch1.pulse_width_percent(0)
-            self.ch2.pulse_width_percent(0)
-            raise ValueError
+                # stopping writes zero to both channels, which is the
+                # whole update
+                self.ch1.pulse_width(0)
+                self.ch2.pulse_width(0)
+                self.direction = direction
+                self.compare = 0
+                self.writes_applied += 1
+                return
+            self.direction = direction
+            # the driving channel changed, so force the write below
+            self.compare = -1
+        if compare != self.compare:
+            if direction > 0:
+                self.ch1.pulse_width(compare)
+            else:
+                self.ch2.pulse_width(compare)
+            self.compare = compare
+            self.writes_applied += 1
+        else:
+            self.writes_skipped += 1
+
+    def disable(self):
+        """!
+        This method turns the motor off and disables the driver.  The next nonzero
+        duty cycle enables it again.
+        """
+        self.en_pin.low()
+        if self.ch1 is not None:
+            self.ch1.pulse_width(0)
+            self.ch2.pulse_width(0)
+        # an unknown direction forces the enable pin to be written next time
+        self.direction = None
+        self.compare = 0
+
+    def get_write_counts(self):
+        """!
+        This method returns how many calls to set_duty_cycle changed the PWM and
+        how many were skipped because nothing had changed
+        @returns writes_applied, writes_skipped
+        """
+        return self.writes_applied, self.writes_skipped
 
 if __name__ == "__main__":
     # power the motor for five seconds 
+    import pyb
+    import utime
     en_pin =  pyb.Pin(pyb.Pin.board.PA10, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value=1)
     in1pin = pyb.Pin(pyb.Pin.board.PB4, pyb.Pin.OUT_PP)
     in2pin = pyb.Pin(pyb.Pin.board.PB5, pyb.Pin.OUT_PP)
     timer = pyb.Timer(3, freq=5000) #setting frequency for motor 
-    motor = MotorDriver(en_pin,in1pin,in2pin,timer,ch1,ch2) #call to the motor class you just made!
+    motor = MotorDriver(en_pin,in1pin,in2pin,timer) #call to the motor class you just made!
     motor.set_duty_cycle(50) #set duty cycle, in range -100 to 100 (not including 0)
     utime.sleep(5)
     motor.set_duty_cycle(0)
@@ -0,0 +1,163 @@
+"""!
+@file recorder.py
+This file contains a continuous data recorder for one motor axis.  It keeps the most
+recent samples of time, position, error and effort in preallocated ring buffers,
+can skip samples to cover a longer time, and can freeze itself a set number of
+samples after a trigger so the data around an event is kept.
+"""
+from array import array
+
+## the recorder is overwriting its oldest samples and waiting for a trigger
+RUNNING = 0
+
+## the recorder has been triggered and is recording the post trigger samples
+TRIGGERED = 1
+
+## the recorder has finished capturing and is no longer recording
+DONE = 2
+
+
+class Recorder:
+    """!
+    This class implements a ring buffer recorder with decimation and triggering.
+    Recording never allocates, so it can be called from the control loop every tick.
+    """
+
+    def __init__ (self, size, decimation=1, post_trigger=None, saturation=None, holdoff=0):
+        """!
+        Creates a recorder
+        @param size - the number of samples kept
+        @param decimation - only every decimation-th call to record() is stored
+        @param post_trigger - how many samples to store after a trigger before
+               freezing.  The rest of the buffer holds samples from before the
+               trigger.  Defaults to half of size.
+        @param saturation - if given, the recorder triggers itself the first time
+               the magnitude of the effort reaches this value
+        @param holdoff - the number of calls to record() after creation or rearm()
+               before the saturation trigger is armed, so the saturated start of a
+               step from rest does not use up the trigger
+        @param idx - the slot the next sample will be written to
+        @param count - the number of valid samples, up to size
+        @param skip - the number of calls to record() since the last stored sample
+        @param state - RUNNING, TRIGGERED or DONE
+        @param remaining - the number of post trigger samples still to store
+        @param holding - the number of calls to record() left before the saturation
+               trigger is armed
+        """
+        self.size = size
+        self.decimation = decimation
+        self.post_trigger = size//2 if post_trigger is None else min(post_trigger, size)
+        self.saturation = saturation
+        self.holdoff = holdoff
+        self.holding = holdoff
+        self.time = array('I', [0] * size)
+        self.pos = array('f', [0] * size)
+        self.err = array('f', [0] * size)
+        self.eff = array('f', [0] * size)
+        self.idx = 0
+        self.count = 0
+        self.skip = 0
+        self.state = RUNNING
+        self.remaining = 0
+
+    def record(self, time, pos, err, eff):
+        """!
+        This method stores one sample if it is not skipped by decimation and the
+        recorder has not finished capturing
+        @param time - the time of the sample in ms
+        @param pos - the position of the axis
+        @param err - the controller error
+        @param eff - the controller effort in percent
+        """
+        if self.state == DONE:
+            return
+        if self.holding > 0:
+            self.holding -= 1
+        elif self.state == RUNNING and self.saturation is not None and \
+                (eff >= self.saturation or eff <= -self.saturation):
+            self.trigger()
+        # decimation only skips samples, it never delays the trigger check above
+        self.skip += 1
+        if self.skip < self.decimation:
+            return
+        self.skip = 0
+        idx = self.idx
+        self.time[idx] = time
+        self.pos[idx] = pos
+        self.err[idx] = err
+        self.eff[idx] = eff
+        idx += 1
+        if idx == self.size:
+            idx = 0
+        self.idx = idx
+        if self.count < self.size:
+            self.count += 1
+        if self.state == TRIGGERED:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.state = DONE
+
+    def trigger(self):
+        """!
+        This method marks an event, such as a setpoint change.  The recorder keeps
+        recording post_trigger more samples and then freezes.  Triggers after the
+        first one are ignored until rearm() is called.
+        """
+        if self.state != RUNNING:
+            return
+        self.state = TRIGGERED
+        # the next stored sample is the first one at or after the trigger
+        self.remaining = self.post_trigger
+        if self.remaining <= 0:
+            self.state = DONE
+
+    def rearm(self):
+        """!
+        This method restarts continuous recording so a new trigger can be captured.
+        Samples already in the buffer are kept as pre trigger history, and the
+        saturation trigger waits out the holdoff again.
+        """
+        self.state = RUNNING
+        self.remaining = 0
+        self.holding = self.holdoff
+
+    def done(self):
+        """!
+        This method tells whether a triggered capture has finished
+        @returns True if the recorder has frozen after a trigger
+        """
+        return self.state == DONE
+
+    def get(self, i):
+        """!
+        This method returns one stored sample, oldest first
+        @param i - the index of the sample from 0 to count - 1
+        @returns time, pos, err, eff - the stored sample
+        """
+        j = self.idx - self.count + i
+        if j < 0:
+            j += self.size
+        return self.time[j], self.pos[j], self.err[j], self.eff[j]
+
+    def get_trigger_index(self):
+        """!
+        This method returns where the trigger is in the ordered samples
+        @returns the index passed to get() of the first sample at or after the
+                 trigger, or -1 if the recorder has not been triggered
+        """
+        if self.state == RUNNING:
+            return -1
+        # samples stored after the trigger push the trigger sample towards the start
+        stored_after = self.post_trigger - self.remaining
+        return self.count - stored_after
+
+    def dump(self, name="Recorder"):
+        """!
+        This method prints the stored samples, oldest first, as comma separated lines
+        @param name - a label printed before the samples
+        """
+        print(f"{name}: {self.count} samples, trigger at {self.get_trigger_index()}")
+        print("time, pos, err, eff")
+        for i in range(self.count):
+            time, pos, err, eff = self.get(i)
+            print(f"{time}, {pos}, {err}, {eff}")
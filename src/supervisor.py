@@ -0,0 +1,170 @@
+"""!
+@file supervisor.py
+This file contains a supervisor that checks one axis every control step and turns its
+motor off when something is wrong, so a jammed motor, a broken encoder or a control
+task that stops keeping up cannot keep driving the motor.  It checks for
+  - a stall: the effort is saturated but the encoder has barely moved for a while
+  - a runaway: the encoder moved further since the last step than the motor can turn
+  - late steps: the time since the last step is well past the task period, several
+    steps in a row
+Every threshold is converted to encoder counts and ms once, when the supervisor is
+created, so each check is a few integer comparisons that do not allocate.  A fault
+is latched, the driver is disabled, and it stays off until clear() is called.
+"""
+
+## no fault
+OK = 0
+
+## the effort was saturated while the encoder did not move
+STALL = 1
+
+## the encoder moved faster than the motor can turn
+RUNAWAY = 2
+
+## too many control steps in a row came late
+LATE = 3
+
+## names of the faults, indexed by fault code
+FAULT_NAMES = ("ok", "stall", "runaway", "late")
+
+## every Supervisor that has been created, so show_all() can print them
+_supervisors = []
+
+
+class Supervisor:
+    """!
+    This class implements the fault checks for one axis.  Call check() after every
+    control step with the encoder position, the effort and the controller time.
+    """
+
+    def __init__ (self, name, motor, period_ms, counts_per_deg=16*256*4/360,
+                  max_speed=1000, stall_effort=95, stall_speed=10, stall_time=500,
+                  late_factor=3, max_late=5):
+        """!
+        Creates a supervisor and registers it with show_all()
+        @param name - the name printed with the counters
+        @param motor - the MotorDriver that is disabled on a fault
+        @param period_ms - the task period in ms
+        @param counts_per_deg - encoder counts per degree of the output shaft
+        @param max_speed - the fastest the output shaft can turn in degrees per second,
+               with some margin over the no load speed
+        @param stall_effort - the effort magnitude in percent counted as saturated
+        @param stall_speed - the speed in degrees per second under which a saturated
+               motor counts as not moving
+        @param stall_time - how long in ms in a row the motor may be saturated without moving
+        @param late_factor - a step is late when it comes this many periods after the
+               previous one
+        @param max_late - the number of late steps in a row that is a fault
+        @param fault - the latched fault code, OK until a check fails
+        @param fault_time - the controller time of the fault in ms
+        @param checks - the number of checks since the supervisor was cleared
+        @param stalls - the number of stall faults
+        @param runaways - the number of runaway faults
+        @param late_steps - the number of late steps, whether or not they made a fault
+        @param lates - the number of late faults
+        """
+        self.name = name
+        self.motor = motor
+        # speeds become counts per second so a check only multiplies integers
+        self.max_counts = int(max_speed*counts_per_deg)
+        self.stall_counts = int(stall_speed*counts_per_deg)
+        self.stall_effort = stall_effort
+        self.stall_time = stall_time
+        self.late_ms = period_ms*late_factor
+        self.max_late = max_late
+        self.stalls = 0
+        self.runaways = 0
+        self.late_steps = 0
+        self.lates = 0
+        self.clear()
+        _supervisors.append(self)
+
+    def check(self, pos, eff, now):
+        """!
+        This method checks the latest control step and disables the motor on a fault
+        @param pos - the encoder position in counts, an integer
+        @param eff - the effort the controller returned in percent
+        @param now - the controller time in ms
+        @returns True if the axis is healthy, False if it has faulted
+        """
+        if self.fault:
+            return False
+        delta = pos - self.last_pos
+        dt = now - self.last_time
+        self.last_pos = pos
+        self.last_time = now
+        self.checks += 1
+        if self.checks == 1:
+            return True
+        if dt > self.late_ms:
+            self.late_steps += 1
+            self.late_run += 1
+            if self.late_run >= self.max_late:
+                self.lates += 1
+                return self.trip(LATE, now)
+        elif self.late_run:
+            self.late_run = 0
+        # the counts moved in dt ms may not beat max_counts per second, at least one
+        # ms is allowed so two reads in the same ms still have a limit
+        if dt < 1:
+            dt = 1
+        if delta < 0:
+            delta = -delta
+        if delta*1000 > self.max_counts*dt:
+            self.runaways += 1
+            return self.trip(RUNAWAY, now)
+        if eff >= self.stall_effort or eff <= -self.stall_effort:
+            # add up the time spent saturated while moving slower than stall_speed
+            if delta*1000 < self.stall_counts*dt:
+                self.stalled += dt
+                if self.stalled >= self.stall_time:
+                    self.stalls += 1
+                    return self.trip(STALL, now)
+                return True
+        self.stalled = 0
+        return True
+
+    def trip(self, fault, now):
+        """!
+        This method latches a fault and turns the motor off
+        @param fault - the fault code
+        @param now - the controller time in ms
+        @returns False, so check() can return it directly
+        """
+        self.motor.disable()
+        self.fault = fault
+        self.fault_time = now
+        return False
+
+    def clear(self):
+        """!
+        This method clears a latched fault so the axis can run again.  The motor
+        driver enables itself on its next nonzero duty cycle.
+        """
+        self.fault = OK
+        self.fault_time = 0
+        self.checks = 0
+        self.last_pos = 0
+        self.last_time = 0
+        self.stalled = 0
+        self.late_run = 0
+
+    def __str__(self):
+        """!
+        This method formats the fault state and counters
+        @returns the formatted counters
+        """
+        state = FAULT_NAMES[self.fault]
+        if self.fault:
+            state += f" at {self.fault_time} ms"
+        return (f"{self.name} supervisor: {state}, {self.checks} checks, "
+                f"{self.stalls} stalls, {self.runaways} runaways, "
+                f"{self.late_steps} late steps, {self.lates} late faults")
+
+
+def show_all():
+    """!
+    This function formats every supervisor that has been created
+    @returns the formatted counters
+    """
+    return "\n".join(str(supervisor) for supervisor in _supervisors)
@@ -0,0 +1,159 @@
+"""!
+@file sync_control.py
+This file contains a coordinated control step for several axes.  Every encoder
+counter is latched back to back, every effort is computed in one ControllerBank
+call, and every duty cycle is then written back to back, so all of the axes are
+sampled and actuated at nearly the same instant however many there are.  With one
+task per motor the axes are read and driven at different times, and the gap
+changes with whatever else the scheduler runs in between.  The spread of each step
+is measured every tick into fixed bucket histograms, like loop_timing does.
+
+Each PWM timer still loads a new compare value at the end of its own PWM period,
+so the duty cycles of different timers can take effect up to one PWM period
+(50 us at 20 kHz) apart after they are written.
+"""
+from array import array
+from Lab4.hal import ticks_us, ticks_diff
+from Lab4.encoder_reader import latch_many
+from Lab4.loop_timing import Histogram
+
+## every SyncControl that has been created, so show_all() can print them
+_groups = []
+
+
+class SyncControl:
+    """!
+    This class implements the synchronized control step for a group of axes that
+    share one ControllerBank.  Call step() once per task period.
+    """
+
+    def __init__ (self, encoders, motors, bank, scale=1, name="Synchronized axes",
+                  latch_width=2, apply_width=5, latency_width=50, buckets=32,
+                  supervisors=None):
+        """!
+        Creates the group and registers it with show_all()
+        @param encoders - a list of Encoder objects, one per axis
+        @param motors - a list of MotorDriver objects, one per axis
+        @param bank - the ControllerBank with one axis per encoder
+        @param scale - the units of the bank setpoints per encoder count, for example
+               degrees per count
+        @param name - the name printed with the skew histograms
+        @param latch_width - the bucket width of the latch skew histogram in us
+        @param apply_width - the bucket width of the apply skew histogram in us
+        @param latency_width - the bucket width of the latency histogram in us
+        @param buckets - the number of buckets in every histogram
+        @param supervisors - an optional list of Supervisor objects, one per axis.  An
+               axis that fails its check is not driven.
+        @param raw - the raw counter values latched in the last step
+        @param measured - the positions passed to the bank in the last step, in bank units
+        @param latch_skew - the Histogram of the time from the first counter latched
+               to the last
+        @param apply_skew - the Histogram of the time from the first duty cycle
+               written to the last
+        @param latency - the Histogram of the time from the first counter latched to
+               the last duty cycle written
+        @param tick_count - the number of steps that have run
+        @param active - 1 for every axis driven in the last step, 0 for a faulted one
+        """
+        # store the axes as tuples so step() can index them without allocating
+        self.encoders = tuple(encoders)
+        self.motors = tuple(motors)
+        self.bank = bank
+        self.scale = scale
+        self.name = name
+        self.n = len(self.encoders)
+        self.raw = array('i', [0] * self.n)
+        self.measured = array('f', [0] * self.n)
+        self.latch_skew = Histogram(0, latch_width, buckets)
+        self.apply_skew = Histogram(0, apply_width, buckets)
+        self.latency = Histogram(0, latency_width, buckets)
+        self.tick_count = 0
+        self.supervisors = tuple(supervisors) if supervisors is not None else None
+        self.active = bytearray(self.n)
+        _groups.append(self)
+
+    def step(self):
+        """!
+        This method runs one control step for every axis: latch, compute, apply
+        @returns the array of efforts from the bank, one per axis
+        """
+        n = self.n
+        encoders = self.encoders
+        motors = self.motors
+        start = ticks_us()
+        latch_many(encoders, self.raw)
+        latched = ticks_us()
+        # every axis is stamped with the time the first counter was latched
+        i = 0
+        while i < n:
+            self.measured[i] = encoders[i].update(self.raw[i], start)*self.scale
+            i += 1
+        effs = self.bank.run(self.measured)
+        # do all of the duty cycle math and supervisor checks before the first
+        # write, so only register writes remain between the first axis and the last
+        supervisors = self.supervisors
+        active = self.active
+        now = self.bank.get_curr_time()
+        i = 0
+        while i < n:
+            if supervisors is None or supervisors[i].check(encoders[i].pos, effs[i], now):
+                motors[i].stage(effs[i])
+                active[i] = 1
+            else:
+                active[i] = 0
+            i += 1
+        applying = ticks_us()
+        i = 0
+        while i < n:
+            if active[i]:
+                motors[i].commit()
+            i += 1
+        done = ticks_us()
+        self.latch_skew.add(ticks_diff(latched, start))
+        self.apply_skew.add(ticks_diff(done, applying))
+        self.latency.add(ticks_diff(done, start))
+        self.tick_count += 1
+        return effs
+
+    def stop(self):
+        """!
+        This method turns every motor off
+        """
+        i = 0
+        while i < self.n:
+            self.motors[i].set_duty_cycle(0)
+            i += 1
+
+    def get_pos(self, axis):
+        """!
+        This method returns the position of an axis from the most recent step
+        @param axis - the index of the axis
+        @returns the position in bank units
+        """
+        return self.measured[axis]
+
+    def clear(self):
+        """!
+        This method empties every histogram
+        """
+        self.latch_skew.clear()
+        self.apply_skew.clear()
+        self.latency.clear()
+
+    def __str__(self):
+        """!
+        This method formats the skew histograms
+        @returns the formatted histograms
+        """
+        return "\n".join((f"{self.name}, {self.n} axes, {self.tick_count} steps (us)",
+                          "  latch skew, first encoder to last", str(self.latch_skew),
+                          "  apply skew, first duty cycle to last", str(self.apply_skew),
+                          "  latency, first encoder to last duty cycle", str(self.latency)))
+
+
+def show_all():
+    """!
+    This function formats every synchronized group that has been created
+    @returns the formatted skew histograms
+    """
+    return "\n".join(str(group) for group in _groups)
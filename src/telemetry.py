@@ -0,0 +1,100 @@
+"""!
+@file telemetry.py
+This file contains a writer for a compact binary telemetry stream.  Samples are packed
+as fixed width records into a preallocated frame with a header, a sequence number and
+a checksum, and whole frames are written to the serial port at once instead of
+printing one formatted line per sample.
+
+Frame layout, all values little endian:
+  - 2 bytes  magic number 0xA5 0x5A
+  - uint16   sequence number, incremented every frame
+  - uint8    number of records in the frame
+  - uint8    record size in bytes
+  - records  each one uint32 time1 (ms), float32 pos1, uint32 time2 (ms), float32 pos2
+  - uint16   sum of every byte from the sequence number to the last record
+
+tools/telemetry_decode.py turns a captured stream back into arrays.
+"""
+import struct
+
+## first two bytes of every frame
+MAGIC = b'\xa5\x5a'
+
+## struct format of the frame header after the magic number
+HEADER_FORMAT = '<HBB'
+
+## struct format of one record
+RECORD_FORMAT = '<IfIf'
+
+## size of one record in bytes
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+## size of the magic number and header in bytes
+HEADER_SIZE = 2 + struct.calcsize(HEADER_FORMAT)
+
+## size of the checksum in bytes
+CHECKSUM_SIZE = 2
+
+
+class TelemetryWriter:
+    """!
+    This class implements a binary telemetry writer.  Records are packed into a
+    preallocated frame and the frame is written out when it is full or flushed.
+    """
+
+    def __init__ (self, stream, records_per_frame=16):
+        """!
+        Creates a telemetry writer
+        @param stream - the object with a write() method the frames are sent to, for
+               example pyb.USB_VCP()
+        @param records_per_frame - how many records are batched into one frame, from 1
+               to 255 since the header stores the count in one byte.  A ValueError is
+               raised for anything else.
+        @param frame - the preallocated frame buffer
+        @param count - the number of records currently in the frame
+        @param seq - the sequence number of the next frame
+        @param frames_sent - the number of frames written so far
+        """
+        if not 1 <= records_per_frame <= 255:
+            raise ValueError("records_per_frame must be from 1 to 255")
+        self.stream = stream
+        self.records_per_frame = records_per_frame
+        self.frame = bytearray(HEADER_SIZE + records_per_frame*RECORD_SIZE + CHECKSUM_SIZE)
+        self.frame[0:2] = MAGIC
+        # memoryviews let frames be checksummed and written without copying
+        self.view = memoryview(self.frame)
+        self.count = 0
+        self.seq = 0
+        self.frames_sent = 0
+
+    def add(self, time1, pos1, time2, pos2):
+        """!
+        This method packs one record into the frame, writing the frame out once it is full
+        @param time1 - the time of the first axis sample in ms
+        @param pos1 - the position of the first axis
+        @param time2 - the time of the second axis sample in ms
+        @param pos2 - the position of the second axis
+        """
+        struct.pack_into(RECORD_FORMAT, self.frame, HEADER_SIZE + self.count*RECORD_SIZE,
+                         time1, pos1, time2, pos2)
+        self.count += 1
+        if self.count == self.records_per_frame:
+            self.flush()
+
+    def flush(self):
+        """!
+        This method finishes the current frame with its header and checksum and
+        writes it out.  It does nothing if the frame is empty.
+        """
+        if self.count == 0:
+            return
+        struct.pack_into(HEADER_FORMAT, self.frame, 2, self.seq, self.count, RECORD_SIZE)
+        end = HEADER_SIZE + self.count*RECORD_SIZE
+        checksum = 0
+        for byte in self.view[2:end]:
+            checksum += byte
+        struct.pack_into('<H', self.frame, end, checksum & 0xFFFF)
+        self.stream.write(self.view[0:end + CHECKSUM_SIZE])
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.frames_sent += 1
+        self.count = 0
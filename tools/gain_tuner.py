@@ -0,0 +1,127 @@
+"""!
+@file gain_tuner.py
+This file searches for controller gains on a PC instead of picking them by hand.  It
+simulates every combination of kp, ki, kd and task period against the motor model,
+ranks them by settling time and overshoot, and writes the best one to a gains.json
+file that main.py loads when it is copied to the board.  All the gain combinations
+for one period are simulated together as columns of NumPy arrays, and the periods
+are spread across a pool of processes.  Run it from the repository root with
+python tools/gain_tuner.py --kp 0.5:4:0.25 --ki 0:0.001:0.00025 --kd 0:1:0.1 --period 5,10,20,30
+NumPy is required.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+import numpy as np
+from batch_sim import BatchControllerBank, BatchMotorPlant
+from step_metrics import batch_step_metrics
+
+## the largest number of gain combinations simulated in one batch
+BATCH_SIZE = 4096
+
+
+def parse_range(text):
+    """!
+    This function turns a command line range into a list of values
+    @param text - either start:stop:step, where stop is included, or a comma separated list
+    @returns the list of values
+    """
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 10) for i in range(count)]
+    return [float(part) for part in text.split(",")]
+
+
+def simulate(job):
+    """!
+    This function simulates one batch of gain combinations at one task period
+    @param job - a tuple of (period_ms, gains, setpoint, duration_ms, plant_args)
+           where gains is a list of (kp, ki, kd) tuples
+    @returns the period and a dictionary of metric arrays, one entry per combination
+    """
+    period, gains, setpoint, duration, plant_args = job
+    gains = np.asarray(gains, dtype=float)
+    n = len(gains)
+    bank = BatchControllerBank(gains[:, 0], gains[:, 1], gains[:, 2], np.full(n, setpoint),
+                               period_ms=period)
+    plant = BatchMotorPlant(n, **plant_args)
+    ticks = int(duration // period)
+    positions = np.empty((ticks, n))
+    saturated = np.zeros(n)
+    for tick in range(ticks):
+        # the same order as the motor tasks: read, compute, apply, wait one period
+        effs = bank.run(plant.angle())
+        saturated += np.abs(effs) >= 100
+        plant.step(effs, period / 1000)
+        positions[tick] = plant.pos * 360 / (16 * 256 * 4)
+    times = np.arange(ticks) * period
+    metrics = batch_step_metrics(times, positions, setpoint)
+    metrics["saturation"] = saturated / ticks * 100
+    return period, metrics
+
+
+def score(metrics, overshoot_weight):
+    """!
+    This function combines the metrics into one number to rank by, smaller is better.
+    Responses that never settle are ranked after every response that does.
+    @param metrics - the dictionary of metric arrays
+    @param overshoot_weight - ms of settling time one percent of overshoot is worth
+    @returns the array of scores
+    """
+    settle = np.where(np.isnan(metrics["settling_time"]), 1e9, metrics["settling_time"])
+    return settle + overshoot_weight * metrics["overshoot"]
+
+
+def main():
+    """!
+    This function runs the search and prints and saves the best gains
+    """
+    parser = argparse.ArgumentParser(description="Search PID gains on the simulated motor")
+    parser.add_argument("--kp", default="0.5:4:0.25", help="kp values, start:stop:step or a list")
+    parser.add_argument("--ki", default="0", help="ki values, per ms")
+    parser.add_argument("--kd", default="0:1:0.1", help="kd values")
+    parser.add_argument("--period", default="5,10,20,30,40,50", help="task periods in ms")
+    parser.add_argument("--setpoint", type=float, default=180, help="step size in degrees")
+    parser.add_argument("--duration", type=int, default=1500, help="simulated ms per run")
+    parser.add_argument("--overshoot-weight", type=float, default=20.0,
+                        help="ms of settling time that one percent of overshoot is worth")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes to use")
+    parser.add_argument("--top", type=int, default=10, help="how many results to print")
+    parser.add_argument("--out", default="gains.json", help="file to write the best gains to")
+    args = parser.parse_args()
+    gains = list(itertools.product(parse_range(args.kp), parse_range(args.ki),
+                                   parse_range(args.kd)))
+    periods = [int(period) for period in parse_range(args.period)]
+    jobs = [(period, gains[i:i + BATCH_SIZE], args.setpoint, args.duration, {})
+            for period in periods for i in range(0, len(gains), BATCH_SIZE)]
+    print(f"Simulating {len(gains) * len(periods)} combinations in {len(jobs)} batches")
+    with Pool(args.workers) as pool:
+        results = pool.map(simulate, jobs)
+    rows = []
+    for (period, batch, _, _, _), (_, metrics) in zip(jobs, results):
+        scores = score(metrics, args.overshoot_weight)
+        for i, (kp, ki, kd) in enumerate(batch):
+            rows.append((scores[i], kp, ki, kd, period, metrics["settling_time"][i],
+                         metrics["overshoot"][i], metrics["rise_time"][i],
+                         metrics["ss_error"][i], metrics["saturation"][i]))
+    rows.sort(key=lambda row: (row[0], -row[4]))
+    print("\n{:>6} {:>7} {:>6} {:>6} | {:>9} {:>9} {:>7} {:>7} {:>6}".format(
+        "kp", "ki", "kd", "period", "settle ms", "overshoot", "rise ms", "ss err", "sat %"))
+    for row in rows[:args.top]:
+        print("{:>6} {:>7} {:>6} {:>6} | {:>9.0f} {:>8.1f}% {:>7.0f} {:>7.2f} {:>6.1f}".format(*row[1:]))
+    best = rows[0]
+    with open(args.out, "w") as out:
+        json.dump({"kp": best[1], "ki": best[2], "kd": best[3], "period": best[4]}, out)
+    print(f"\nBest gains written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
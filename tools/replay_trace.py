@@ -0,0 +1,197 @@
+"""!
+@file replay_trace.py
+This file replays encoder traces recorded by the motor tasks in main.py (record_trace)
+through Encoder and the controller on a PC, as fast as the PC can go, and checks that
+every effort matches the one recorded on the board.  Run it after changing the
+controller to see whether any captured run now behaves differently.  The virtual
+microsecond clock is set to each recorded controller step time before the controller
+runs, so the replay sees exactly the raw counts, intervals and setpoints the board saw.
+
+FixedCLController traces replay bit for bit.  The board computes floats in single
+precision and the PC in double precision, so CLController efforts are compared after
+rounding to single precision and may need a small --tolerance.  Traces recorded with
+use_encoder_rate only have the controller step times, not the encoder's own read
+times, so their velocities and efforts are close but not exact.  Version 1 traces
+only have the controller times in ms, so they only replay exactly if every step
+started on a whole ms.
+
+Run it from the repository root with
+python tools/replay_trace.py trace1.bin trace2.bin traces/
+and make a trace from the simulator, without the board, with
+python tools/replay_trace.py --capture sim.bin --kp 1.5 --setpoint 180 --fixed
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sim"))
+import sim_host
+
+
+def single(value):
+    """!
+    This function rounds a float to single precision, the way an array('f') stores it
+    @param value - the value to round
+    @returns the rounded value
+    """
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def make_controller(settings):
+    """!
+    This function builds the controller described by the settings of a trace
+    @param settings - the settings dictionary saved with the trace
+    @returns the controller and whether it is a FixedCLController
+    """
+    from controller import CLController, FixedCLController
+    fixed = settings["controller"] == "fixed"
+    kind = FixedCLController if fixed else CLController
+    return kind(settings["kp"], settings["ki"], settings["kd"], settings["setpoint"]), fixed
+
+
+def replay(trace, tolerance=0.0):
+    """!
+    This function runs one trace through a fresh Encoder and controller
+    @param trace - the EncoderTrace to replay
+    @param tolerance - the largest difference from a recorded effort still counted as a match
+    @returns a dictionary with the number of samples, the number of mismatched
+             efforts, the index of the first mismatch or None, the largest
+             difference, the replayed efforts and the replay time in seconds
+    """
+    sim_host.reset()
+    import sim_clock
+    encoder = sim_host.SimAxis(0).encoder
+    # the controller measures its times from when it is created
+    sim_clock.now_us = 0
+    con, fixed = make_controller(trace.settings)
+    encoder_rate = trace.settings.get("encoder_rate", False)
+    n = trace.count
+    counter = trace.counter
+    stamps = trace.stamp
+    setpoints = trace.setpoint
+    efforts = [0] * n
+    start = time.perf_counter()
+    for i in range(n):
+        # the clock is only read by the controller, so it can be set directly
+        # without stepping the plant of the simulated axis
+        sim_clock.now_us = stamps[i]
+        encoder_reading = encoder.update(counter[i])
+        if fixed:
+            con.set_setpoint_counts(int(setpoints[i]))
+            efforts[i] = con.run(encoder_reading)
+        else:
+            con.set_setpoint(setpoints[i])
+            encoder_angle = encoder_reading/16/256/4*360
+            if encoder_rate:
+                efforts[i] = con.run(encoder_angle, encoder.get_velocity()*360/(16*256*4)/1000)
+            else:
+                efforts[i] = con.run(encoder_angle)
+    elapsed = time.perf_counter() - start
+    mismatches = 0
+    first = None
+    worst = 0.0
+    for i in range(n):
+        diff = abs((efforts[i] if fixed else single(efforts[i])) - trace.eff[i])
+        if diff > worst:
+            worst = diff
+        if diff > tolerance:
+            mismatches += 1
+            if first is None:
+                first = i
+    return {"samples": n, "mismatches": mismatches, "first": first, "worst": worst,
+            "efforts": efforts, "seconds": elapsed}
+
+
+def capture(path, kp, ki, kd, setpoint, fixed=False, period_ms=20, size=500):
+    """!
+    This function records a trace from the motor task loop running on the simulator,
+    the same way main.py records one on the board
+    @param path - the file to save the trace to
+    @param kp - proportional controller constant
+    @param ki - integral controller constant
+    @param kd - derivative controller constant
+    @param setpoint - the target angle in degrees
+    @param fixed - use FixedCLController instead of CLController
+    @param period_ms - the task period in ms
+    @param size - the number of ticks to record
+    """
+    sim_host.reset()
+    import utime
+    from encoder_trace import EncoderTrace
+    axis = sim_host.SimAxis(0)
+    settings = {"controller": "fixed" if fixed else "float", "kp": kp, "ki": ki, "kd": kd,
+                "setpoint": setpoint, "period": period_ms}
+    con, _ = make_controller(settings)
+    trace = EncoderTrace(size, settings)
+    while not trace.full():
+        encoder_reading = axis.encoder.read()
+        if fixed:
+            eff = con.run(encoder_reading)
+        else:
+            eff = con.run(encoder_reading/16/256/4*360)
+        trace.record(axis.encoder.new, con.get_curr_time(), con.setpoint, eff, con.last_us)
+        axis.motor.set_duty_cycle(eff)
+        utime.sleep_ms(period_ms)
+    trace.save(path)
+
+
+def trace_files(paths):
+    """!
+    This function expands the command line paths into a sorted list of trace files
+    @param paths - files and folders, where every .bin file in a folder is a trace
+    @returns the list of trace files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.endswith(".bin")))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    """!
+    This function replays every trace given on the command line and prints a table
+    of the results.  It exits with status 1 if any effort does not match.
+    """
+    parser = argparse.ArgumentParser(description="Replay encoder traces through the controller")
+    parser.add_argument("paths", nargs="*", help="trace files, or folders of .bin trace files")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="largest effort difference still counted as a match")
+    parser.add_argument("--capture", metavar="FILE", help="record a simulated trace to FILE instead")
+    parser.add_argument("--kp", type=float, default=1.5)
+    parser.add_argument("--ki", type=float, default=0.0)
+    parser.add_argument("--kd", type=float, default=0.0)
+    parser.add_argument("--setpoint", type=float, default=180)
+    parser.add_argument("--period", type=int, default=20, help="task period in ms")
+    parser.add_argument("--samples", type=int, default=500, help="ticks to capture")
+    parser.add_argument("--fixed", action="store_true", help="capture with FixedCLController")
+    args = parser.parse_args()
+    sim_host.install()
+    if args.capture:
+        capture(args.capture, args.kp, args.ki, args.kd, args.setpoint, args.fixed,
+                args.period, args.samples)
+        print(f"Saved {args.samples} simulated samples to {args.capture}")
+        return
+    import encoder_trace
+    failed = False
+    print("{:<30} {:>8} {:>10} {:>11} {:>10} {:>12}".format(
+        "trace", "samples", "mismatch", "first", "worst", "ticks/s"))
+    for path in trace_files(args.paths):
+        result = replay(encoder_trace.load(path), args.tolerance)
+        rate = result["samples"]/result["seconds"] if result["seconds"] else 0
+        first = "-" if result["first"] is None else result["first"]
+        print("{:<30} {:>8} {:>10} {:>11} {:>10.4g} {:>12.0f}".format(
+            os.path.basename(path), result["samples"], result["mismatches"], first,
+            result["worst"], rate))
+        failed = failed or result["mismatches"] > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""!
+@file step_analysis.py
+This file measures the step responses in a log from the board as it streams in, from
+the serial port or from a captured file, instead of plotting printed lines by hand.
+It reads either the "time, pos" lines printed by serial_communication in main.py, the
+CSV written by tools/telemetry_decode.py, or the binary telemetry frames themselves.
+The data is parsed a chunk at a time into NumPy arrays and measured with
+StreamingStepMetrics from step_metrics.py, so memory does not grow with the length of
+the capture.  Every time the time of the first axis goes backwards, because the board
+was restarted or a controller was reset, a new step is started.  For each step and
+axis it prints the rise time, overshoot, settling time, steady state error, IAE and
+ISE, and it can plot every step from a thinned copy of the samples.  Run it with
+python tools/step_analysis.py log.txt --setpoint 180,360 --plot steps.png  or
+python tools/step_analysis.py --port /dev/ttyACM0 --seconds 10 --format binary
+NumPy is required, plotting needs matplotlib and reading a serial port needs pyserial.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+from step_metrics import StreamingStepMetrics
+from telemetry_decode import FrameDecoder, FIELDS, MAGIC
+
+## bytes read from the file or serial port at a time
+CHUNK_SIZE = 65536
+
+## the most samples of each step kept for plotting
+PLOT_POINTS = 4000
+
+
+class TextParser:
+    """!
+    This class turns text logs that arrive in arbitrary chunks into rows of numbers.
+    Lines that are not all numbers, such as headers and the diagnostics printed at
+    shutdown, are skipped, as are lines with a different number of columns than the
+    first line of numbers.
+    """
+
+    def __init__(self):
+        """!
+        Creates a parser
+        """
+        self.partial = b""
+        self.columns = None
+        self.skipped = 0
+
+    def feed(self, chunk):
+        """!
+        This method parses every complete line in a chunk
+        @param chunk - the bytes that were received
+        @returns a 2D array with one row per numeric line
+        """
+        data = self.partial + chunk
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        lines = data[:end].replace(b",", b" ").split(b"\n")
+        if self.columns is None:
+            for line in lines:
+                try:
+                    self.columns = len([float(field) for field in line.split()]) or None
+                except ValueError:
+                    continue
+                if self.columns:
+                    break
+            if self.columns is None:
+                self.skipped += len(lines)
+                return np.empty((0, 0))
+        # parse the whole chunk at once, and only go line by line if it has text in
+        # it or a line with the wrong number of columns, which the total count of
+        # values alone cannot catch
+        lines = [line for line in lines if line.strip()]
+        columns = self.columns
+        if all(len(line.split()) == columns for line in lines):
+            try:
+                return np.array(b" ".join(lines).split(), dtype=float).reshape(-1, columns)
+            except ValueError:
+                pass
+        rows = []
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                row = [float(field) for field in fields]
+            except ValueError:
+                self.skipped += 1
+                continue
+            if len(row) == self.columns:
+                rows.append(row)
+            else:
+                self.skipped += 1
+        return np.array(rows, dtype=float).reshape(-1, self.columns)
+
+
+class BinaryParser:
+    """!
+    This class turns binary telemetry frames into rows of time1, pos1, time2, pos2,
+    emptying the FrameDecoder arrays after every chunk
+    """
+
+    def __init__(self):
+        """!
+        Creates a parser
+        """
+        self.decoder = FrameDecoder()
+        self.columns = len(FIELDS)
+
+    def feed(self, chunk):
+        """!
+        This method decodes every complete frame in a chunk
+        @param chunk - the bytes that were received
+        @returns a 2D array with one row per record
+        """
+        self.decoder.feed(chunk)
+        rows = np.column_stack([np.asarray(self.decoder.data[name], dtype=float)
+                                for name in FIELDS])
+        for name in FIELDS:
+            del self.decoder.data[name][:]
+        return rows
+
+
+class StepAnalyzer:
+    """!
+    This class splits rows of (time, position) pairs into steps and measures each one
+    """
+
+    def __init__(self, setpoints, initial=0.0, band=0.02, tail=50, scale=1.0,
+                 plot_points=PLOT_POINTS):
+        """!
+        Creates an analyzer
+        @param setpoints - the target of each axis in degrees
+        @param initial - the position before each step in degrees
+        @param band - the settling band as a fraction of the step size
+        @param tail - the number of final samples averaged for the steady state error
+        @param scale - degrees per logged position unit, for example 360/16384 for
+               logs from the fixed point controller, which are in encoder counts
+        @param plot_points - the most samples of each step kept for plotting, or 0
+               to keep none
+        """
+        self.setpoints = list(setpoints)
+        self.initial = initial
+        self.band = band
+        self.tail = tail
+        self.scale = scale
+        self.plot_points = plot_points
+        self.axes = None
+        self.metrics = None
+        self.steps = []
+        self.plot = None
+        self.last_time = None
+
+    def update(self, rows):
+        """!
+        This method adds rows of samples, starting a new step wherever the time of
+        the first axis goes backwards
+        @param rows - a 2D array whose columns are time and position pairs, one pair per axis
+        """
+        if len(rows) == 0:
+            return
+        if self.axes is None:
+            self.axes = min(rows.shape[1] // 2, len(self.setpoints))
+            if self.axes == 0:
+                raise ValueError("the log needs a time and a position column for every axis")
+        times = rows[:, 0:2*self.axes:2]
+        positions = rows[:, 1:2*self.axes:2] * self.scale
+        first = times[:, 0]
+        previous = np.concatenate(([self.last_time if self.last_time is not None else first[0]],
+                                   first[:-1]))
+        starts = np.flatnonzero(first < previous)
+        bounds = [0] + list(starts) + [len(rows)]
+        for k in range(len(bounds) - 1):
+            start, end = bounds[k], bounds[k + 1]
+            if start == end:
+                continue
+            # every bound after the first is where the time went backwards
+            if k > 0 or self.metrics is None:
+                self.finish()
+                self.metrics = StreamingStepMetrics(self.setpoints[:self.axes],
+                                                    self.initial, self.band, self.tail)
+                self.plot = [np.empty((0, self.axes)), np.empty((0, self.axes)), 1, 0]
+            self.metrics.update(times[start:end], positions[start:end])
+            self.thin(times[start:end], positions[start:end])
+        self.last_time = first[-1]
+
+    def thin(self, times, positions):
+        """!
+        This method keeps every stride-th sample of the current step for plotting, and
+        doubles the stride whenever more than plot_points samples are kept
+        @param times - the times of the new samples, one column per axis
+        @param positions - the positions of the new samples, one column per axis
+        """
+        if not self.plot_points:
+            return
+        kept_times, kept_pos, stride, count = self.plot
+        keep = (count + np.arange(len(times))) % stride == 0
+        kept_times = np.vstack((kept_times, times[keep]))
+        kept_pos = np.vstack((kept_pos, positions[keep]))
+        while len(kept_times) > self.plot_points:
+            kept_times = kept_times[::2]
+            kept_pos = kept_pos[::2]
+            stride *= 2
+        self.plot = [kept_times, kept_pos, stride, count + len(times)]
+
+    def finish(self):
+        """!
+        This method stores the metrics and plot samples of the current step
+        """
+        if self.metrics is not None and self.metrics.samples:
+            self.steps.append((self.metrics.samples, self.metrics.result(),
+                               self.plot[0], self.plot[1]))
+        self.metrics = None
+
+
+def print_steps(steps, out=sys.stdout):
+    """!
+    This function prints a table of the metrics of every step and axis
+    @param steps - the list of steps from StepAnalyzer
+    @param out - the file to print to
+    """
+    out.write("{:>4} {:>4} {:>8} | {:>7} {:>9} {:>9} {:>8} {:>9} {:>11}\n".format(
+        "step", "axis", "samples", "rise ms", "overshoot", "settle ms", "ss err",
+        "IAE deg*s", "ISE deg^2*s"))
+    for number, (samples, metrics, _, _) in enumerate(steps, 1):
+        for axis in range(len(metrics["rise_time"])):
+            out.write("{:>4} {:>4} {:>8} | {:>7.0f} {:>8.1f}% {:>9.0f} {:>8.2f} {:>9.2f} {:>11.1f}\n"
+                      .format(number, axis + 1, samples, metrics["rise_time"][axis],
+                              metrics["overshoot"][axis], metrics["settling_time"][axis],
+                              metrics["ss_error"][axis], metrics["iae"][axis],
+                              metrics["ise"][axis]))
+
+
+def plot_steps(steps, setpoints, path):
+    """!
+    This function plots every step, with one panel per axis
+    @param steps - the list of steps from StepAnalyzer
+    @param setpoints - the target of each axis in degrees
+    @param path - the image file to save the plot to
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    axes = steps[0][2].shape[1]
+    figure, panels = plt.subplots(axes, 1, sharex=True, squeeze=False,
+                                  figsize=(8, 3*axes))
+    for axis in range(axes):
+        panel = panels[axis][0]
+        for number, (_, _, times, positions) in enumerate(steps, 1):
+            panel.plot(times[:, axis] - times[0, axis], positions[:, axis], label=f"step {number}")
+        panel.axhline(setpoints[axis], color="k", linestyle="--", linewidth=0.8)
+        panel.set_ylabel(f"axis {axis + 1} (deg)")
+        panel.legend(loc="lower right")
+    panels[-1][0].set_xlabel("time (ms)")
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def chunks(args):
+    """!
+    This function yields the log a chunk at a time from the file or serial port
+    @param args - the parsed command line arguments
+    """
+    if args.port:
+        import time
+        import serial
+        with serial.Serial(args.port, 115200, timeout=0.1) as port:
+            stop = time.monotonic() + args.seconds
+            while time.monotonic() < stop:
+                yield port.read(4096)
+    else:
+        with open(args.capture, "rb") as capture:
+            while True:
+                chunk = capture.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def main():
+    """!
+    This function reads the log, prints the metrics of every step and saves the plot
+    """
+    parser = argparse.ArgumentParser(description="Measure step responses from a motor log")
+    parser.add_argument("capture", nargs="?", help="file holding a text log or binary telemetry")
+    parser.add_argument("--port", help="serial port to read from instead of a file")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="how long to read the serial port for")
+    parser.add_argument("--format", choices=("auto", "text", "binary"), default="auto",
+                        help="binary telemetry frames or text lines, detected from the first chunk by default")
+    parser.add_argument("--setpoint", default="180,360", help="target of each axis in degrees")
+    parser.add_argument("--initial", type=float, default=0.0, help="position before each step in degrees")
+    parser.add_argument("--band", type=float, default=0.02, help="settling band as a fraction of the step")
+    parser.add_argument("--tail", type=int, default=50,
+                        help="final samples averaged for the steady state error")
+    parser.add_argument("--counts", action="store_true",
+                        help="positions are encoder counts from the fixed point controller")
+    parser.add_argument("--plot", metavar="FILE", help="save a plot of every step to FILE")
+    args = parser.parse_args()
+    if not args.port and not args.capture:
+        parser.error("give a log file or --port")
+    setpoints = [float(value) for value in args.setpoint.split(",")]
+    analyzer = StepAnalyzer(setpoints, args.initial, args.band, args.tail,
+                            360/(16*256*4) if args.counts else 1.0,
+                            PLOT_POINTS if args.plot else 0)
+    reader = None
+    for chunk in chunks(args):
+        if not chunk:
+            continue
+        if reader is None:
+            binary = args.format == "binary" or (args.format == "auto" and MAGIC in chunk)
+            reader = BinaryParser() if binary else TextParser()
+        analyzer.update(reader.feed(chunk))
+    analyzer.finish()
+    if not analyzer.steps:
+        print("No samples found", file=sys.stderr)
+        sys.exit(1)
+    print_steps(analyzer.steps)
+    if args.plot:
+        plot_steps(analyzer.steps, setpoints, args.plot)
+        print(f"Plot saved to {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
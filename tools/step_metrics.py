@@ -0,0 +1,196 @@
+"""!
+@file step_metrics.py
+This file contains functions that measure a step response: rise time, overshoot,
+settling time and steady state error.  They work on plain lists of times and
+positions such as those printed by the motor tasks or produced by the simulator.
+"""
+
+
+def step_metrics(times, positions, setpoint, initial=0.0, band=0.02, tail=0.1):
+    """!
+    This function measures a step response
+    @param times - the sample times in ms
+    @param positions - the positions at those times
+    @param setpoint - the target position of the step
+    @param initial - the position before the step
+    @param band - the settling band as a fraction of the step size
+    @param tail - the fraction of samples at the end averaged for the steady state error
+    @returns a dictionary with rise_time (10% to 90%, ms), overshoot (percent of the
+             step), settling_time (ms, None if the response never stays in the band),
+             ss_error (setpoint minus the final average) and peak
+    """
+    step = setpoint - initial
+    if step == 0 or not positions:
+        raise ValueError("step_metrics needs a non zero step and at least one sample")
+    # normalize so the response always rises from 0 towards 1
+    norm = [(pos - initial) / step for pos in positions]
+    t10 = t90 = None
+    for t, value in zip(times, norm):
+        if t10 is None and value >= 0.1:
+            t10 = t
+        if value >= 0.9:
+            t90 = t
+            break
+    rise_time = t90 - t10 if t10 is not None and t90 is not None else None
+    peak = max(norm)
+    overshoot = max(peak - 1.0, 0.0) * 100
+    settling_time = None
+    if abs(norm[-1] - 1.0) <= band:
+        settling_time = times[0]
+        for t, value in zip(times, norm):
+            if abs(value - 1.0) > band:
+                settling_time = None
+            elif settling_time is None:
+                settling_time = t
+        settling_time -= times[0]
+    n_tail = max(int(len(positions) * tail), 1)
+    final = sum(positions[-n_tail:]) / n_tail
+    return {"rise_time": rise_time, "overshoot": overshoot, "settling_time": settling_time,
+            "ss_error": setpoint - final, "peak": initial + peak * step}
+
+
+def batch_step_metrics(times, positions, setpoints, initial=0.0, band=0.02, tail=0.1):
+    """!
+    This function measures many step responses at once with NumPy.  It gives the
+    same results as step_metrics for every column, with NaN in place of None.
+    @param times - the sample times in ms, one per row of positions
+    @param positions - a 2D array with one row per sample and one column per response
+    @param setpoints - the target of each response, a scalar or one per column
+    @param initial - the position before the step, a scalar or one per column
+    @param band - the settling band as a fraction of the step size
+    @param tail - the fraction of samples at the end averaged for the steady state error
+    @returns a dictionary of arrays with one entry per column: rise_time, overshoot,
+             settling_time, ss_error and peak
+    """
+    import numpy as np
+    times = np.asarray(times, dtype=float)
+    positions = np.asarray(positions, dtype=float)
+    setpoints = np.broadcast_to(np.asarray(setpoints, dtype=float), positions.shape[1:])
+    initial = np.broadcast_to(np.asarray(initial, dtype=float), positions.shape[1:])
+    step = setpoints - initial
+    norm = (positions - initial) / step
+    # index of the first sample at or past each fraction of the step
+    above10 = norm >= 0.1
+    above90 = norm >= 0.9
+    t10 = np.where(above10.any(axis=0), times[above10.argmax(axis=0)], np.nan)
+    t90 = np.where(above90.any(axis=0), times[above90.argmax(axis=0)], np.nan)
+    peak = norm.max(axis=0)
+    overshoot = np.maximum(peak - 1.0, 0.0) * 100
+    outside = np.abs(norm - 1.0) > band
+    n = len(times)
+    # the last sample outside the band, found by searching the reversed array
+    last_out = n - 1 - outside[::-1].argmax(axis=0)
+    settle_idx = np.minimum(last_out + 1, n - 1)
+    settling_time = np.where(outside.any(axis=0), times[settle_idx] - times[0], 0.0)
+    settling_time = np.where(outside[-1], np.nan, settling_time)
+    n_tail = max(int(n * tail), 1)
+    final = positions[-n_tail:].mean(axis=0)
+    return {"rise_time": t90 - t10, "overshoot": overshoot, "settling_time": settling_time,
+            "ss_error": setpoints - final, "peak": initial + peak * step}
+
+
+class StreamingStepMetrics:
+    """!
+    This class measures step responses of several axes from samples that arrive in
+    chunks, so a capture of any length can be measured without keeping it in memory.
+    Each chunk is processed with NumPy across every axis at once.  The results are
+    the same as batch_step_metrics on the whole capture, except that the steady state
+    error averages a fixed number of final samples instead of a fraction of them.
+    It also integrates the absolute and squared error (IAE and ISE) with the
+    trapezoidal rule.
+    """
+
+    def __init__(self, setpoints, initial=0.0, band=0.02, tail=50):
+        """!
+        Creates the accumulators for one step of every axis
+        @param setpoints - the target of each axis, a list or array
+        @param initial - the position before the step, a scalar or one per axis
+        @param band - the settling band as a fraction of the step size
+        @param tail - the number of final samples averaged for the steady state error
+        """
+        import numpy as np
+        self.setpoints = np.asarray(setpoints, dtype=float)
+        n = len(self.setpoints)
+        self.initial = np.broadcast_to(np.asarray(initial, dtype=float), (n,)).copy()
+        self.step = self.setpoints - self.initial
+        self.band = band
+        self.tail = tail
+        self.samples = 0
+        self.t0 = np.full(n, np.nan)
+        self.t10 = np.full(n, np.nan)
+        self.t90 = np.full(n, np.nan)
+        self.peak = np.full(n, -np.inf)
+        # the time of the first sample after the last one outside the band, and
+        # whether the newest sample is outside so the next one decides it
+        self.settle = np.full(n, np.nan)
+        self.pending = np.zeros(n, dtype=bool)
+        self.iae = np.zeros(n)
+        self.ise = np.zeros(n)
+        self.last_time = np.full(n, np.nan)
+        self.last_err = np.zeros(n)
+        self.recent = np.empty((0, n))
+
+    def update(self, times, positions):
+        """!
+        This method adds a chunk of samples
+        @param times - the sample times in ms, either one per row or a 2D array with
+               one column per axis
+        @param positions - a 2D array with one row per sample and one column per axis
+        """
+        import numpy as np
+        positions = np.asarray(positions, dtype=float)
+        rows = len(positions)
+        if rows == 0:
+            return
+        times = np.asarray(times, dtype=float)
+        if times.ndim == 1:
+            times = np.broadcast_to(times[:, None], positions.shape)
+        cols = np.arange(positions.shape[1])
+        if self.samples == 0:
+            self.t0 = times[0].copy()
+            self.settle = times[0].copy()
+            self.last_time = times[0].copy()
+            self.last_err = self.setpoints - positions[0]
+        self.samples += rows
+        norm = (positions - self.initial) / self.step
+        # first crossings of 10% and 90% of the step, for the axes still rising
+        for crossed, fraction in ((self.t10, 0.1), (self.t90, 0.9)):
+            above = norm >= fraction
+            found = np.isnan(crossed) & above.any(axis=0)
+            crossed[found] = times[above.argmax(axis=0), cols][found]
+        self.peak = np.maximum(self.peak, norm.max(axis=0))
+        outside = np.abs(norm - 1.0) > self.band
+        any_out = outside.any(axis=0)
+        last_out = rows - 1 - outside[::-1].argmax(axis=0)
+        inside_after = any_out & (last_out < rows - 1)
+        after = times[np.minimum(last_out + 1, rows - 1), cols]
+        self.settle = np.where(inside_after, after, self.settle)
+        self.settle = np.where(~any_out & self.pending, times[0], self.settle)
+        self.pending = np.where(any_out, ~inside_after, False)
+        # trapezoidal integrals, carrying the last sample of the previous chunk
+        err = self.setpoints - positions
+        all_times = np.vstack((self.last_time, times))
+        all_err = np.vstack((self.last_err, err))
+        dt = np.diff(all_times, axis=0) / 1000
+        self.iae += (0.5*(np.abs(all_err[1:]) + np.abs(all_err[:-1]))*dt).sum(axis=0)
+        self.ise += (0.5*(all_err[1:]**2 + all_err[:-1]**2)*dt).sum(axis=0)
+        self.last_time = times[-1].copy()
+        self.last_err = err[-1].copy()
+        self.recent = np.vstack((self.recent, positions))[-self.tail:]
+
+    def result(self):
+        """!
+        This method returns the metrics of the samples added so far
+        @returns a dictionary of arrays with one entry per axis: rise_time,
+                 overshoot, settling_time (NaN if the last sample is outside the
+                 band), ss_error, peak, iae (error times s) and ise (error squared
+                 times s)
+        """
+        import numpy as np
+        settling_time = np.where(self.pending, np.nan, self.settle - self.t0)
+        return {"rise_time": self.t90 - self.t10,
+                "overshoot": np.maximum(self.peak - 1.0, 0.0) * 100,
+                "settling_time": settling_time,
+                "ss_error": self.setpoints - self.recent.mean(axis=0),
+                "peak": self.initial + self.peak * self.step,
+                "iae": self.iae.copy(), "ise": self.ise.copy()}
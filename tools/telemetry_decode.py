@@ -0,0 +1,155 @@
+"""!
+@file telemetry_decode.py
+This file decodes the binary telemetry stream written by TelemetryWriter back into
+arrays on the computer.  It can read a captured file or a serial port, checks every
+frame's checksum, counts frames lost by looking at sequence numbers, and resyncs on
+the magic number after corrupted data.  Run it with
+python tools/telemetry_decode.py capture.bin  or
+python tools/telemetry_decode.py --port /dev/ttyACM0 --seconds 5
+Reading a serial port needs pyserial.
+"""
+import argparse
+import os
+import struct
+import sys
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from telemetry import MAGIC, HEADER_FORMAT, HEADER_SIZE, RECORD_FORMAT, RECORD_SIZE, CHECKSUM_SIZE
+
+## names of the fields in each record, in order
+FIELDS = ("time1", "pos1", "time2", "pos2")
+
+
+class FrameDecoder:
+    """!
+    This class decodes telemetry frames from data that arrives in arbitrary chunks.
+    Decoded records are appended to one array per field.
+    """
+
+    def __init__(self):
+        """!
+        Creates an empty decoder
+        """
+        self.buf = bytearray()
+        self.data = {"time1": array('L'), "pos1": array('f'),
+                     "time2": array('L'), "pos2": array('f')}
+        self.frames = 0
+        self.bad_checksums = 0
+        self.lost_frames = 0
+        self.skipped_bytes = 0
+        self.last_seq = None
+        self.record = struct.Struct(RECORD_FORMAT)
+
+    def feed(self, chunk):
+        """!
+        This method adds newly received bytes and decodes every complete frame in them
+        @param chunk - the bytes that were received
+        @returns the number of records decoded from this chunk
+        """
+        self.buf += chunk
+        decoded = 0
+        pos = 0
+        buf = self.buf
+        while True:
+            start = buf.find(MAGIC, pos)
+            if start < 0:
+                # keep a trailing byte in case it is the first half of the magic number
+                keep = 1 if buf[-1:] == MAGIC[:1] else 0
+                self.skipped_bytes += len(buf) - pos - keep
+                pos = len(buf) - keep
+                break
+            self.skipped_bytes += start - pos
+            if start + HEADER_SIZE > len(buf):
+                pos = start
+                break
+            seq, count, size = struct.unpack_from(HEADER_FORMAT, buf, start + 2)
+            end = start + HEADER_SIZE + count*size
+            if size != RECORD_SIZE:
+                # not a real header, keep looking after this magic number
+                pos = start + 1
+                continue
+            if end + CHECKSUM_SIZE > len(buf):
+                pos = start
+                break
+            checksum = struct.unpack_from('<H', buf, end)[0]
+            if sum(buf[start + 2:end]) & 0xFFFF != checksum:
+                self.bad_checksums += 1
+                pos = start + 1
+                continue
+            if self.last_seq is not None:
+                self.lost_frames += (seq - self.last_seq - 1) & 0xFFFF
+            self.last_seq = seq
+            for values in self.record.iter_unpack(buf[start + HEADER_SIZE:end]):
+                for name, value in zip(FIELDS, values):
+                    self.data[name].append(value)
+            decoded += count
+            self.frames += 1
+            pos = end + CHECKSUM_SIZE
+        del self.buf[:pos]
+        return decoded
+
+    def arrays(self):
+        """!
+        This method returns the decoded data, as NumPy arrays if NumPy is installed
+        @returns a dictionary of arrays keyed by field name
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            return self.data
+        return {name: np.frombuffer(values, dtype=values.typecode) for name, values in self.data.items()}
+
+
+def decode(data):
+    """!
+    This function decodes a complete captured stream
+    @param data - the bytes of the capture
+    @returns the FrameDecoder holding the decoded arrays and statistics
+    """
+    decoder = FrameDecoder()
+    decoder.feed(data)
+    return decoder
+
+
+def main():
+    """!
+    This function reads a capture file or serial port and prints the decoded samples
+    """
+    parser = argparse.ArgumentParser(description="Decode binary motor telemetry")
+    parser.add_argument("capture", nargs="?", help="file holding a captured stream")
+    parser.add_argument("--port", help="serial port to read from instead of a file")
+    parser.add_argument("--seconds", type=float, default=5.0,
+                        help="how long to read the serial port for")
+    parser.add_argument("--csv", help="write the samples to this CSV file instead of printing")
+    args = parser.parse_args()
+    decoder = FrameDecoder()
+    if args.port:
+        import time
+        import serial
+        with serial.Serial(args.port, 115200, timeout=0.1) as port:
+            stop = time.monotonic() + args.seconds
+            while time.monotonic() < stop:
+                decoder.feed(port.read(4096))
+    elif args.capture:
+        with open(args.capture, "rb") as capture:
+            while True:
+                chunk = capture.read(65536)
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+    else:
+        parser.error("give a capture file or --port")
+    out = open(args.csv, "w") if args.csv else sys.stdout
+    out.write("time1, pos1, time2, pos2\n")
+    for row in zip(*(decoder.data[name] for name in FIELDS)):
+        out.write("{}, {}, {}, {}\n".format(*row))
+    if args.csv:
+        out.close()
+    print("{} frames, {} lost, {} bad checksums, {} bytes skipped".format(
+        decoder.frames, decoder.lost_frames, decoder.bad_checksums, decoder.skipped_bytes),
+        file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()